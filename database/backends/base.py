@@ -0,0 +1,97 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Union
+
+
+class APIResponse:
+    """Result of QueryBuilder.execute(), shaped like the Supabase client's response."""
+
+    def __init__(self, data: Union[List[Dict[str, Any]], Dict[str, Any], None], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+    def __repr__(self):
+        return f"APIResponse(data={self.data!r}, count={self.count!r})"
+
+
+class QueryBuilder(ABC):
+    """
+    Chainable query on one table, following the PostgREST builder the Supabase client exposes.
+
+    ProfileFetcher and ProfileUpdater only use the methods declared here, so any
+    backend that implements them (the Supabase client does natively) can serve
+    the whole pipeline. Filter methods return the builder so calls can be chained,
+    and nothing is sent until execute() is called.
+    """
+
+    # Statement
+    @abstractmethod
+    def select(self, columns: str = "*") -> "QueryBuilder": ...
+
+    @abstractmethod
+    def update(self, data: Dict[str, Any]) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def insert(self, rows: Union[Dict[str, Any], List[Dict[str, Any]]]) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def upsert(self, rows: Union[Dict[str, Any], List[Dict[str, Any]]], on_conflict: str = "",
+               ignore_duplicates: bool = False) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def delete(self) -> "QueryBuilder": ...
+
+    # Filters
+    @abstractmethod
+    def eq(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def neq(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def gt(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def gte(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def lt(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def lte(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def is_(self, column: str, value: Any) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def in_(self, column: str, values: List[Any]) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def ilike(self, column: str, pattern: str) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def or_(self, filters: str) -> "QueryBuilder": ...
+
+    @property
+    @abstractmethod
+    def not_(self) -> "QueryBuilder": ...
+
+    # Modifiers
+    @abstractmethod
+    def order(self, column: str, *, desc: bool = False) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def limit(self, size: int) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def single(self) -> "QueryBuilder": ...
+
+    @abstractmethod
+    def execute(self) -> APIResponse: ...
+
+
+class ProfileBackend(ABC):
+    """Storage engine behind ProfileFetcher and ProfileUpdater."""
+
+    @abstractmethod
+    def table(self, name: str) -> QueryBuilder:
+        """Start a query on `name`."""
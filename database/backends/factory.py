@@ -0,0 +1,41 @@
+import os
+from typing import Optional
+
+from backends.base import ProfileBackend
+
+
+def create_backend(url: Optional[str] = None) -> ProfileBackend:
+    """
+    Build the storage backend named by `url` or the PROFILE_BACKEND environment variable.
+
+    Supported values:
+        "supabase" (default): uses SUPABASE_URL and SUPABASE_KEY.
+        "sqlite:///profiles.sqlite3", "sqlite:////abs/path.sqlite3" or "sqlite:path": local SQLite file.
+        "sqlite://:memory:": throwaway in-memory database.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    url = url or os.getenv("PROFILE_BACKEND") or "supabase"
+
+    if url.startswith("sqlite:"):
+        from backends.sqlite_backend import SQLiteBackend
+
+        # Same convention as SQLAlchemy: sqlite:///relative.db, sqlite:////absolute/path.db
+        path = url[len("sqlite:"):]
+        if path.startswith("///"):
+            path = path[3:]
+        elif path.startswith("//"):
+            path = path[2:]
+        return SQLiteBackend(path or "profiles.sqlite3")
+
+    if url == "supabase":
+        from backends.supabase_backend import SupabaseBackend
+
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_KEY")
+        if not supabase_url or not supabase_key:
+            raise ValueError("Missing Supabase credentials in .env file")
+        return SupabaseBackend(supabase_url, supabase_key)
+
+    raise ValueError(f"Unknown profile backend: {url}")
@@ -0,0 +1,441 @@
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from backends.base import APIResponse, ProfileBackend, QueryBuilder
+
+# Column name -> SQLite type. BOOLEAN and JSON columns are converted on the way in and out.
+PROFILE_COLUMNS = {
+    "id": "INTEGER",
+    "username": "TEXT",
+    "full_name": "TEXT",
+    "biography": "TEXT",
+    "profile_data": "JSON",
+    "followers_count": "INTEGER",
+    "following_count": "INTEGER",
+    "is_verified": "BOOLEAN",
+    "is_car_profile": "BOOLEAN",
+    "profile_type": "TEXT",
+    "tags": "JSON",
+    "last_updated": "TEXT",
+    "created_at": "TEXT",
+    "claimed_by": "TEXT",
+    "lease_expires_at": "TEXT",
+}
+
+PROFILES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    full_name TEXT,
+    biography TEXT,
+    profile_data TEXT,
+    followers_count INTEGER,
+    following_count INTEGER,
+    is_verified INTEGER,
+    is_car_profile INTEGER,
+    profile_type TEXT,
+    tags TEXT,
+    last_updated TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    claimed_by TEXT,
+    lease_expires_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at_id ON profiles (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_profiles_is_car_profile ON profiles (is_car_profile);
+CREATE INDEX IF NOT EXISTS idx_profiles_lease ON profiles (is_car_profile, lease_expires_at);
+"""
+
+TABLES = {"profiles": (PROFILE_COLUMNS, PROFILES_SCHEMA)}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return f'"{name}"'
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a PostgREST logic expression on commas outside parentheses and quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+class SQLiteQuery(QueryBuilder):
+    """PostgREST-style query builder compiled to a single SQLite statement."""
+
+    def __init__(self, backend: "SQLiteBackend", table: str):
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        self._backend = backend
+        self._table = table
+        self._columns = TABLES[table][0]
+        self._action = "select"
+        self._select = "*"
+        self._payload = None
+        self._on_conflict = ""
+        self._ignore_duplicates = False
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+        self._single = False
+        self._negate = False
+
+    # Statement
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "SQLiteQuery":
+        self._action = "select"
+        self._select = columns or "*"
+        return self
+
+    def update(self, data: Dict[str, Any]) -> "SQLiteQuery":
+        self._action = "update"
+        self._payload = data
+        return self
+
+    def insert(self, rows: Union[Dict[str, Any], List[Dict[str, Any]]]) -> "SQLiteQuery":
+        self._action = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows: Union[Dict[str, Any], List[Dict[str, Any]]], on_conflict: str = "",
+               ignore_duplicates: bool = False) -> "SQLiteQuery":
+        self._action = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._on_conflict = on_conflict or "id"
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self) -> "SQLiteQuery":
+        self._action = "delete"
+        return self
+
+    # Filters
+    def eq(self, column, value):
+        return self._compare(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._compare(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._compare(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._compare(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._compare(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._compare(column, "lte", value)
+
+    def is_(self, column, value):
+        return self._add_condition(*self._condition(column, "is", value))
+
+    def in_(self, column, values):
+        return self._add_condition(*self._condition(column, "in", list(values)))
+
+    def ilike(self, column, pattern):
+        return self._add_condition(*self._condition(column, "ilike", pattern))
+
+    def like(self, column, pattern):
+        return self._add_condition(*self._condition(column, "like", pattern))
+
+    def or_(self, filters: str):
+        sql, params = self._logic("or", filters)
+        # Parenthesized so the OR cannot swallow the conditions ANDed around it
+        return self._add_condition(f"({sql})", params)
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    # Modifiers
+    def order(self, column, *, desc=False, nullsfirst=None):
+        # Match PostgreSQL's default of NULLS FIRST for descending, LAST for ascending
+        if nullsfirst is None:
+            nullsfirst = desc
+        self._order.append(f"{_ident(column)} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nullsfirst else 'LAST'}")
+        return self
+
+    def limit(self, size):
+        self._limit = int(size)
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def execute(self) -> APIResponse:
+        rows = self._backend._run(self._compile())
+        data = [self._decode(row) for row in rows]
+        if self._single:
+            if len(data) != 1:
+                raise LookupError(f"Expected exactly one row, got {len(data)}")
+            return APIResponse(data[0])
+        return APIResponse(data)
+
+    # Compilation
+    def _compare(self, column, op, value):
+        return self._add_condition(*self._condition(column, op, value))
+
+    def _add_condition(self, sql, params):
+        if self._negate:
+            sql = f"NOT ({sql})"
+            self._negate = False
+        self._where.append(sql)
+        self._params.extend(params)
+        return self
+
+    def _condition(self, column, op, value) -> Tuple[str, List[Any]]:
+        name = column.strip()
+        if name not in self._columns:
+            raise ValueError(f"Unknown column for {self._table}: {name}")
+        col = _ident(name)
+        if op in _OPERATORS:
+            return f"{col} {_OPERATORS[op]} ?", [self._encode(name, value)]
+        if op == "is":
+            keyword = {"null": "NULL", "none": "NULL", "true": "TRUE", "false": "FALSE"}.get(str(value).lower())
+            if keyword is None:
+                raise ValueError(f"Unsupported is_ value: {value!r}")
+            return f"{col} IS {keyword}", []
+        if op == "in":
+            if not value:
+                return "0", []
+            return f"{col} IN ({','.join('?' * len(value))})", [self._encode(name, v) for v in value]
+        if op == "ilike":
+            return f"LOWER({col}) LIKE LOWER(?)", [str(value).replace("*", "%")]
+        if op == "like":
+            return f"{col} LIKE ?", [str(value).replace("*", "%")]
+        raise ValueError(f"Unsupported operator: {op}")
+
+    def _logic(self, kind, expression) -> Tuple[str, List[Any]]:
+        """Compile a PostgREST logic tree such as `a.lt.1,and(a.eq.1,id.lt.5)`."""
+        parts, params = [], []
+        for term in _split_top_level(expression):
+            negate = term.startswith("not.")
+            if negate:
+                term = term[4:]
+            group = re.match(r"^(and|or)\((.*)\)$", term, re.S)
+            if group:
+                sql, term_params = self._logic(group.group(1), group.group(2))
+            else:
+                column, op, raw = term.split(".", 2)
+                if op == "in":
+                    values = [_unquote(v) for v in _split_top_level(raw.strip()[1:-1])]
+                    sql, term_params = self._condition(column, "in", values)
+                else:
+                    sql, term_params = self._condition(column, op, _unquote(raw))
+            parts.append(f"NOT ({sql})" if negate else f"({sql})")
+            params.extend(term_params)
+        return f" {kind.upper()} ".join(parts) or "1", params
+
+    def _encode(self, column, value):
+        kind = self._columns.get(column)
+        if kind == "BOOLEAN" and isinstance(value, str):
+            return {"true": 1, "false": 0}.get(value.lower(), value)
+        if kind == "BOOLEAN" and isinstance(value, bool):
+            return int(value)
+        if kind == "JSON" and value is not None and not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False)
+        if kind == "INTEGER" and isinstance(value, str) and value.lstrip("-").isdigit():
+            return int(value)
+        return value
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        record = {}
+        for key in row.keys():
+            value = row[key]
+            kind = self._columns.get(key)
+            if value is not None and kind == "BOOLEAN":
+                value = bool(value)
+            elif value is not None and kind == "JSON":
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            record[key] = value
+        return record
+
+    def _selected_columns(self) -> str:
+        columns = [c.strip() for c in self._select.split(",") if c.strip()]
+        if not columns or "*" in columns:
+            return "*"
+        return ", ".join(_ident(c) for c in columns)
+
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ""
+
+    def _compile(self) -> Tuple[str, Union[List[Any], List[List[Any]]], bool]:
+        table = _ident(self._table)
+        if self._action == "select":
+            sql = f"SELECT {self._selected_columns()} FROM {table}{self._where_sql()}"
+            if self._order:
+                sql += " ORDER BY " + ", ".join(self._order)
+            if self._limit is not None:
+                sql += f" LIMIT {self._limit}"
+            return sql, self._params, False
+
+        if self._action == "update":
+            data = self._checked(self._payload)
+            assignments = ", ".join(f"{_ident(k)} = ?" for k in data)
+            params = [self._encode(k, v) for k, v in data.items()] + self._params
+            return f"UPDATE {table} SET {assignments}{self._where_sql()} RETURNING *", params, False
+
+        if self._action == "delete":
+            return f"DELETE FROM {table}{self._where_sql()} RETURNING *", self._params, False
+
+        rows = [self._checked(row) for row in self._payload]
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        if not columns:
+            return "SELECT 1 WHERE 0", [], False
+        placeholders = ", ".join("?" * len(columns))
+        sql = f"INSERT INTO {table} ({', '.join(_ident(c) for c in columns)}) VALUES ({placeholders})"
+        if self._action == "upsert":
+            conflict = ", ".join(_ident(c) for c in self._on_conflict.split(","))
+            updates = [c for c in columns if c not in self._on_conflict.split(",")]
+            if self._ignore_duplicates or not updates:
+                sql += f" ON CONFLICT ({conflict}) DO NOTHING"
+            else:
+                sql += f" ON CONFLICT ({conflict}) DO UPDATE SET " + \
+                    ", ".join(f"{_ident(c)} = excluded.{_ident(c)}" for c in updates)
+        # Rows missing a column get NULL, like PostgREST's default for bulk inserts
+        params = [[self._encode(c, row.get(c)) for c in columns] for row in rows]
+        return sql + " RETURNING *", params, True
+
+    def _checked(self, row):
+        unknown = [k for k in row if k not in self._columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for {self._table}: {', '.join(unknown)}")
+        return row
+
+
+class SQLiteBackend(ProfileBackend):
+    """
+    Local SQLite storage with the same query interface as the Supabase client.
+
+    The profiles table has indexes on username (unique), (created_at, id) for
+    keyset pagination and is_car_profile (plus lease expiry) for the
+    unprocessed-profile queue, so the full pipeline and CLI can run offline at
+    local-disk speed.
+    """
+
+    def __init__(self, path: str = "profiles.sqlite3"):
+        """
+        Args:
+            path (str): Database file (":memory:" for a throwaway database).
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        for name, (columns, schema) in TABLES.items():
+            self._add_missing_columns(name, columns)
+            self._conn.executescript(schema)
+        self._conn.commit()
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def seed_from_json(self, path: str, batch_size: int = 1000) -> int:
+        """
+        Load profiles from a JSON array file such as all_profiles.json.
+
+        Existing usernames are updated in place. Returns the number of rows written.
+        """
+        with open(path) as f:
+            profiles = json.load(f)
+        return self.seed(profiles, batch_size)
+
+    def seed(self, profiles: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """Upsert profile dicts on username in batches and return the number written."""
+        written, batch = 0, []
+        for profile in profiles:
+            batch.append({k: v for k, v in profile.items() if k in PROFILE_COLUMNS and k != "id"})
+            if len(batch) >= batch_size:
+                written += len(self.table("profiles").upsert(batch, on_conflict="username").execute().data)
+                batch = []
+        if batch:
+            written += len(self.table("profiles").upsert(batch, on_conflict="username").execute().data)
+        return written
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _add_missing_columns(self, table, columns):
+        """Bring a database created by an older schema up to date before its indexes are built."""
+        existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({_ident(table)})")}
+        if not existing:
+            return
+        for column, kind in columns.items():
+            if column not in existing:
+                sql_type = {"BOOLEAN": "INTEGER", "JSON": "TEXT"}.get(kind, kind)
+                self._conn.execute(f"ALTER TABLE {_ident(table)} ADD COLUMN {_ident(column)} {sql_type}")
+
+    def _run(self, compiled) -> List[sqlite3.Row]:
+        sql, params, many = compiled
+        with self._lock:
+            try:
+                if many:
+                    rows = []
+                    for row_params in params:
+                        rows.extend(self._conn.execute(sql, row_params).fetchall())
+                else:
+                    rows = self._conn.execute(sql, params).fetchall()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return rows
+
+
+def main():
+    # Run from the database directory: python -m backends.sqlite_backend --seed ../all_profiles.json
+    parser = argparse.ArgumentParser(description='Create or seed a local SQLite profiles database')
+    parser.add_argument('--db', default='profiles.sqlite3', help='SQLite database file')
+    parser.add_argument('--seed', help='JSON array of profiles to load (e.g. ../all_profiles.json)')
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.db)
+    if args.seed:
+        written = backend.seed_from_json(args.seed)
+        print(f"Loaded {written} profiles into {args.db}")
+    total = len(backend.table("profiles").select("id").execute().data)
+    print(f"{args.db} holds {total} profiles")
+
+
+if __name__ == "__main__":
+    main()
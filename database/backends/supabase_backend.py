@@ -0,0 +1,14 @@
+from backends.base import ProfileBackend, QueryBuilder
+
+
+class SupabaseBackend(ProfileBackend):
+    """Hosted Supabase (PostgREST) storage; its query builder already matches QueryBuilder."""
+
+    def __init__(self, supabase_url: str, supabase_key: str):
+        from clients import get_supabase_client
+
+        # Shared with every other backend built for the same project
+        self.client = get_supabase_client(supabase_url, supabase_key)
+
+    def table(self, name: str) -> QueryBuilder:
+        return self.client.table(name)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for the analysis loop, fetcher and updater.
+
+Gemini and the profile store are replaced by local stand-ins that inject
+latency, rate-limit errors and malformed responses, so runs need no network
+or credentials. Run from the database directory, e.g.
+
+    python benchmark.py --profiles 10000 --mode pipeline --concurrency 8
+    python benchmark.py --profiles 1000000 --scenario fetch --db-latency 0.02
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator
+
+import metrics
+from backends.base import ProfileBackend
+from backends.sqlite_backend import SQLiteBackend
+from bio_clusters import BioClusterIndex
+from gemini.analysis_schema import AnalysisSchema, DEFAULT_TAGS
+from gemini.geminihandler import ERROR_PREFIX, geminiHandler
+from gemini.rate_governor import RateGovernor
+from profile_fetcher import ProfileFetcher
+from updaters.profile_updater import ProfileUpdater
+from updaters.result_journal import ResultJournal
+import test as analysis
+
+CAR_BIOS = [
+    "Bagged F80 M3 Comp 🏎 | tuning & track days",
+    "Ceramic coating, PPF and window tint. Book your detail today!",
+    "i photograph cars & people. DM for rates",
+    "JDM lifestyle. 97 Supra / 94 Integra",
+    "Daily supercar features - tag us to be featured",
+]
+OTHER_BIOS = [
+    "Coffee, travel and good vibes ✈️",
+    "Mom of 3 | Realtor in Austin",
+    "Personal trainer. DM for coaching",
+    "LA based DJ/Producer",
+    "",
+]
+PROFILE_TYPES = ["Individual", "Company", "Car Page", "unknown"]
+
+
+def synthetic_profiles(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Generate `count` profiles with a mix of car and non-car bios; timestamps repeat in small groups."""
+    rng = random.Random(seed)
+    start = datetime(2025, 2, 27, tzinfo=timezone.utc)
+    for i in range(count):
+        bios = CAR_BIOS if rng.random() < 0.4 else OTHER_BIOS
+        yield {
+            "username": f"user_{i:07d}",
+            "full_name": f"Synthetic User {i}",
+            "biography": rng.choice(bios),
+            "followers_count": int(rng.lognormvariate(8, 2)),
+            "following_count": int(rng.lognormvariate(6, 1)),
+            # Every few rows share a timestamp, like bulk-imported data does
+            "created_at": (start - timedelta(seconds=i // 3)).isoformat(),
+        }
+
+
+class StageTimer:
+    """Collects per-call latencies for named stages."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - started)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            report[stage] = {
+                "calls": len(ordered),
+                "p50_ms": 1000 * ordered[len(ordered) // 2],
+                "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                "total_s": sum(ordered),
+            }
+        return report
+
+
+class FakeGeminiHandler(geminiHandler):
+    """
+    geminiHandler stand-in that answers locally after a simulated delay.
+
+    Answers are derived from the compact TSV payload, so every requested
+    username gets a verdict unless a fault is injected: rate-limit errors,
+    malformed JSON or a response cut off half way.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, rate_limit_rate: float = 0.0,
+                 malformed_rate: float = 0.0, truncate_rate: float = 0.0, seed: int = 0, tags=()):
+        prompt = AnalysisSchema(tags).prompt if tags else analysis.ANALYSIS_PROMPT
+        super().__init__(analysis.MODEL, prompt, api_key="benchmark")
+        self.tags = list(tags)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.truncate_rate = truncate_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def send_prompt(self, data: dict = None):
+        time.sleep(self._delay())
+        return self._answer(data)
+
+    async def send_prompt_async(self, data: dict = None):
+        await asyncio.sleep(self._delay())
+        return self._answer(data)
+
+    def _delay(self):
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter) * self.latency)
+
+    def _answer(self, data):
+        self.calls += 1
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return f"{ERROR_PREFIX}429 RESOURCE_EXHAUSTED. Quota exceeded."
+        rows = (data or self.data).get("profiles", "").split("\n")[1:]
+        results = []
+        for row in rows:
+            digest = zlib.crc32(row.encode("utf-8"))
+            result = {
+                "username": row.split("\t")[0],
+                "is_car_profile": digest % 2 == 0,
+                "profile_type": PROFILE_TYPES[digest % len(PROFILE_TYPES)],
+            }
+            if self.tags:
+                result["tags"] = [self.tags[(digest >> shift) % len(self.tags)] for shift in (0, 8)]
+            results.append(result)
+        text = "```json\n" + json.dumps(results) + "\n```"
+        roll -= self.rate_limit_rate
+        if roll < self.malformed_rate:
+            return text.replace('"is_car_profile"', 'is_car_profile', 1)
+        roll -= self.malformed_rate
+        if roll < self.truncate_rate:
+            return text[:len(text) // 2]
+        return text
+
+
+class _LatencyQuery:
+    """Query builder proxy that sleeps before execute() to simulate a network round trip."""
+
+    def __init__(self, inner, backend):
+        self._inner = inner
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name == "execute":
+            return self._execute
+        if callable(attr):
+            return lambda *args, **kwargs: _LatencyQuery(attr(*args, **kwargs), self._backend)
+        return _LatencyQuery(attr, self._backend)
+
+    def _execute(self):
+        backend = self._backend
+        time.sleep(max(0.0, backend.latency + backend.rng.uniform(-backend.jitter, backend.jitter) * backend.latency))
+        backend.round_trips += 1
+        if backend.rng.random() < backend.error_rate:
+            raise ConnectionError("Simulated database error")
+        return self._inner.execute()
+
+
+class LatencyBackend(ProfileBackend):
+    """Wraps another backend and adds a delay (and optional errors) to every round trip."""
+
+    def __init__(self, inner: ProfileBackend, latency: float = 0.05, jitter: float = 0.2,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.inner = inner
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.round_trips = 0
+
+    def table(self, name: str):
+        return _LatencyQuery(self.inner.table(name), self)
+
+
+def build_store(args) -> LatencyBackend:
+    store = SQLiteBackend(args.db)
+    started = time.perf_counter()
+    store.seed(synthetic_profiles(args.profiles, args.seed), batch_size=5000)
+    print(f"Seeded {args.profiles:,} synthetic profiles in {time.perf_counter() - started:.1f}s")
+    return LatencyBackend(store, args.db_latency, error_rate=args.db_error_rate, seed=args.seed)
+
+
+def bench_analysis(args) -> Dict[str, Any]:
+    backend = build_store(args)
+    fetcher = ProfileFetcher(backend)
+    updater = ProfileUpdater(backend)
+    schema = AnalysisSchema(DEFAULT_TAGS) if args.tags else None
+    clusters = BioClusterIndex() if args.dedupe else None
+    journal = ResultJournal(os.path.join(tempfile.mkdtemp(), "journal.ndjson")) if args.journal else None
+    handler = FakeGeminiHandler(args.gemini_latency, rate_limit_rate=args.rate_limit_rate,
+                                malformed_rate=args.malformed_rate, truncate_rate=args.truncate_rate,
+                                seed=args.seed, tags=schema.tags if schema else ())
+
+    timer = StageTimer()
+    fetcher.get_unprocessed_profiles = timer.wrap("fetch", fetcher.get_unprocessed_profiles)
+    updater.bulk_update_profiles_analysis = timer.wrap("write", updater.bulk_update_profiles_analysis)
+    handler.send_prompt = timer.wrap("gemini", handler.send_prompt)
+    handler.send_prompt_async = timer.wrap("gemini", handler.send_prompt_async)
+    backend.round_trips = 0
+
+    started = time.perf_counter()
+    if args.mode == "sequential":
+        analysis.process_profiles_in_batches(fetcher, updater, "benchmark", gemini_handler=handler,
+                                             token_budget=args.token_budget, retry_delay=args.retry_delay,
+                                             chunk_delay=args.chunk_delay, schema=schema, clusters=clusters,
+                                             journal=journal)
+    else:
+        governor = RateGovernor(args.rpm, args.tpm, cooldown_seconds=args.retry_delay)
+        run = analysis.run_analysis_pipeline if args.mode == "pipeline" else analysis.process_profiles_concurrently
+        asyncio.run(run(fetcher, updater, "benchmark", batch_size=100 * args.concurrency,
+                        concurrency=args.concurrency, gemini_handler=handler, governor=governor,
+                        token_budget=args.token_budget, schema=schema, clusters=clusters, journal=journal))
+    elapsed = time.perf_counter() - started
+    if journal:
+        journal.close()
+
+    remaining = len(ProfileFetcher(backend.inner).get_unprocessed_profiles(args.profiles))
+    analyzed = args.profiles - remaining
+    return {
+        "scenario": "analysis",
+        "mode": args.mode,
+        "profiles": args.profiles,
+        "analyzed": analyzed,
+        "elapsed_s": elapsed,
+        "profiles_per_hour": analyzed / elapsed * 3600 if elapsed else 0.0,
+        "gemini_calls": handler.calls,
+        "db_round_trips": backend.round_trips,
+        "stages": timer.summary(),
+        **({"journal": journal.stats()} if journal else {}),
+    }
+
+
+def bench_fetch(args) -> Dict[str, Any]:
+    backend = build_store(args)
+    fetcher = ProfileFetcher(backend)
+    timer = StageTimer()
+    backend.round_trips = 0
+
+    started = time.perf_counter()
+    fetched = 0
+    page = timer.wrap("get_profiles", fetcher.get_profiles)
+    for _ in range(max(1, args.fetch_pages)):
+        fetched += len(page(date_column="created_at", limit=args.page_size))
+    limit_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    streamed = sum(1 for _ in fetcher.iter_profiles(page_size=args.page_size, prefetch=True))
+    stream_elapsed = time.perf_counter() - started
+    return {
+        "scenario": "fetch",
+        "profiles": args.profiles,
+        "get_profiles_rows_per_hour": fetched / limit_elapsed * 3600 if limit_elapsed else 0.0,
+        "iter_profiles_rows": streamed,
+        "iter_profiles_rows_per_hour": streamed / stream_elapsed * 3600 if stream_elapsed else 0.0,
+        "db_round_trips": backend.round_trips,
+        "stages": timer.summary(),
+    }
+
+
+def bench_update(args) -> Dict[str, Any]:
+    backend = build_store(args)
+    updater = ProfileUpdater(backend)
+    timer = StageTimer()
+    sample = [{"username": p["username"], "is_car_profile": i % 2 == 0, "profile_type": PROFILE_TYPES[i % 4]}
+              for i, p in enumerate(synthetic_profiles(min(args.profiles, args.update_sample), args.seed))]
+
+    backend.round_trips = 0
+    per_row = timer.wrap("update_profiles_analysis", updater.update_profiles_analysis)
+    started = time.perf_counter()
+    per_row(sample)
+    per_row_elapsed = time.perf_counter() - started
+    per_row_trips = backend.round_trips
+
+    backend.round_trips = 0
+    bulk = timer.wrap("bulk_update_profiles_analysis", updater.bulk_update_profiles_analysis)
+    started = time.perf_counter()
+    bulk(sample)
+    bulk_elapsed = time.perf_counter() - started
+    return {
+        "scenario": "update",
+        "rows": len(sample),
+        "per_row_rows_per_hour": len(sample) / per_row_elapsed * 3600 if per_row_elapsed else 0.0,
+        "per_row_round_trips": per_row_trips,
+        "bulk_rows_per_hour": len(sample) / bulk_elapsed * 3600 if bulk_elapsed else 0.0,
+        "bulk_round_trips": backend.round_trips,
+        "stages": timer.summary(),
+    }
+
+
+SCENARIOS = {"analysis": bench_analysis, "fetch": bench_fetch, "update": bench_update}
+
+
+def run_scenario(name: str, args) -> Dict[str, Any]:
+    metrics.registry.reset()
+    tracemalloc.start()
+    try:
+        report = SCENARIOS[name](args)
+        report["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+    report["counters"] = metrics.snapshot()["counters"]
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n== {report['scenario']} ==")
+    for key, value in report.items():
+        if key in ("scenario", "stages", "counters"):
+            continue
+        print(f"{key:>32}: {value:,.1f}" if isinstance(value, float) else f"{key:>32}: {value}")
+    for key, value in sorted(report["counters"].items()):
+        print(f"{key:>32}: {value:,.1f}" if isinstance(value, float) else f"{key:>32}: {value:,}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:>32}: {stats['calls']} calls, p50 {stats['p50_ms']:.1f} ms, "
+              f"p99 {stats['p99_ms']:.1f} ms, total {stats['total_s']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark profile analysis throughput with simulated services')
+    parser.add_argument('--scenario', choices=[*SCENARIOS, 'all'], default='analysis')
+    parser.add_argument('--profiles', type=int, default=10_000, help='Synthetic profiles to generate')
+    parser.add_argument('--mode', choices=['sequential', 'concurrent', 'pipeline'], default='pipeline',
+                        help='Analysis loop to drive')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--token-budget', type=int, default=4000)
+    parser.add_argument('--rpm', type=int, default=2000, help='Rate governor requests per minute')
+    parser.add_argument('--tpm', type=int, default=4_000_000, help='Rate governor tokens per minute')
+    parser.add_argument('--gemini-latency', type=float, default=0.5, help='Mean seconds per Gemini call')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of calls returning 429')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Fraction of calls with broken JSON')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Fraction of calls cut off mid-array')
+    parser.add_argument('--db-latency', type=float, default=0.03, help='Mean seconds per database round trip')
+    parser.add_argument('--db-error-rate', type=float, default=0.0, help='Fraction of round trips that fail')
+    parser.add_argument('--retry-delay', type=float, default=0.5, help='Seconds to back off after a rate limit')
+    parser.add_argument('--chunk-delay', type=float, default=1.0, help='Pause after each sequential chunk')
+    parser.add_argument('--page-size', type=int, default=1000, help='Rows per page in the fetch scenario')
+    parser.add_argument('--fetch-pages', type=int, default=20, help='get_profiles calls in the fetch scenario')
+    parser.add_argument('--update-sample', type=int, default=2000, help='Rows written in the update scenario')
+    parser.add_argument('--tags', action='store_true', help='Derive tags along with the classification')
+    parser.add_argument('--dedupe', action='store_true', help='Send near-duplicate bios once per cluster')
+    parser.add_argument('--journal', action='store_true', help='Journal results (fsync\'d) before writing them')
+    parser.add_argument('--db', default=':memory:', help='SQLite file behind the simulated store')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print reports as JSON lines')
+    parser.add_argument('--log-level', default='WARNING', help='Log level for the code under test')
+    args = parser.parse_args()
+    metrics.configure_logging(args.log_level)
+
+    names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    for name in names:
+        report = run_scenario(name, args)
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report)
+
+
+if __name__ == "__main__":
+    main()
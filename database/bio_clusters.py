@@ -0,0 +1,214 @@
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_NOISE = re.compile(r"(?:https?://|www\.)\S+|@\w+")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_text(profile: Dict[str, Any]) -> str:
+    """Biography plus full name, lower-cased, with links, handles and numbers blanked out."""
+    text = " ".join(filter(None, [profile.get('biography'), profile.get('full_name')])).lower()
+    text = _DIGITS.sub("0", _NOISE.sub(" ", text))
+    return " ".join(text.split())
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm so LSH candidates best match `threshold`.
+
+    Minimizes the area under the false positive curve below the threshold plus
+    the area under the false negative curve above it.
+    """
+    grid = np.linspace(0, 1, 201)
+    below = grid < threshold
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        # Probability that a pair with similarity `grid` shares at least one band
+        candidate = 1 - (1 - grid ** rows) ** bands
+        error = candidate[below].sum() + (1 - candidate[~below]).sum()
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class _Cluster:
+    __slots__ = ("id", "signature", "size", "verdict")
+
+    def __init__(self, cluster_id, signature):
+        self.id = cluster_id
+        self.signature = signature
+        self.size = 0
+        self.verdict = None
+
+
+class BioClusterIndex:
+    """
+    Incremental MinHash/LSH index that groups profiles with near-identical bios.
+
+    Each profile's bio and name are normalized and cut into character
+    shingles, whose MinHash signature estimates Jaccard similarity. Banded LSH
+    finds candidate clusters, and a profile joins the first cluster whose
+    founding profile it resembles at or above `threshold`; otherwise it starts
+    a new cluster. Only the founder's signature is indexed, so memory grows
+    with the number of clusters, not profiles.
+
+    Once one member of a cluster has been analyzed, its verdict is reused for
+    every other member, so dealership chains, franchises and boilerplate bios
+    are sent to the model once.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, shingle_size: int = 5,
+                 min_chars: int = 25, seed: int = 1):
+        """
+        Args:
+            threshold (float): Estimated Jaccard similarity (0-1) needed to join a cluster.
+            num_perm (int): MinHash permutations; more gives better estimates at more CPU.
+            shingle_size (int): Characters per shingle.
+            min_chars (int): Shorter normalized texts are never clustered, since a
+                             bare name or emoji says too little to share a verdict.
+            seed (int): Seed of the hash permutations.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.min_chars = min_chars
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._buckets: List[Dict[bytes, List[_Cluster]]] = [{} for _ in range(self.bands)]
+        self._clusters: List[_Cluster] = []
+        self._by_username: Dict[str, _Cluster] = {}
+        self.counts = {'seen': 0, 'indexed': 0, 'too_short': 0, 'sent': 0, 'resolved': 0}
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the character shingles of `text`."""
+        k = self.shingle_size
+        shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+    def add(self, profile: Dict[str, Any]) -> Optional[_Cluster]:
+        """Place a profile in its cluster (creating one if needed); None if its text is too short."""
+        username = profile['username']
+        cluster = self._by_username.get(username)
+        if cluster is not None:
+            return cluster
+        text = normalize_text(profile)
+        if len(text) < self.min_chars:
+            self.counts['too_short'] += 1
+            return None
+
+        signature = self.signature(text)
+        keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+        cluster = self._match(signature, keys)
+        if cluster is None:
+            cluster = _Cluster(len(self._clusters), signature)
+            self._clusters.append(cluster)
+            for bucket, key in zip(self._buckets, keys):
+                bucket.setdefault(key, []).append(cluster)
+        cluster.size += 1
+        self._by_username[username] = cluster
+        self.counts['indexed'] += 1
+        return cluster
+
+    def group(self, profiles: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]],
+                                                           Dict[str, List[Dict[str, Any]]]]:
+        """
+        Sort a batch by what the model needs to see, without recording any statistics.
+
+        Returns:
+            Tuple: Profiles whose cluster already has a verdict, the profiles to
+            send (the first of each cluster plus every unclustered profile), and
+            the other members keyed by the username sent for their cluster.
+        """
+        known, send, followers = [], [], {}
+        leaders = {}
+        for profile in profiles:
+            cluster = self.add(profile)
+            if cluster is None:
+                send.append(profile)
+            elif cluster.verdict is not None:
+                known.append(profile)
+            elif cluster.id in leaders:
+                followers.setdefault(leaders[cluster.id], []).append(profile)
+            else:
+                leaders[cluster.id] = profile['username']
+                send.append(profile)
+        return known, send, followers
+
+    def split(self, profiles: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]],
+                                                           Dict[str, List[Dict[str, Any]]]]:
+        """
+        Separate the profiles whose cluster already has a verdict, and hold back duplicates within the batch.
+
+        Returns:
+            Tuple: Results reused from analyzed cluster members, the profiles to
+            send, and the held-back members keyed by the username sent for their
+            cluster (pass them to propagate with the model's results).
+        """
+        known, send, followers = self.group(profiles)
+        resolved = [dict(self._by_username[p['username']].verdict, username=p['username']) for p in known]
+        self.counts['seen'] += len(profiles)
+        self.counts['sent'] += len(send)
+        self.counts['resolved'] += len(resolved)
+        metrics.incr('resolved_by_cluster', len(resolved))
+        return resolved, send, followers
+
+    def propagate(self, results: List[Dict[str, Any]],
+                  followers: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Record the model's verdicts on their clusters and copy them to the held-back members.
+
+        Returns:
+            List[Dict[str, Any]]: One result per follower whose leader got a verdict.
+        """
+        followers = followers or {}
+        copied = []
+        for result in results:
+            username = result.get('username')
+            cluster = self._by_username.get(username)
+            if cluster is not None and cluster.verdict is None:
+                cluster.verdict = {k: v for k, v in result.items() if k != 'username'}
+            for profile in followers.get(username, ()):
+                copied.append(dict(result, username=profile['username']))
+        self.counts['resolved'] += len(copied)
+        metrics.incr('resolved_by_cluster', len(copied))
+        return copied
+
+    def report(self) -> Dict[str, Any]:
+        """Cluster counts and how many profiles were settled by a cluster verdict."""
+        sizes = [cluster.size for cluster in self._clusters]
+        seen = self.counts['seen']
+        return dict(
+            self.counts,
+            clusters=len(sizes),
+            multi_member_clusters=sum(1 for size in sizes if size > 1),
+            largest_cluster=max(sizes, default=0),
+            resolved_fraction=self.counts['resolved'] / seen if seen else 0.0,
+            bands=self.bands,
+            rows=self.rows,
+        )
+
+    def _match(self, signature, keys):
+        seen = set()
+        for bucket, key in zip(self._buckets, keys):
+            for cluster in bucket.get(key, ()):
+                if cluster.id in seen:
+                    continue
+                seen.add(cluster.id)
+                if np.count_nonzero(cluster.signature == signature) >= self.threshold * self.num_perm:
+                    return cluster
+        return None
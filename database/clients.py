@@ -0,0 +1,56 @@
+"""
+Process-wide registry of SDK clients.
+
+The Supabase and Gemini SDKs are imported on first use rather than at module
+load, and each client is built once per set of credentials and then shared,
+so ProfileFetcher, ProfileUpdater and every geminiHandler in a process reuse
+the same client and its pool of keep-alive HTTP connections.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, ...], Any] = {}
+
+
+def get_supabase_client(url: Optional[str] = None, key: Optional[str] = None):
+    """Shared Supabase client for `url`/`key` (SUPABASE_URL and SUPABASE_KEY by default)."""
+    url = url or os.getenv("SUPABASE_URL")
+    key = key or os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("Missing Supabase credentials in .env file")
+
+    def build():
+        from supabase import create_client
+        return create_client(url, key)
+
+    return _get(("supabase", url, key), build)
+
+
+def get_genai_client(api_key: str):
+    """Shared google-genai client for `api_key`."""
+    if not api_key:
+        raise ValueError("Please provide a Gemini API key")
+
+    def build():
+        from google import genai
+        return genai.Client(api_key=api_key)
+
+    return _get(("genai", api_key), build)
+
+
+def reset():
+    """Forget every cached client, e.g. after a fork or when credentials change."""
+    with _lock:
+        _clients.clear()
+
+
+def _get(key, build):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = build()
+    return client
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Segment-templated cold emails.
+
+Writing every email with its own Gemini call would cost far more than the
+classification did. Instead, analyzed profiles are grouped into segments by
+profile_type, primary tag and follower tier. One request writes the templates
+for several segments at once, and each email is rendered locally from the
+profile's name, username and bio. Only high-value accounts (many followers or
+a verified badge) can get an optional per-profile touch-up from the model,
+and those are batched too.
+
+Templates are cached by segment, campaign and prompt version, so later runs
+and later windows of the same run reuse them. Emails are written to an
+NDJSON file as each window of profiles is rendered:
+
+    python email_campaign.py emails.ndjson --sender "Apex Detailing" \\
+        --offer "ceramic coating packages" --touch-up-followers 100000
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from follower_tiers import follower_tier
+from gemini.analysis_cache import AnalysisCache
+from gemini.analysis_schema import DEFAULT_TAGS, load_tag_vocabulary, prompt_version
+from gemini.geminihandler import geminiHandler, is_error_response, is_rate_limit_response
+from gemini.prompt_packing import encode_profiles_compact
+from gemini.response_parser import extract_json_objects
+
+MODEL = 'gemini-2.0-flash'
+
+TEMPLATE_PROMPT = '''You write short cold outreach emails for {sender}, offering: {offer}.
+                    Write one email template for each audience segment below. Segments are given as tab-separated rows
+                    (segment, profile_type, tag, follower_tier, example_bios) under a header line.
+                    Each template must read as personal to anyone in its segment. Use these placeholders, in curly braces,
+                    where the recipient's details belong: {{first_name}}, {{username}}, {{bio_hook}} (a short phrase from
+                    their bio) and {{sender}}. Do not invent any other placeholders or facts about the recipient.
+                    Respond with a JSON array of objects with "segment", "subject" and "body", without markdown formatting.'''
+
+TOUCH_UP_PROMPT = '''You polish cold outreach emails from {sender}, offering: {offer}.
+                    Each draft below is written for one recipient, with their name and bio.
+                    Make small edits so the draft speaks to that recipient specifically, keeping its length and offer.
+                    Respond with a JSON array of objects with "username", "subject" and "body", without markdown formatting.'''
+
+# Used when the model gives no usable template for a segment
+FALLBACK_TEMPLATE = {
+    "subject": "Quick idea for @{username}",
+    "body": "Hi {first_name},\n\nI came across your page and loved {bio_hook}. "
+            "I think what we do could be a good fit for you.\n\nWould you be open to a quick chat?\n\n{sender}",
+}
+
+EMAIL_COLUMNS = ["username", "full_name", "biography", "followers_count", "is_verified", "profile_type", "tags"]
+SEGMENT_FIELDS = ("segment", "profile_type", "tag", "follower_tier", "example_bios")
+
+_PLACEHOLDER = re.compile(r"\{(first_name|username|bio_hook|sender)\}")
+_ANY_PLACEHOLDER = re.compile(r"\{\w+\}")
+_BIO_NOISE = re.compile(r"(?:https?://|www\.)\S+|[@#]\w+")
+
+logger = logging.getLogger(__name__)
+
+Segment = Tuple[str, str, str]
+
+
+def segment_of(profile: Dict[str, Any], tag_rank: Dict[str, int]) -> Segment:
+    """(profile_type, primary tag, follower tier) of a profile; the primary tag is its earliest in the vocabulary."""
+    tags = profile.get("tags") or []
+    if isinstance(tags, str):
+        tags = json.loads(tags) if tags.startswith("[") else tags.split(",")
+    ranked = [tag for tag in tags if tag in tag_rank]
+    tag = min(ranked, key=tag_rank.__getitem__) if ranked else "none"
+    return (profile.get("profile_type") or "unknown", tag, follower_tier(profile.get("followers_count")))
+
+
+def segment_id(segment: Segment) -> str:
+    return "|".join(segment)
+
+
+def first_name(profile: Dict[str, Any]) -> str:
+    words = [w for w in (profile.get("full_name") or "").split() if any(c.isalpha() for c in w)]
+    return words[0].strip(".,|-") if words else f"@{profile['username']}"
+
+
+def bio_hook(biography: Optional[str], max_chars: int = 60) -> str:
+    """First phrase of a bio without links, handles or hashtags, cut at a word boundary."""
+    text = _BIO_NOISE.sub("", biography or "")
+    phrase = re.split(r"[\n.!?|•]", text.strip(), maxsplit=1)[0]
+    phrase = " ".join(phrase.split()).strip(" -,:;")
+    if len(phrase) > max_chars:
+        phrase = phrase[:max_chars].rsplit(" ", 1)[0]
+    return phrase or "your page"
+
+
+def render(template: Dict[str, str], fields: Dict[str, str]) -> Dict[str, str]:
+    """Fill the known placeholders of a template; any other braces are left as they are."""
+    fill = lambda text: _PLACEHOLDER.sub(lambda m: fields[m.group(1)], text or "")
+    return {"subject": fill(template.get("subject")), "body": fill(template.get("body"))}
+
+
+class EmailCampaign:
+    """
+    Renders one email per profile from per-segment templates.
+
+    Templates come from memory, then the cache, then batched Gemini requests
+    holding up to `segments_per_request` segments each.
+    """
+
+    def __init__(self, template_handler: geminiHandler, sender: str, offer: str,
+                 touch_up_handler: Optional[geminiHandler] = None, cache: Optional[AnalysisCache] = None,
+                 tag_vocabulary: Sequence[str] = DEFAULT_TAGS, segments_per_request: int = 8,
+                 samples_per_segment: int = 3, touch_up_followers: Optional[int] = None,
+                 touch_up_verified: bool = False, touch_up_batch: int = 5, max_retries: int = 3,
+                 retry_delay: float = 30):
+        """
+        Args:
+            template_handler (geminiHandler): Handler whose prompt is TEMPLATE_PROMPT filled in for the campaign.
+            sender (str): Who the emails are from.
+            offer (str): What the emails offer.
+            touch_up_handler (geminiHandler, optional): Handler for per-profile touch-ups (TOUCH_UP_PROMPT).
+            cache (AnalysisCache, optional): Persistent template cache.
+            tag_vocabulary (Sequence[str]): Tags in order of preference for picking a profile's primary tag.
+            segments_per_request (int): Segments whose templates are written in one request.
+            samples_per_segment (int): Example bios shown to the model for each segment.
+            touch_up_followers (int, optional): Follower count from which an email is touched up.
+            touch_up_verified (bool): Also touch up emails to verified accounts.
+            touch_up_batch (int): Emails touched up per request.
+            max_retries (int): Attempts per request before falling back.
+            retry_delay (float): Seconds to wait after a rate-limit error.
+        """
+        self.template_handler = template_handler
+        self.touch_up_handler = touch_up_handler
+        self.sender = sender
+        self.offer = offer
+        self.cache = cache
+        self.tag_rank = {tag: rank for rank, tag in enumerate(tag_vocabulary)}
+        self.segments_per_request = segments_per_request
+        self.samples_per_segment = samples_per_segment
+        self.touch_up_followers = touch_up_followers
+        self.touch_up_verified = touch_up_verified
+        self.touch_up_batch = touch_up_batch
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.version = prompt_version(template_handler.model, template_handler.prompt)
+        self.templates: Dict[Segment, Dict[str, str]] = {}
+        self.stats = {"emails": 0, "segments": 0, "templates_generated": 0, "template_cache_hits": 0,
+                      "template_fallbacks": 0, "template_requests": 0, "touched_up": 0, "touch_up_requests": 0}
+
+    def generate(self, profiles: Iterable[Dict[str, Any]], window: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one email record per profile, working through `window` profiles at a time.
+
+        Yields:
+            Dict[str, Any]: username, full_name, segment, subject, body and touched_up.
+        """
+        batch = []
+        for profile in profiles:
+            batch.append(profile)
+            if len(batch) >= window:
+                yield from self._render_window(batch)
+                batch = []
+        if batch:
+            yield from self._render_window(batch)
+
+    def ensure_templates(self, samples: Dict[Segment, List[Dict[str, Any]]]):
+        """Make sure every segment in `samples` has a template, generating the missing ones in batched requests."""
+        missing = [segment for segment in samples if segment not in self.templates]
+        if self.cache and missing:
+            for segment in list(missing):
+                template = self.cache.get(self._cache_key(segment))
+                if template:
+                    self.templates[segment] = template
+                    self.stats["template_cache_hits"] += 1
+                    missing.remove(segment)
+
+        for i in range(0, len(missing), self.segments_per_request):
+            group = missing[i:i + self.segments_per_request]
+            found = self._request_templates(group, samples)
+            # Ask once more for the segments the response left out
+            retry = [segment for segment in group if segment_id(segment) not in found]
+            if retry:
+                found.update(self._request_templates(retry, samples))
+            for segment in group:
+                template = found.get(segment_id(segment))
+                if template:
+                    self.stats["templates_generated"] += 1
+                    if self.cache:
+                        self.cache.put(self._cache_key(segment), template)
+                else:
+                    # Not cached, so the next run asks the model again
+                    template = FALLBACK_TEMPLATE
+                    self.stats["template_fallbacks"] += 1
+                    logger.warning("No usable template for segment %s, using the fallback", segment_id(segment))
+                self.templates[segment] = template
+        self.stats["segments"] = len(self.templates)
+
+    def _render_window(self, profiles):
+        segments = [segment_of(profile, self.tag_rank) for profile in profiles]
+        samples = {}
+        for profile, segment in zip(profiles, segments):
+            bucket = samples.setdefault(segment, [])
+            if len(bucket) < self.samples_per_segment and profile.get("biography"):
+                bucket.append(profile)
+        self.ensure_templates(samples)
+
+        records = []
+        for profile, segment in zip(profiles, segments):
+            email = render(self.templates[segment], {
+                "first_name": first_name(profile),
+                "username": profile["username"],
+                "bio_hook": bio_hook(profile.get("biography")),
+                "sender": self.sender,
+            })
+            records.append(dict(username=profile["username"], full_name=profile.get("full_name"),
+                                segment=segment_id(segment), touched_up=False, **email))
+
+        if self.touch_up_handler:
+            self._touch_up([(record, profile) for record, profile in zip(records, profiles)
+                            if self._is_high_value(profile)])
+        self.stats["emails"] += len(records)
+        metrics.incr("emails_rendered", len(records))
+        return records
+
+    def _request_templates(self, group, samples):
+        rows = [{
+            "segment": segment_id(segment),
+            "profile_type": segment[0],
+            "tag": segment[1],
+            "follower_tier": segment[2],
+            "example_bios": " | ".join(bio_hook(p.get("biography"), 120) for p in samples.get(segment, [])),
+        } for segment in group]
+        self.stats["template_requests"] += 1
+        response = self._send(self.template_handler, {"segments": encode_profiles_compact(rows, SEGMENT_FIELDS, 0)})
+        found = {}
+        for obj in extract_json_objects(response or "", key="segment"):
+            template = {"subject": obj.get("subject"), "body": obj.get("body")}
+            if not all(isinstance(text, str) and text for text in template.values()):
+                continue
+            # A placeholder we cannot fill would be sent to the recipient as is
+            if any(_ANY_PLACEHOLDER.search(_PLACEHOLDER.sub("", text)) for text in template.values()):
+                continue
+            found.setdefault(str(obj["segment"]), template)
+        metrics.incr("email_templates_generated", len(found))
+        return found
+
+    def _is_high_value(self, profile):
+        if self.touch_up_verified and profile.get("is_verified"):
+            return True
+        return self.touch_up_followers is not None and (profile.get("followers_count") or 0) >= self.touch_up_followers
+
+    def _touch_up(self, pairs):
+        for i in range(0, len(pairs), self.touch_up_batch):
+            group = pairs[i:i + self.touch_up_batch]
+            drafts = [{"username": record["username"], "full_name": profile.get("full_name"),
+                       "biography": profile.get("biography"), "subject": record["subject"], "body": record["body"]}
+                      for record, profile in group]
+            self.stats["touch_up_requests"] += 1
+            response = self._send(self.touch_up_handler,
+                                  self.touch_up_handler.profiles_payload(drafts, compact=False))
+            by_username = {record["username"]: record for record, _ in group}
+            for obj in extract_json_objects(response or ""):
+                record = by_username.pop(str(obj.get("username")), None)
+                if record and obj.get("subject") and obj.get("body"):
+                    record.update(subject=obj["subject"], body=obj["body"], touched_up=True)
+                    self.stats["touched_up"] += 1
+                    metrics.incr("emails_touched_up")
+
+    def _send(self, handler, data):
+        """Send one request, retrying errors; returns None once `max_retries` attempts have failed."""
+        for attempt in range(1, self.max_retries + 1):
+            response = handler.send_prompt(data)
+            if not is_error_response(response):
+                return response
+            logger.warning("%s (attempt %d/%d)", response, attempt, self.max_retries)
+            if attempt < self.max_retries:
+                time.sleep(self.retry_delay if is_rate_limit_response(response) else 1)
+        return None
+
+    def _cache_key(self, segment):
+        campaign = json.dumps([self.version, self.sender, self.offer, segment_id(segment)], ensure_ascii=False)
+        return "email-template:" + campaign
+
+
+def write_emails(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Stream email records to an NDJSON file and return how many were written."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from backends.factory import create_backend
+    from profile_fetcher import ProfileFetcher
+
+    parser = argparse.ArgumentParser(description='Write segment-templated cold emails for analyzed profiles')
+    parser.add_argument('output', help='NDJSON file the emails are streamed to')
+    parser.add_argument('--sender', required=True, help='Who the emails are from (name or business)')
+    parser.add_argument('--offer', required=True, help='What the emails offer')
+    parser.add_argument('--backend', help='Profile storage, e.g. "supabase" or "sqlite:///profiles.sqlite3" '
+                                          '(defaults to PROFILE_BACKEND, then supabase)')
+    parser.add_argument('--all', action='store_true', help='Include profiles not classified as car-related')
+    parser.add_argument('--profile-type', type=str.lower, help='Only profiles of this type')
+    parser.add_argument('--min-followers', type=int, help='Only profiles with at least this many followers')
+    parser.add_argument('--limit', type=int, help='Maximum number of emails to write')
+    parser.add_argument('--tag-vocabulary', help='Tag vocabulary file, in order of preference for segmenting')
+    parser.add_argument('--segments-per-request', type=int, default=8, help='Templates written per Gemini request')
+    parser.add_argument('--window', type=int, default=1000, help='Profiles segmented and rendered at a time')
+    parser.add_argument('--touch-up-followers', type=int,
+                        help='Have Gemini personalize emails to accounts with at least this many followers')
+    parser.add_argument('--touch-up-verified', action='store_true', help='Also personalize emails to verified accounts')
+    parser.add_argument('--cache-path', default='email_templates.sqlite3', help='SQLite file caching templates')
+    parser.add_argument('--no-cache', action='store_true', help='Always ask Gemini for new templates')
+    parser.add_argument('--model', default=MODEL, help='Gemini model')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    args = parser.parse_args()
+
+    metrics.configure_logging(args.log_level)
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    fields = {"sender": args.sender, "offer": args.offer}
+    template_handler = geminiHandler(args.model, TEMPLATE_PROMPT.format(**fields), api_key)
+    touch_up_handler = None
+    if args.touch_up_followers is not None or args.touch_up_verified:
+        touch_up_handler = geminiHandler(args.model, TOUCH_UP_PROMPT.format(**fields), api_key)
+    cache = None if args.no_cache else AnalysisCache(args.cache_path)
+    campaign = EmailCampaign(
+        template_handler, args.sender, args.offer,
+        touch_up_handler=touch_up_handler,
+        cache=cache,
+        tag_vocabulary=load_tag_vocabulary(args.tag_vocabulary) if args.tag_vocabulary else DEFAULT_TAGS,
+        segments_per_request=args.segments_per_request,
+        touch_up_followers=args.touch_up_followers,
+        touch_up_verified=args.touch_up_verified
+    )
+
+    where = [] if args.all else [("is_car_profile", "eq", True)]
+    if args.profile_type:
+        where.append(("profile_type", "eq", args.profile_type))
+    if args.min_followers is not None:
+        where.append(("followers_count", "gte", args.min_followers))
+    fetcher = ProfileFetcher(create_backend(args.backend))
+    profiles = fetcher.iter_profiles(select_columns=EMAIL_COLUMNS, page_size=min(args.window, 1000),
+                                     prefetch=True, where=where)
+    if args.limit:
+        profiles = islice(profiles, args.limit)
+
+    written = write_emails(campaign.generate(profiles, args.window), args.output)
+    print(f"Wrote {written} emails to {args.output}")
+    print(f"Email campaign: {json.dumps(campaign.stats)}")
+    if cache:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
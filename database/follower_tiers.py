@@ -0,0 +1,19 @@
+"""
+Follower-count tiers shared by the segmentation code.
+
+Kept free of NumPy so the email campaign can bucket profiles without loading
+it; ProfileTable does the same lookup per column with np.searchsorted.
+"""
+import bisect
+from typing import Optional
+
+# Lower follower bound of each tier
+FOLLOWER_TIERS = {"nano": 0, "micro": 1_000, "mid": 10_000, "macro": 100_000, "mega": 1_000_000}
+TIER_NAMES = tuple(FOLLOWER_TIERS)
+# Upper bounds of every tier but the last, for bisect/searchsorted
+TIER_BOUNDS = tuple(FOLLOWER_TIERS.values())[1:]
+
+
+def follower_tier(followers: Optional[int]) -> str:
+    """Name of the tier a follower count falls in; a missing count is nano."""
+    return TIER_NAMES[bisect.bisect_right(TIER_BOUNDS, followers or 0)]
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from gemini.prompt_packing import PROMPT_FIELDS
+
+
+class AnalysisCache:
+    """
+    On-disk cache of Gemini analysis results keyed by profile content.
+
+    The key is a hash of the prompt version plus the profile fields the prompt
+    actually reads, so a profile is only sent to the model again when one of
+    those fields or the prompt changes. Entries live in a SQLite file and the
+    least recently used ones are evicted once `max_entries` is exceeded.
+    """
+
+    PROMPT_FIELDS = PROMPT_FIELDS
+
+    def __init__(self, path: str = "analysis_cache.sqlite3", prompt_version: str = "", max_entries: int = 500_000):
+        """
+        Args:
+            path (str): SQLite file to store the cache in (":memory:" for a throwaway cache).
+            prompt_version (str): Identifier of the prompt and model; changing it invalidates every entry.
+            max_entries (int): Maximum number of cached results kept before LRU eviction.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.path = path
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+    def key_for(self, profile: Dict[str, Any]) -> str:
+        """Hash the prompt-relevant fields of a profile together with the prompt version."""
+        payload = [self.prompt_version] + [profile.get(field) or "" for field in self.PROMPT_FIELDS]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get_many(self, profiles: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split profiles into cached results and profiles that still need analysis.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Cached analysis results
+            (with the current username) and the profiles that missed the cache.
+        """
+        with metrics.timer("cache_lookup"):
+            keys = [self.key_for(profile) for profile in profiles]
+            found = self._get_values(keys)
+
+        results, misses = [], []
+        for profile, key in zip(profiles, keys):
+            if key in found:
+                result = dict(found[key])
+                result["username"] = profile["username"]
+                results.append(result)
+            else:
+                misses.append(profile)
+        self.hits += len(results)
+        self.misses += len(misses)
+        metrics.incr("cache_hits", len(results))
+        metrics.incr("cache_misses", len(misses))
+        return results, misses
+
+    def put_many(self, profiles: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+        """Store analysis results for the profiles they belong to, matched on username."""
+        by_username = {r.get("username"): r for r in results if isinstance(r, dict)}
+        entries = {}
+        for profile in profiles:
+            result = by_username.get(profile["username"])
+            if result is not None:
+                entries[self.key_for(profile)] = result
+        self._put_values(entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look up a single value by an arbitrary key."""
+        value = self._get_values([key]).get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store a single JSON-serializable value under an arbitrary key."""
+        self._put_values({key: value})
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_values(self, keys):
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            for key, value in self._select(keys, "key, value"):
+                found[key] = json.loads(value)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE analysis_cache SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _put_values(self, entries):
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            existing = len(self._select(list(entries), "key"))
+            self._conn.executemany(
+                "INSERT INTO analysis_cache (key, value, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+                [(key, json.dumps(value, ensure_ascii=False), now) for key, value in entries.items()]
+            )
+            self._conn.commit()
+            self._size += len(entries) - existing
+            self._evict()
+
+    def _select(self, keys, columns):
+        rows = []
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(self._conn.execute(
+                f"SELECT {columns} FROM analysis_cache WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    def _evict(self):
+        if self._size <= self.max_entries:
+            return
+        # Evict a little extra so eviction does not run on every insert
+        excess = min(self._size, self._size - self.max_entries + max(1, self.max_entries // 20))
+        self._conn.execute(
+            "DELETE FROM analysis_cache WHERE key IN "
+            "(SELECT key FROM analysis_cache ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+        self.evictions += excess
+        self._size -= excess
@@ -0,0 +1,124 @@
+"""
+What the model is asked to return for each profile, and how answers are validated.
+
+The default schema is the original classification (is_car_profile and
+profile_type). A schema with a tag vocabulary asks for a multi-label "tags"
+list in the same request, so every derived field costs one read, one prompt
+and one write per profile. Tags outside the vocabulary are dropped.
+
+Tags are stored in the profiles.tags column; on Supabase add it by running
+database/migrations/supabase_add_tags.sql:
+
+    alter table profiles add column if not exists tags jsonb;
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+PROFILE_TYPES = ("individual", "company", "car page", "unknown")
+
+# Managed vocabulary used when tagging is enabled without a vocabulary file
+DEFAULT_TAGS = (
+    "dealership", "detailing", "wraps-and-tint", "tuning", "performance-parts", "repair-shop",
+    "racing", "drifting", "car-meets", "jdm", "euro", "muscle", "exotic", "classic", "off-road",
+    "motorcycles", "ev", "photography", "content-creator", "influencer", "collector", "rental",
+    "car-sales", "lifestyle", "fitness", "fashion", "food", "travel", "music", "real-estate",
+)
+
+CLASSIFICATION_PROMPT = '''Analyze the following profiles and respond with a JSON array where each object has:
+                    - "username": the profile's username
+                    - "is_car_profile": boolean indicating if the profile is car-related
+                    - "profile_type": either "Individual", "Company", "Car Page", or "unknown"
+                    Profiles are given as tab-separated rows (username, full_name, biography) under a header line.
+                    Format the response as a JSON array without any markdown formatting.'''
+
+TAGGED_PROMPT = '''Analyze the following profiles and respond with a JSON array where each object has:
+                    - "username": the profile's username
+                    - "is_car_profile": boolean indicating if the profile is car-related
+                    - "profile_type": either "Individual", "Company", "Car Page", or "unknown"
+                    - "tags": a list of at most {max_tags} tags describing the profile, chosen only from: {tags}. Use [] if none apply.
+                    Profiles are given as tab-separated rows (username, full_name, biography) under a header line.
+                    Format the response as a JSON array without any markdown formatting.'''
+
+
+def normalize_tag(tag: Any) -> str:
+    """Lower-case a tag and join its words with hyphens, e.g. "Car Meets" -> "car-meets"."""
+    return "-".join(str(tag).strip().lower().replace("_", " ").split())
+
+
+def load_tag_vocabulary(path: str) -> List[str]:
+    """
+    Read a tag vocabulary file: a JSON array, or one tag per line with '#' comments.
+
+    Returns:
+        List[str]: The normalized tags, without duplicates, in file order.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        tags = json.loads(text)
+    else:
+        tags = [line.split("#", 1)[0] for line in text.splitlines()]
+    return list(dict.fromkeys(normalize_tag(tag) for tag in tags if str(tag).strip()))
+
+
+def prompt_version(model: str, prompt: str) -> str:
+    """Identifier of a model and prompt; cached analyses are only reused while it stays the same."""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+class AnalysisSchema:
+    """
+    Fields requested per profile, the prompt that asks for them and the validation of answers.
+    """
+
+    def __init__(self, tags: Optional[Sequence[str]] = None, max_tags: int = 5):
+        """
+        Args:
+            tags (Sequence[str], optional): Tag vocabulary; None or empty disables tagging.
+            max_tags (int): Maximum number of tags kept per profile.
+        """
+        if max_tags <= 0:
+            raise ValueError("max_tags must be positive")
+        self.tags = tuple(dict.fromkeys(normalize_tag(tag) for tag in tags or ()))
+        self.max_tags = max_tags
+        self._vocabulary = frozenset(self.tags)
+        if self.tags:
+            self.fields = ("is_car_profile", "profile_type", "tags")
+            self.prompt = TAGGED_PROMPT.format(max_tags=max_tags, tags=", ".join(self.tags))
+        else:
+            self.fields = ("is_car_profile", "profile_type")
+            self.prompt = CLASSIFICATION_PROMPT
+
+    @property
+    def tagging(self) -> bool:
+        return bool(self.tags)
+
+    @property
+    def output_tokens_per_profile(self) -> int:
+        """Rough allowance for the JSON the model writes back for each profile."""
+        return 25 + (6 * self.max_tags if self.tagging else 0)
+
+    def clean(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Validate one answer object.
+
+        Returns:
+            Dict[str, Any]: The answer with its tags normalized and limited to the
+                            vocabulary, or None if a required field is missing.
+        """
+        if "is_car_profile" not in result:
+            return None
+        if not self.tagging:
+            return result
+        tags = result.get("tags")
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        if not isinstance(tags, list):
+            return None
+        kept = [tag for tag in dict.fromkeys(normalize_tag(t) for t in tags) if tag in self._vocabulary]
+        return dict(result, tags=kept[:self.max_tags])
+
+
+# Classification only, as sent before tagging existed
+CLASSIFICATION_SCHEMA = AnalysisSchema()
@@ -1,8 +1,27 @@
-from google import genai
+import json
+import re
 
-import asyncio
-import os
-from dotenv import load_dotenv
+import metrics
+from clients import get_genai_client
+from gemini.prompt_packing import PROMPT_FIELDS, encode_profiles_compact
+
+
+ERROR_PREFIX = "An error occurred: "
+# "429" only as a standalone status code, not inside a username echoed in the message
+RATE_LIMIT_MARKERS = re.compile(r"quota exceeded|rate limit|resource_exhausted|\b429\b", re.IGNORECASE)
+
+
+def is_error_response(response: str) -> bool:
+    """Return True if a send_prompt result is an error message rather than model output."""
+    return (response or "").startswith(ERROR_PREFIX)
+
+
+def is_rate_limit_response(response: str) -> bool:
+    """Return True if a send_prompt result is a quota or rate-limit error."""
+    # Only error messages are checked, so a username like "garage429" cannot trip it
+    if not is_error_response(response):
+        return False
+    return RATE_LIMIT_MARKERS.search(response) is not None
 
 
 class geminiHandler:
@@ -14,6 +33,14 @@ class geminiHandler:
         if not api_key:
             raise ValueError("Please provide a Gemini API key")
         self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        """The process-wide genai.Client for this API key, built (and the SDK imported) on first use."""
+        if self._client is None:
+            self._client = get_genai_client(self.api_key)
+        return self._client
 
     def set_prompt(self, prompt):
         if not prompt or not isinstance(prompt, str):
@@ -25,21 +52,73 @@ class geminiHandler:
             raise ValueError("Key and value must be non-empty strings")
         self.data[key] = value
 
-    def send_prompt(self):
+    def profiles_payload(self, profiles: list, compact: bool = True, fields=PROMPT_FIELDS,
+                         max_bio_chars: int = 160) -> dict:
+        """
+        Build the data payload for a list of profiles.
+
+        The compact encoding is a header line plus tab-separated rows holding only
+        `fields`, with long bios truncated; otherwise the profiles are sent as JSON.
+        """
+        with metrics.timer("prompt_build"):
+            if compact:
+                return {"profiles": encode_profiles_compact(profiles, fields, max_bio_chars)}
+            return {"profiles": json.dumps(profiles, ensure_ascii=False, separators=(",", ":"))}
+
+    def update_profiles(self, profiles: list, compact: bool = True):
+        """Store a list of profiles as the request data."""
+        self.data.update(self.profiles_payload(profiles, compact))
+
+    def build_contents(self, data: dict = None) -> str:
+        """Build the request text from the prompt and either `data` or the stored data."""
+        data = self.data if data is None else data
+        contents = self.prompt
+        if data:
+            # Plain sections instead of a dict repr, which escapes every newline and quote
+            contents += "\nData:\n" + "\n\n".join(f"{key}:\n{value}" for key, value in data.items())
+        return contents
+
+    def send_prompt(self, data: dict = None):
         try:
-            client = genai.Client(api_key=self.api_key)
-            contents = self.prompt
-            if self.data:
-                contents += f"Data: {self.data}"
+            with metrics.timer("gemini_call"):
+                response = self.client.models.generate_content(
+                    model=self.model, contents=self.build_contents(data)
+                )
+
+            return self._record_response(response)
+
+        except Exception as e:
+            metrics.incr("gemini_errors")
+            return f"{ERROR_PREFIX}{str(e)}"
+
+    async def send_prompt_async(self, data: dict = None):
+        """
+        Async counterpart of send_prompt that shares the same client.
 
-            response = client.models.generate_content(
-                model=self.model, contents=contents
-            )
+        Pass `data` explicitly when several requests are in flight at once so
+        concurrent calls do not overwrite each other's payload in self.data.
+        """
+        try:
+            with metrics.timer("gemini_call"):
+                response = await self.client.aio.models.generate_content(
+                    model=self.model, contents=self.build_contents(data)
+                )
 
-            return response.text
+            return self._record_response(response)
 
         except Exception as e:
-            return f"An error occurred: {str(e)}"
+            metrics.incr("gemini_errors")
+            return f"{ERROR_PREFIX}{str(e)}"
+
+    @staticmethod
+    def _record_response(response):
+        """Count the request and the tokens Gemini reports for it, then return the text."""
+        metrics.incr("gemini_requests")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.incr("input_tokens", getattr(usage, "prompt_token_count", None) or 0)
+            metrics.incr("output_tokens", getattr(usage, "candidates_token_count", None) or 0)
+        return response.text
 
 
 if __name__ == "__main__":
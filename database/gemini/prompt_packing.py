@@ -0,0 +1,80 @@
+from typing import Any, Dict, Iterator, List, Sequence
+
+# The only profile fields the analysis prompt reads
+PROMPT_FIELDS = ("username", "full_name", "biography")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for Gemini input.
+
+    English text averages about four characters per token, while emoji, CJK
+    and Cyrillic characters usually cost a token or more each, so non-ASCII
+    characters are counted individually.
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def _clean_cell(value: Any, max_chars: int = 0) -> str:
+    text = "" if value is None else str(value)
+    text = " / ".join(part.strip() for part in text.splitlines() if part.strip())
+    text = text.replace("\t", " ")
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def encode_profile_row(profile: Dict[str, Any], fields: Sequence[str] = PROMPT_FIELDS,
+                       max_bio_chars: int = 160) -> str:
+    """Encode one profile as a tab-separated row of `fields`."""
+    return "\t".join(
+        _clean_cell(profile.get(field), max_bio_chars if field == "biography" else 0)
+        for field in fields
+    )
+
+
+def encode_profiles_compact(profiles: List[Dict[str, Any]], fields: Sequence[str] = PROMPT_FIELDS,
+                            max_bio_chars: int = 160) -> str:
+    """
+    Encode profiles as a header line followed by one tab-separated row per profile.
+
+    Keys are written once instead of once per profile, unused fields are dropped,
+    newlines and tabs inside values are flattened and long bios are truncated.
+    """
+    rows = ["\t".join(fields)]
+    rows.extend(encode_profile_row(profile, fields, max_bio_chars) for profile in profiles)
+    return "\n".join(rows)
+
+
+def pack_by_token_budget(profiles: List[Dict[str, Any]],
+                         token_budget: int = 4000,
+                         max_profiles: int = 100,
+                         fields: Sequence[str] = PROMPT_FIELDS,
+                         max_bio_chars: int = 160) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Split profiles into chunks whose compact encoding fits in `token_budget` tokens.
+
+    Args:
+        profiles (List[Dict[str, Any]]): Profiles to pack, in order.
+        token_budget (int): Estimated input tokens allowed for the profile data of one request.
+        max_profiles (int): Hard cap on profiles per chunk, which bounds the response size.
+        fields (Sequence[str]): Fields included in the encoding.
+        max_bio_chars (int): Biography truncation length used by the encoding.
+
+    Yields:
+        List[Dict[str, Any]]: Chunks of profiles; a profile larger than the budget gets its own chunk.
+    """
+    header_tokens = estimate_tokens("\t".join(fields))
+    chunk, used = [], header_tokens
+    for profile in profiles:
+        cost = estimate_tokens(encode_profile_row(profile, fields, max_bio_chars)) + 1
+        if chunk and (used + cost > token_budget or len(chunk) >= max_profiles):
+            yield chunk
+            chunk, used = [], header_tokens
+        chunk.append(profile)
+        used += cost
+    if chunk:
+        yield chunk
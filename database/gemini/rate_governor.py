@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import deque
+
+import metrics
+
+
+class RateGovernor:
+    """
+    Shared requests-per-minute and tokens-per-minute limiter for Gemini calls.
+
+    Every in-flight request awaits `acquire` before it is sent. The governor
+    keeps a sliding one-minute window of sent requests and tokens and waits
+    until both fit under the current limits. The limits adapt: a rate-limit
+    error multiplies them by `backoff_factor` and pauses all callers for a
+    cool-down, and every success raises them by `recovery_step` until they
+    are back at the configured maximum.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self,
+                 requests_per_minute: int = 60,
+                 tokens_per_minute: int = 1_000_000,
+                 backoff_factor: float = 0.5,
+                 recovery_step: float = 0.05,
+                 min_rate_fraction: float = 0.05,
+                 cooldown_seconds: float = 5.0,
+                 max_cooldown_seconds: float = 60.0):
+        if requests_per_minute <= 0 or tokens_per_minute <= 0:
+            raise ValueError("Rate limits must be positive")
+        self.max_requests_per_minute = requests_per_minute
+        self.max_tokens_per_minute = tokens_per_minute
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.min_rate_fraction = min_rate_fraction
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+
+        self.rate_fraction = 1.0
+        self.rate_limit_hits = 0
+        self.total_wait_seconds = 0.0
+        self._consecutive_limits = 0
+        self._paused_until = 0.0
+        self._requests = deque()
+        self._tokens = deque()
+        self._token_total = 0
+        self._lock = None
+
+    @property
+    def requests_per_minute(self) -> float:
+        return max(1.0, self.max_requests_per_minute * self.rate_fraction)
+
+    @property
+    def tokens_per_minute(self) -> float:
+        return max(1.0, self.max_tokens_per_minute * self.rate_fraction)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until a request of roughly `tokens` tokens may be sent, then reserve it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._requests.append(now)
+                    self._tokens.append((now, tokens))
+                    self._token_total += tokens
+                    return
+                self.total_wait_seconds += wait
+                metrics.incr("rate_limit_wait_seconds", wait)
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        """Creep back towards the configured limits after a successful call."""
+        self._consecutive_limits = 0
+        self.rate_fraction = min(1.0, self.rate_fraction + self.recovery_step)
+        metrics.set_gauge("requests_per_minute_limit", self.requests_per_minute)
+
+    def on_rate_limited(self, retry_after: float = None):
+        """Cut the limits and pause every caller after a quota or rate-limit error."""
+        self.rate_limit_hits += 1
+        metrics.incr("rate_limit_hits")
+        self._consecutive_limits += 1
+        self.rate_fraction = max(self.min_rate_fraction, self.rate_fraction * self.backoff_factor)
+        metrics.set_gauge("requests_per_minute_limit", self.requests_per_minute)
+        if retry_after is None:
+            retry_after = min(self.max_cooldown_seconds,
+                              self.cooldown_seconds * 2 ** (self._consecutive_limits - 1))
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _expire(self, now: float):
+        cutoff = now - self.WINDOW_SECONDS
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_total -= self._tokens.popleft()[1]
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        self._expire(now)
+        wait = 0.0
+        if self._requests and len(self._requests) >= self.requests_per_minute:
+            index = int(len(self._requests) - self.requests_per_minute)
+            wait = max(wait, self._requests[index] + self.WINDOW_SECONDS - now)
+
+        # A single request larger than the whole budget is let through on an empty window
+        if self._tokens and self._token_total + tokens > self.tokens_per_minute:
+            excess = self._token_total + tokens - self.tokens_per_minute
+            released = 0
+            for sent_at, sent_tokens in self._tokens:
+                released += sent_tokens
+                if released >= excess:
+                    wait = max(wait, sent_at + self.WINDOW_SECONDS - now)
+                    break
+        return wait
@@ -0,0 +1,135 @@
+import json
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+_DECODER = json.JSONDecoder()
+
+
+def _normalize_username(username: Any) -> str:
+    return str(username).strip().lstrip("@").lower()
+
+
+def extract_json_objects(text: str, key: str = "username") -> Iterator[Dict[str, Any]]:
+    """
+    Yield every well-formed JSON object carrying `key` found in `text`.
+
+    The text does not need to be valid JSON as a whole: markdown fences,
+    commentary, a truncated tail or a single broken element are skipped and
+    decoding resumes at the next object. Objects without `key` are searched
+    for nested objects, so wrappers like {"profiles": [...]} work too.
+    """
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            return
+        try:
+            obj, end = _DECODER.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        if isinstance(obj, dict) and key in obj:
+            yield obj
+            pos = end
+        else:
+            pos = start + 1
+
+
+def parse_analysis_response(text: str, profiles: List[Dict[str, Any]],
+                            schema=None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Pull the usable analysis results for `profiles` out of a Gemini response.
+
+    Only objects whose username matches a requested profile (ignoring case and a
+    leading "@") and that carry an is_car_profile verdict are kept; the
+    username is rewritten to the requested spelling and the first answer for a
+    profile wins. With an AnalysisSchema, objects are also validated and
+    cleaned by schema.clean (e.g. a missing tag list makes an answer unusable).
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Valid results and the
+        requested profiles that got no valid result.
+    """
+    expected = {_normalize_username(p["username"]): p["username"] for p in profiles}
+    results = {}
+    with metrics.timer("parse"):
+        for obj in extract_json_objects(text or ""):
+            username = expected.get(_normalize_username(obj.get("username")))
+            if username is None or username in results or "is_car_profile" not in obj:
+                continue
+            if schema is not None:
+                obj = schema.clean(obj)
+                if obj is None:
+                    continue
+            results[username] = dict(obj, username=username)
+
+    missing = [p for p in profiles if p["username"] not in results]
+    return list(results.values()), missing
+
+
+class SalvageItem:
+    """A group of profiles waiting to be (re)sent, with its count of fruitless attempts."""
+
+    def __init__(self, profiles: List[Dict[str, Any]], failures: int = 0):
+        self.profiles = profiles
+        self.failures = failures
+
+
+class ChunkSalvage:
+    """
+    Work list that turns one chunk into as many valid results as possible.
+
+    Every response is parsed tolerantly and only the profiles that got no
+    valid answer are queued again. A group that yields nothing `max_failures`
+    times in a row is split in half, so a single profile that breaks the
+    model's output ends up alone and is given up on without blocking the rest.
+    """
+
+    def __init__(self, chunk: List[Dict[str, Any]], max_failures: int = 2, schema=None):
+        self.max_failures = max_failures
+        self.schema = schema
+        self.results = []
+        self.poisoned = []
+        self._pending = deque([SalvageItem(chunk)]) if chunk else deque()
+
+    def has_work(self) -> bool:
+        return bool(self._pending)
+
+    def next_item(self) -> Optional[SalvageItem]:
+        return self._pending.popleft() if self._pending else None
+
+    def requeue(self, item: SalvageItem):
+        """Put an item back unchanged, e.g. after a rate-limit error."""
+        self._pending.appendleft(item)
+
+    def record(self, item: SalvageItem, response: str) -> int:
+        """
+        Record the response for an item and queue whatever is still missing.
+
+        Returns:
+            int: Number of new valid results recovered from the response.
+        """
+        found, missing = parse_analysis_response(response, item.profiles, self.schema)
+        self.results.extend(found)
+        if not missing:
+            return len(found)
+
+        if found:
+            # Progress was made; retry just the gaps with the same failure count
+            self._pending.append(SalvageItem(missing, item.failures))
+        elif item.failures + 1 < self.max_failures:
+            self._pending.append(SalvageItem(missing, item.failures + 1))
+        elif len(missing) > 1:
+            middle = len(missing) // 2
+            self._pending.append(SalvageItem(missing[:middle]))
+            self._pending.append(SalvageItem(missing[middle:]))
+        else:
+            self.poisoned.extend(missing)
+        return len(found)
+
+    @property
+    def unresolved(self) -> List[Dict[str, Any]]:
+        """Profiles with no result: given-up singletons plus anything still queued."""
+        return self.poisoned + [p for item in self._pending for p in item.profiles]
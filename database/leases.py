@@ -0,0 +1,181 @@
+import logging
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+from profile_fetcher import ProfileFetcher
+
+# Columns the analysis loop needs, as returned by get_unprocessed_profiles
+UNPROCESSED_COLUMNS = ["username", "full_name", "followers_count", "biography", "following_count", "created_at"]
+LEASE_COLUMNS = ["claimed_by", "lease_expires_at"]
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(username: str, shards: int) -> int:
+    """Stable shard index of a username; the same on every host and Python version."""
+    return zlib.crc32(username.encode("utf-8")) % shards
+
+
+class LeaseManager:
+    """
+    Claims batches of unprocessed profiles for one worker so several workers can share the table.
+
+    A claim marks rows with the worker id and a lease expiry using a conditional
+    update that only matches rows that are still unprocessed and not leased by
+    someone else (or whose lease has run out). The database applies it row by
+    row, so when two workers race for the same profile only one of them gets
+    it back from the update. Rows leased by a worker that crashed become
+    claimable again once their lease expires, and reclaiming rows this worker
+    already holds simply extends the lease. A worker whose analysis can outlast
+    the lease keeps its rows with `renew`, or `keep_alive` in the background.
+
+    With `shards` > 1 only usernames whose crc32 falls in this worker's shard
+    are claimed, which keeps workers from competing for the same candidates.
+    """
+
+    def __init__(self, fetcher: ProfileFetcher, worker_id: str, lease_seconds: int = 600,
+                 shard: int = 0, shards: int = 1):
+        """
+        Args:
+            fetcher (ProfileFetcher): Fetcher whose backend holds the profiles table.
+            worker_id (str): Identifier written to claimed_by; unique per worker process.
+            lease_seconds (int): How long a claim lasts before other workers may take the rows.
+            shard (int): This worker's shard index, from 0 to shards - 1.
+            shards (int): Total number of username-hash shards (1 disables sharding).
+        """
+        if shards < 1 or not 0 <= shard < shards:
+            raise ValueError(f"Invalid shard {shard} of {shards}")
+        self.fetcher = fetcher
+        self.backend = fetcher.backend
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.shard = shard
+        self.shards = shards
+
+    def claim(self, limit: int = 1000, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Lease up to `limit` unprocessed profiles for this worker.
+
+        Candidates are read page by page until enough claimable rows of this
+        shard are found, so rows leased by other workers or belonging to other
+        shards cannot hide the remaining work. Only profiles with a created_at
+        value are considered, since pages are keyed on it. Usernames in
+        `exclude`, such as rows the caller is still analyzing or has given up
+        on, are read past without being leased again.
+
+        Returns:
+            List[Dict[str, Any]]: The profiles this worker now holds, with the same
+                                  columns as get_unprocessed_profiles.
+        """
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
+        exclude = set(exclude)
+        candidates = []
+        for profile in self.fetcher.iter_profiles(
+                select_columns=UNPROCESSED_COLUMNS + LEASE_COLUMNS,
+                filters={"is_car_profile": None},
+                page_size=max(100, min(5000, limit * self.shards))):
+            if profile["username"] in exclude:
+                continue
+            if self.shards > 1 and shard_of(profile["username"], self.shards) != self.shard:
+                continue
+            if not self._claimable(profile, now_iso):
+                continue
+            candidates.append(profile)
+            if len(candidates) >= limit:
+                break
+        if not candidates:
+            return []
+
+        expires = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        with metrics.timer("claim"):
+            result = self.backend.table("profiles")\
+                .update({"claimed_by": self.worker_id, "lease_expires_at": expires})\
+                .in_("username", [p["username"] for p in candidates])\
+                .is_("is_car_profile", "null")\
+                .or_(self._claimable_filter(now_iso))\
+                .execute()
+        won = {row.get("username") for row in (result.data or [])}
+        metrics.incr("rows_claimed", len(won))
+        metrics.incr("claims_lost", len(candidates) - len(won))
+
+        claimed = []
+        for profile in candidates:
+            if profile["username"] in won:
+                for column in LEASE_COLUMNS:
+                    profile.pop(column, None)
+                claimed.append(profile)
+        return claimed
+
+    def renew(self, usernames: Iterable[str]) -> int:
+        """
+        Extend the lease on rows this worker still holds; returns how many were extended.
+
+        Rows already written, or taken over by another worker after the lease ran
+        out, are left alone.
+        """
+        usernames = list(usernames)
+        if not usernames:
+            return 0
+        expires = (datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)).isoformat()
+        with metrics.timer("renew"):
+            result = self.backend.table("profiles")\
+                .update({"lease_expires_at": expires})\
+                .in_("username", usernames)\
+                .eq("claimed_by", self.worker_id)\
+                .is_("is_car_profile", "null")\
+                .execute()
+        renewed = len(result.data or [])
+        metrics.incr("leases_renewed", renewed)
+        return renewed
+
+    @contextmanager
+    def keep_alive(self, in_flight: Callable[[], Iterable[str]], interval: Optional[float] = None):
+        """
+        Renew the leases of `in_flight()` from a background thread while the block runs.
+
+        Args:
+            in_flight (Callable): Returns the usernames currently being analyzed.
+            interval (float, optional): Seconds between renewals. Defaults to a third of the lease.
+        """
+        stopped = threading.Event()
+        interval = interval or self.lease_seconds / 3
+
+        def renew_loop():
+            while not stopped.wait(interval):
+                try:
+                    self.renew(in_flight())
+                except Exception as e:
+                    # The next renewal may still get through before the lease runs out
+                    logger.warning("Lease renewal failed: %s", e)
+
+        thread = threading.Thread(target=renew_loop, name="lease-renewal", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stopped.set()
+            thread.join()
+
+    def release(self) -> int:
+        """Give back every unprocessed row this worker still holds; returns how many were released."""
+        result = self.backend.table("profiles")\
+            .update({"claimed_by": None, "lease_expires_at": None})\
+            .eq("claimed_by", self.worker_id)\
+            .is_("is_car_profile", "null")\
+            .execute()
+        return len(result.data or [])
+
+    def _claimable(self, profile: Dict[str, Any], now_iso: str) -> bool:
+        owner = profile.get("claimed_by")
+        expires: Optional[str] = profile.get("lease_expires_at")
+        return not owner or owner == self.worker_id or not expires or expires < now_iso
+
+    def _claimable_filter(self, now_iso: str) -> str:
+        """PostgREST or-filter matching the same rows as _claimable."""
+        return (f'claimed_by.is.null,claimed_by.eq."{self.worker_id}",'
+                f'lease_expires_at.is.null,lease_expires_at.lt."{now_iso}"')
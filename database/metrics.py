@@ -0,0 +1,270 @@
+"""
+Lightweight counters and stage timers for the analysis loop.
+
+Components record into one process-wide registry through the module-level
+helpers, e.g.
+
+    with metrics.timer("gemini_call"):
+        response = handler.send_prompt(data)
+    metrics.incr("input_tokens", usage.prompt_token_count)
+
+and the totals are exported either as a periodic JSON stats line
+(StatsReporter) or as Prometheus text served on localhost (serve_prometheus).
+Per-row progress messages go through log_sampled, which only formats and
+emits one message in every N of a kind.
+"""
+import itertools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Timer:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and latency timers."""
+
+    def __init__(self, prefix: str = "crm"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timers = {}
+            self._started = time.time()
+
+    def incr(self, name: str, value: float = 1):
+        if not value:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = _Timer()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the enclosed block, including time spent awaiting inside it."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current totals as plain JSON-serializable values."""
+        with self._lock:
+            elapsed = time.time() - self._started
+            return {
+                "uptime_s": round(elapsed, 3),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timers": {
+                    name: {
+                        "count": timer.count,
+                        "total_s": round(timer.total, 6),
+                        "mean_ms": round(1000 * timer.total / timer.count, 3),
+                        "p50_ms": round(1000 * timer.quantile(0.5), 3),
+                        "p99_ms": round(1000 * timer.quantile(0.99), 3),
+                        "max_ms": round(1000 * timer.max, 3),
+                    }
+                    for name, timer in self._timers.items() if timer.count
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Current totals in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, value in sorted(self._gauges.items()):
+                metric = f"{self.prefix}_{name}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+            for name, timer in sorted(self._timers.items()):
+                metric = f"{self.prefix}_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, timer.buckets):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {timer.count}')
+                lines.append(f"{metric}_sum {timer.total}")
+                lines.append(f"{metric}_count {timer.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the module-level helpers
+registry = Metrics()
+
+
+def incr(name: str, value: float = 1):
+    registry.incr(name, value)
+
+
+def set_gauge(name: str, value: float):
+    registry.set_gauge(name, value)
+
+
+def observe(name: str, seconds: float):
+    registry.observe(name, seconds)
+
+
+def timer(name: str):
+    return registry.timer(name)
+
+
+def snapshot() -> Dict[str, Any]:
+    return registry.snapshot()
+
+
+class StatsReporter:
+    """
+    Background thread that emits the registry snapshot as one JSON line every `interval` seconds.
+
+    A final line is emitted on stop(), so short runs still report their totals.
+    """
+
+    def __init__(self, interval: float = 60.0, metrics: Optional[Metrics] = None,
+                 emit: Callable[[str], None] = print):
+        self.interval = interval
+        self.metrics = metrics or registry
+        self.emit = emit
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "StatsReporter":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats-reporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.report()
+
+    def report(self):
+        self.emit(json.dumps({"stats": self.metrics.snapshot()}, sort_keys=True))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def serve_prometheus(port: int, host: str = "127.0.0.1", metrics: Optional[Metrics] = None):
+    """
+    Serve the registry at http://host:port/metrics from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    # Imported here: http.server is slow to import and only needed when serving
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    metrics = metrics or registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# Sampled logging
+_sample_every = 100
+_sample_counts: Dict[Tuple[str, str], Any] = {}
+
+
+def configure_logging(level: str = "INFO", sample_every: int = 100):
+    """Set up leveled console logging and how many similar per-row messages share one log line."""
+    global _sample_every
+    _sample_every = max(1, sample_every)
+    logging.basicConfig(level=getattr(logging, str(level).upper(), logging.INFO),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def log_sampled(logger: logging.Logger, level: int, key: str, msg: str, *args):
+    """
+    Log the first message of kind `key` and then one in every `sample_every`.
+
+    Arguments are only formatted for messages that are emitted, so the call is
+    cheap enough for per-row paths.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    counter = _sample_counts.get((logger.name, key))
+    if counter is None:
+        counter = _sample_counts.setdefault((logger.name, key), itertools.count(1))
+    seen = next(counter)
+    if seen == 1 or seen % _sample_every == 0:
+        logger.log(level, msg + " [%d so far]", *args, seen)
@@ -0,0 +1,3 @@
+-- Tags derived with the classification (test.py --tags, gemini/analysis_schema.py).
+-- Run once in the Supabase SQL editor before analyzing with tags or exporting them.
+alter table profiles add column if not exists tags jsonb;
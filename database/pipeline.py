@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import metrics
+
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisPipeline:
+    """
+    Overlapped fetch -> analyze -> write pipeline connected by bounded queues.
+
+    A prefetcher pulls the next batch of unprocessed profiles while analyzer
+    tasks have prompts in flight, and a write-behind stage persists finished
+    chunks in the background. The queue sizes bound how far each stage may run
+    ahead, so a slow stage pushes back on the ones feeding it. On shutdown,
+    results that were already paid for are flushed to the database before
+    `run` returns.
+
+    Rows stay "unprocessed" in the database until they are written, so the
+    prefetcher remembers which usernames are in flight and passes them to
+    `fetch_batch` as `exclude`, which skips past them to find new work. With
+    `renew_leases`, the leases on in-flight rows are extended periodically so
+    slow Gemini calls do not let them expire.
+    """
+
+    def __init__(self,
+                 fetch_batch: Callable[[int], List[Dict[str, Any]]],
+                 analyze_chunk: Callable[[List[Dict[str, Any]]], Awaitable[Optional[List[Dict[str, Any]]]]],
+                 write_results: Callable[[List[Dict[str, Any]]], Dict[str, List[str]]],
+                 batch_size: int = 140,
+                 process_size: int = 35,
+                 chunker: Optional[Callable[[List[Dict[str, Any]]], Iterable[List[Dict[str, Any]]]]] = None,
+                 analyzers: int = 4,
+                 chunk_queue_size: int = 8,
+                 write_queue_size: int = 8,
+                 max_attempts: int = 3,
+                 renew_leases: Optional[Callable[[List[str]], Any]] = None,
+                 renew_interval: float = 200.0):
+        """
+        Args:
+            fetch_batch (Callable): Blocking function returning up to `limit` unprocessed profiles,
+                                    leaving out the usernames passed as `exclude`.
+            analyze_chunk (Callable): Coroutine returning the analysis array for a chunk, or None.
+            write_results (Callable): Blocking bulk writer returning 'updated'/'missing'/'failed' usernames.
+            batch_size (int): Number of new profiles requested per fetch.
+            process_size (int): Number of profiles per analysis chunk when no chunker is given.
+            chunker (Callable, optional): Splits a fetched batch into analysis chunks.
+            analyzers (int): Number of concurrent analyzer tasks.
+            chunk_queue_size (int): Chunks allowed to wait between prefetcher and analyzers.
+            write_queue_size (int): Analyzed chunks allowed to wait for the writer.
+            max_attempts (int): Attempts before a profile is skipped for the rest of the run.
+            renew_leases (Callable, optional): Blocking function extending the leases of the given usernames.
+            renew_interval (float): Seconds between lease renewals.
+        """
+        self.fetch_batch = fetch_batch
+        self.analyze_chunk = analyze_chunk
+        self.write_results = write_results
+        self.batch_size = batch_size
+        self.process_size = process_size
+        self.chunker = chunker or self._fixed_size_chunks
+        self.analyzers = analyzers
+        self.chunk_queue_size = chunk_queue_size
+        self.write_queue_size = write_queue_size
+        self.max_attempts = max_attempts
+        self.renew_leases = renew_leases
+        self.renew_interval = renew_interval
+
+        self.in_flight = set()
+        self.skipped = set()
+        # Rows written while a fetch was running may still come back from it as unprocessed
+        self._written_during_fetch = set()
+        self.attempts = {}
+        self.stats = {
+            'fetched': 0,
+            'analyzed_chunks': 0,
+            'failed_chunks': 0,
+            'written': 0,
+            'missing': 0,
+            'write_failures': 0,
+            'fetch_seconds': 0.0,
+            'write_seconds': 0.0,
+        }
+        self._stopping = False
+
+    def stop(self):
+        """Stop fetching new work; chunks already fetched are analyzed and written."""
+        self._stopping = True
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages until no unprocessed profiles are left, then return the stats."""
+        self._chunks = asyncio.Queue(maxsize=self.chunk_queue_size)
+        self._results = asyncio.Queue(maxsize=self.write_queue_size)
+        self._progress = asyncio.Event()
+
+        prefetcher = asyncio.create_task(self._prefetch())
+        analyzers = [asyncio.create_task(self._analyze()) for _ in range(self.analyzers)]
+        writer = asyncio.create_task(self._write())
+        renewer = asyncio.create_task(self._renew()) if self.renew_leases else None
+        try:
+            await asyncio.gather(prefetcher, *analyzers, writer)
+        finally:
+            tasks = [prefetcher, *analyzers, writer] + ([renewer] if renewer else [])
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._flush()
+        return self.stats
+
+    async def _prefetch(self):
+        while not self._stopping:
+            self._progress.clear()
+            self._written_during_fetch.clear()
+            exclude = self.in_flight | self.skipped
+            started = time.perf_counter()
+            profiles = await asyncio.to_thread(self.fetch_batch, self.batch_size, exclude=exclude)
+            self.stats['fetch_seconds'] += time.perf_counter() - started
+
+            fresh = [p for p in profiles
+                     if p['username'] not in self.in_flight and p['username'] not in self.skipped
+                     and p['username'] not in self._written_during_fetch]
+            fresh = fresh[:self.batch_size]
+            if not fresh:
+                if not self.in_flight:
+                    logger.info("No more unprocessed profiles found.")
+                    break
+                # Everything left is already queued; wait for the writer to make progress
+                await self._progress.wait()
+                continue
+
+            self.in_flight.update(p['username'] for p in fresh)
+            self.stats['fetched'] += len(fresh)
+            for chunk in self.chunker(fresh):
+                await self._chunks.put(chunk)
+
+        for _ in range(self.analyzers):
+            await self._chunks.put(_DONE)
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            if not self.in_flight:
+                continue
+            try:
+                await asyncio.to_thread(self.renew_leases, list(self.in_flight))
+            except Exception as e:
+                # The next renewal may still get through before the lease runs out
+                logger.warning("Lease renewal failed: %s", e)
+
+    async def _analyze(self):
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is _DONE:
+                await self._results.put(_DONE)
+                return
+            if self._stopping:
+                self._release(chunk, set())
+                continue
+            profiles_array = await self.analyze_chunk(chunk)
+            if profiles_array:
+                self.stats['analyzed_chunks'] += 1
+            else:
+                self.stats['failed_chunks'] += 1
+            await self._results.put((chunk, profiles_array))
+
+    async def _write(self):
+        finished = 0
+        while finished < self.analyzers:
+            items = [await self._results.get()]
+            # Coalesce whatever else is ready into the same bulk write
+            while not self._results.empty():
+                items.append(self._results.get_nowait())
+
+            pending = []
+            for item in items:
+                if item is _DONE:
+                    finished += 1
+                else:
+                    pending.append(item)
+            if pending:
+                await self._write_items(pending)
+
+    async def _write_items(self, items):
+        analysis = [result for _, profiles_array in items for result in (profiles_array or [])]
+        summary = {'updated': [], 'missing': [], 'failed': [], 'malformed': []}
+        if analysis:
+            started = time.perf_counter()
+            summary = await asyncio.to_thread(self.write_results, analysis)
+            self.stats['write_seconds'] += time.perf_counter() - started
+        self.stats['written'] += len(summary['updated'])
+        self.stats['missing'] += len(summary['missing'])
+        self.stats['write_failures'] += len(summary['failed'])
+        if summary['missing'] or summary['failed']:
+            logger.warning("Missing profiles: %s, failed updates: %s", summary['missing'], summary['failed'])
+
+        updated = set(summary['updated'])
+        for chunk, _ in items:
+            self._release(chunk, updated)
+        metrics.set_gauge("pipeline_in_flight", len(self.in_flight))
+        metrics.log_sampled(logger, logging.INFO, "wrote", "Wrote %d profiles (%d total)",
+                            len(updated), self.stats['written'])
+
+    async def _flush(self):
+        """Write any analyzed chunks still queued when the pipeline shuts down."""
+        pending = []
+        while not self._results.empty():
+            item = self._results.get_nowait()
+            if item is not _DONE:
+                pending.append(item)
+        if pending:
+            logger.info("Flushing %d analyzed chunks before shutdown...", len(pending))
+            await self._write_items(pending)
+
+    def _fixed_size_chunks(self, profiles):
+        return [profiles[i:i + self.process_size] for i in range(0, len(profiles), self.process_size)]
+
+    def _release(self, chunk, updated):
+        for profile in chunk:
+            username = profile['username']
+            self.in_flight.discard(username)
+            if username in updated:
+                self.attempts.pop(username, None)
+                self._written_during_fetch.add(username)
+                continue
+            self.attempts[username] = self.attempts.get(username, 0) + 1
+            if self.attempts[username] >= self.max_attempts:
+                self.skipped.add(username)
+        self._progress.set()
@@ -0,0 +1,171 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Each signal is (compiled pattern, weight). Weights are the probability that a
+# profile is car-related given that signal alone; signals are combined as
+# independent evidence, so two medium signals outweigh one.
+CAR_TEXT_SIGNALS = [
+    (re.compile(r"\b(?:cars?|automotive|motorsports?|gearhead|petrolhead|car\s?(?:plug|guy|girl|enthusiast|lover|page|spotting|culture))\b", re.I), 0.8),
+    (re.compile(r"\b(?:tuning|tuned|turbo|supercharged|dyno|\d{3,4}\s?(?:whp|hp)|bagged|slammed|stanced|widebody|coilovers|drift(?:ing)?|jdm|time\s?attack|track\s?days?)\b", re.I), 0.85),
+    (re.compile(r"\b(?:detailing|ceramic\s?coating|paint\s?protection|ppf|window\s?tint|vinyl\s?wraps?|vehicle\s?wraps?|wheels|rims|body\s?shop|collision|restorations?)\b", re.I), 0.8),
+    (re.compile(r"\b(?:dealership|auto\s?sales|autos|motors|garage|race\s?car|racing|formula\s?drift|rally)\b", re.I), 0.6),
+    (re.compile(r"\b(?:porsche|lamborghini|lambo|ferrari|mclaren|bugatti|koenigsegg|pagani|nissan|datsun|toyota|supra|subaru|wrx|honda|integra|civic|mugen|mazda|miata|bmw|audi|mercedes|amg|corvette|vette|camaro|mustang|hellcat|challenger|tesla|rwb|rauh-welt|aventador|huracan|gt3|gt-r|gtr)\b", re.I), 0.55),
+    (re.compile(r"\b(?:[emf]\d{2}\s?m\d|m[2-8](?:\s?comp(?:etition)?)?|g8[0-2]|x[3-6]\s?m|svj|s2000|rx-?7|r3[2-5]|e30|e46)\b", re.I), 0.75),
+]
+CAR_EMOJI_SIGNALS = [
+    (re.compile("[\U0001F3CE\U0001F697\U0001F698\U0001F699\U0001F3C1\U0001F6DE⛽]"), 0.7),
+]
+# Usernames have no spaces, so "_", "." and digits are the word boundaries:
+# "jdm_garage" and "cars4life" match, "oscar_smith" and "carol.m" do not
+CAR_USERNAME_SIGNALS = [
+    (re.compile(r"(?<![a-z])(?:cars?|autos?|motors?|tuning|detail(?:ing|s)?|wraps?|tint(?:s|ed)?|garage|racing|wheels|"
+                r"jdm|lambo|vette|m3|rwb)(?![a-z])", re.I), 0.6),
+]
+
+# Evidence for each profile_type, weighted and combined like the car signals.
+# Loose words ("call", "commercial") are weak on their own, so they only
+# settle the type together with stronger signals.
+TYPE_SIGNALS = {
+    'company': [
+        (re.compile(r"\b(?:llc|inc|ltd|corp|co\.)(?:\W|$)", re.I), 0.85),
+        (re.compile(r"\b(?:shop|store|dealership|specialists?|services?|wholesale)\b", re.I), 0.6),
+        (re.compile(r"\b(?:locations?|loc:|book(?:ings?)?|appointments?|est\.?|since\s\d{4}|\d+\+?\s?yrs)(?:\W|$)|"
+                    r"www\.|\.com\b", re.I), 0.5),
+        (re.compile(r"\b(?:detailing|ceramic\s?coating|ppf|window\s?tint|wraps?|body\s?shop|collision)\b", re.I), 0.5),
+        (re.compile(r"\b(?:official|call|residential|commercial)\b", re.I), 0.25),
+    ],
+    'car page': [
+        (re.compile(r"\b(?:page|fan\s?page|magazine|blog|community)\b", re.I), 0.7),
+        (re.compile(r"\b(?:daily|features?|featured|perspective\s+on)\b", re.I), 0.6),
+        (re.compile(r"\b(?:submit|tag\s?us|dm\s?(?:us\s)?to\s?(?:be\s)?featured?)\b", re.I), 0.6),
+        (re.compile(r"#\w+(?:cars|life|nation|crew)\b", re.I), 0.4),
+    ],
+    'individual': [
+        (re.compile(r"\b(?:i|i'm|im|my|me|mine)\b", re.I), 0.5),
+        (re.compile(r"\b(?:driver|racer|photographer|videographer|mechanic|enthusiast|dad|mom|husband|wife|"
+                    r"student|he/him|she/her|they/them)\b", re.I), 0.5),
+    ],
+}
+PERSON_NAME = re.compile(r"^[A-Z][a-z'\-]+(?:\s[A-Z][a-z'\-]+)+$")
+PERSON_NAME_WEIGHT = 0.6
+
+
+def _combine(weights: List[float]) -> float:
+    """Confidence from independent pieces of evidence, each the probability it is right on its own."""
+    doubt = 1.0
+    for weight in weights:
+        doubt *= 1.0 - weight
+    return 1.0 - doubt
+
+
+class RuleBasedClassifier:
+    """
+    Fast local classifier that settles obvious profiles before they reach Gemini.
+
+    Car-related profiles are recognised by keywords, model codes, car emoji and
+    usernames; accounts with no automotive signal at all and a large following
+    are treated as clearly not car-related. The profile_type is scored the
+    same way. A profile is only settled locally when the verdict reaches
+    `threshold` and the type reaches `type_threshold`; everything else is
+    left for the model.
+    """
+
+    def __init__(self, threshold: float = 0.9, celebrity_followers: int = 1_000_000,
+                 type_threshold: float = 0.75):
+        """
+        Args:
+            threshold (float): Minimum confidence (0-1) for a local verdict to be used.
+            celebrity_followers (int): Follower count above which a profile with no
+                                       automotive signal is confidently not car-related.
+            type_threshold (float): Minimum confidence (0-1) in the profile_type, net
+                                    of the evidence for the other types.
+        """
+        if not 0 < threshold <= 1 or not 0 < type_threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.type_threshold = type_threshold
+        self.celebrity_followers = celebrity_followers
+        self.counts = {'seen': 0, 'resolved': 0, 'car': 0, 'not_car': 0}
+
+    def score(self, profile: Dict[str, Any]) -> Tuple[Optional[bool], float]:
+        """
+        Score a profile without any threshold applied.
+
+        Returns:
+            Tuple[Optional[bool], float]: The likely is_car_profile value (None if
+            there is no evidence either way) and the confidence in it.
+        """
+        text = " ".join(filter(None, [profile.get('full_name'), profile.get('biography')]))
+        username = profile.get('username') or ""
+
+        weights = [weight for pattern, weight in CAR_TEXT_SIGNALS + CAR_EMOJI_SIGNALS if pattern.search(text)]
+        weights += [weight for pattern, weight in CAR_USERNAME_SIGNALS if pattern.search(username)]
+        if weights:
+            return True, _combine(weights)
+
+        followers = profile.get('followers_count') or 0
+        if followers >= self.celebrity_followers:
+            # Confidence grows with audience size: 0.9 at the cut-off, 0.99 at 10x
+            ratio = min(followers / self.celebrity_followers, 10)
+            return False, 0.9 + 0.01 * (ratio - 1)
+        return None, 0.0
+
+    def classify(self, profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return an analysis result for the profile, or None if it is ambiguous."""
+        is_car, confidence = self.score(profile)
+        if is_car is None or confidence < self.threshold:
+            return None
+        profile_type, type_confidence = self.score_type(profile)
+        if profile_type is None or type_confidence < self.type_threshold:
+            return None
+        return {
+            'username': profile['username'],
+            'is_car_profile': is_car,
+            'profile_type': profile_type,
+        }
+
+    def score_type(self, profile: Dict[str, Any]) -> Tuple[Optional[str], float]:
+        """
+        Score the profile_type without any threshold applied.
+
+        Returns:
+            Tuple[Optional[str], float]: The likeliest type (None without any
+            evidence) and its confidence, discounted by the evidence for the
+            runner-up so conflicting signals stay uncertain.
+        """
+        text = " ".join(filter(None, [profile.get('full_name'), profile.get('biography')]))
+        scores = {}
+        for profile_type, signals in TYPE_SIGNALS.items():
+            weights = [weight for pattern, weight in signals if pattern.search(text)]
+            if profile_type == 'individual' and PERSON_NAME.match((profile.get('full_name') or "").strip()):
+                weights.append(PERSON_NAME_WEIGHT)
+            scores[profile_type] = _combine(weights)
+        (best, top), (_, runner_up) = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:2]
+        if not top:
+            return None, 0.0
+        return best, top * (1.0 - runner_up)
+
+    def split(self, profiles: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Separate profiles that can be settled locally from those that need the model.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Local analysis results
+            and the ambiguous profiles.
+        """
+        resolved, ambiguous = [], []
+        for profile in profiles:
+            result = self.classify(profile)
+            if result is None:
+                ambiguous.append(profile)
+                continue
+            resolved.append(result)
+            self.counts['car' if result['is_car_profile'] else 'not_car'] += 1
+        self.counts['seen'] += len(profiles)
+        self.counts['resolved'] += len(resolved)
+        return resolved, ambiguous
+
+    def report(self) -> Dict[str, Any]:
+        """Counts of profiles seen and resolved locally, plus the resolved fraction."""
+        seen = self.counts['seen']
+        return dict(self.counts, resolved_fraction=self.counts['resolved'] / seen if seen else 0.0)
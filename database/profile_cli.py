@@ -1,9 +1,22 @@
 #!/usr/bin/env python3
 from profile_fetcher import ProfileFetcher
-from datetime import datetime
+from backends.factory import create_backend
+from itertools import islice
 import argparse
+import csv
 import json
-from typing import Dict, Any
+import sys
+from typing import Dict, Any, Iterable, List
+
+# Columns fetched for each output format unless --columns is given
+PRETTY_COLUMNS = ["username", "full_name", "biography", "followers_count", "following_count", "is_verified"]
+TABLE_COLUMNS = ["username", "full_name", "followers_count", "following_count", "is_verified",
+                 "is_car_profile", "profile_type"]
+RECORD_COLUMNS = ["username", "full_name", "biography", "followers_count", "following_count", "is_verified",
+                  "is_car_profile", "profile_type", "created_at"]
+
+TABLE_WIDTHS = {"username": 30, "full_name": 30, "biography": 40, "profile_type": 12}
+PROFILE_TYPES = ["individual", "company", "car page", "unknown"]
 
 def format_profile_data(profile: Dict[str, Any]) -> str:
     """Format profile data in a readable way."""
@@ -12,10 +25,10 @@ def format_profile_data(profile: Dict[str, Any]) -> str:
     output.append(f"Username: {profile.get('username', 'N/A')}")
     output.append(f"Full Name: {profile.get('full_name', 'N/A')}")
     output.append(f"Biography: {profile.get('biography', 'N/A')}")
-    output.append(f"Followers: {profile.get('followers_count', 0):,}")
-    output.append(f"Following: {profile.get('following_count', 0):,}")
+    output.append(f"Followers: {profile.get('followers_count') or 0:,}")
+    output.append(f"Following: {profile.get('following_count') or 0:,}")
     output.append(f"Verified: {'✓' if profile.get('is_verified') else '✗'}")
-    
+
     # Format profile_data if it exists
     if profile.get('profile_data'):
         output.append("\nProfile Data:")
@@ -28,10 +41,72 @@ def format_profile_data(profile: Dict[str, Any]) -> str:
             output.append(formatted_data)
         except Exception:
             output.append(str(profile['profile_data']))
-    
+
     output.append("=" * 60)
     return "\n".join(output)
 
+def build_conditions(args) -> List[tuple]:
+    """Translate the filter options into (column, operator, value) conditions for the backend."""
+    conditions = []
+    if args.min_followers is not None:
+        conditions.append(("followers_count", "gte", args.min_followers))
+    if args.max_followers is not None:
+        conditions.append(("followers_count", "lte", args.max_followers))
+    if args.min_following is not None:
+        conditions.append(("following_count", "gte", args.min_following))
+    if args.max_following is not None:
+        conditions.append(("following_count", "lte", args.max_following))
+    if args.car_profile == "null":
+        conditions.append(("is_car_profile", "is_", "null"))
+    elif args.car_profile:
+        conditions.append(("is_car_profile", "eq", args.car_profile == "true"))
+    if args.profile_type:
+        conditions.append(("profile_type", "eq", args.profile_type))
+    if args.bio_contains:
+        # '*' is PostgREST's wildcard; the SQLite backend understands it too
+        conditions.append(("biography", "ilike", f"*{args.bio_contains}*"))
+    return conditions
+
+def output_columns(args) -> List[str]:
+    """Project only the columns the chosen output format shows."""
+    if args.columns:
+        return [c.strip() for c in args.columns.split(",") if c.strip()]
+    if args.format == "pretty":
+        return PRETTY_COLUMNS + (["profile_data"] if args.show_profile_data else [])
+    if args.format == "table":
+        return TABLE_COLUMNS
+    return RECORD_COLUMNS
+
+def _cell(value: Any, width: int) -> str:
+    text = "" if value is None else (f"{value:,}" if isinstance(value, int) and not isinstance(value, bool) else str(value))
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+def write_profiles(profiles: Iterable[Dict[str, Any]], fmt: str, columns: List[str], out=None) -> int:
+    """Write profiles to `out` (stdout by default) one at a time as they arrive and return how many were written."""
+    out = out or sys.stdout
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+    elif fmt == "table":
+        widths = [max(len(c), TABLE_WIDTHS.get(c, 10)) for c in columns]
+        out.write(" ".join(c.ljust(w) for c, w in zip(columns, widths)) + "\n")
+        out.write(" ".join("-" * w for w in widths) + "\n")
+
+    for profile in profiles:
+        count += 1
+        if fmt == "pretty":
+            out.write(format_profile_data(profile) + "\n")
+        elif fmt == "ndjson":
+            out.write(json.dumps(profile, ensure_ascii=False) + "\n")
+        elif fmt == "csv":
+            writer.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+                             for k, v in profile.items()})
+        else:
+            out.write(" ".join(_cell(profile.get(c), w).ljust(w) for c, w in zip(columns, widths)) + "\n")
+    return count
+
 def main():
     parser = argparse.ArgumentParser(description='Query Instagram profiles from the database')
     parser.add_argument('--username', help='Specific username to look up')
@@ -39,58 +114,66 @@ def main():
     parser.add_argument('--before-date', help='Get profiles created before this date (YYYY-MM-DD)')
     parser.add_argument('--verified-only', action='store_true', help='Show only verified profiles')
     parser.add_argument('--min-followers', type=int, help='Minimum number of followers')
-    parser.add_argument('--limit', type=int, default=10, help='Maximum number of profiles to return')
-    
+    parser.add_argument('--max-followers', type=int, help='Maximum number of followers')
+    parser.add_argument('--min-following', type=int, help='Minimum number of accounts followed')
+    parser.add_argument('--max-following', type=int, help='Maximum number of accounts followed')
+    parser.add_argument('--car-profile', choices=['true', 'false', 'null'],
+                        help='Filter on the analysis verdict ("null" for profiles not analyzed yet)')
+    parser.add_argument('--profile-type', type=str.lower, choices=PROFILE_TYPES, help='Filter on the analyzed profile type')
+    parser.add_argument('--bio-contains', help='Case-insensitive text search in the biography')
+    parser.add_argument('--limit', type=int, help='Maximum number of profiles to return (default: all matches)')
+    parser.add_argument('--format', choices=['pretty', 'table', 'ndjson', 'csv'], default='pretty',
+                        help='Output format; results are written page by page as they are fetched')
+    parser.add_argument('--columns', help='Comma-separated columns to fetch and print (overrides the format default)')
+    parser.add_argument('--show-profile-data', action='store_true',
+                        help='Also fetch and print the raw profile_data JSON (pretty format)')
+    parser.add_argument('--page-size', type=int, default=500, help='Rows fetched per request')
+    parser.add_argument('--backend', help='Profile storage, e.g. "supabase" or "sqlite:///profiles.sqlite3" '
+                                          '(defaults to PROFILE_BACKEND, then supabase)')
+
     args = parser.parse_args()
-    
+
     # Initialize the profile fetcher
-    fetcher = ProfileFetcher()
-    
+    fetcher = ProfileFetcher(create_backend(args.backend))
+
     try:
-        # Define columns we want to fetch
-        columns = [
-            "username",
-            "full_name",
-            "biography",
-            "profile_data",
-            "followers_count",
-            "following_count",
-            "is_verified",
-            "created_at"
-        ]
-        
         # Build filters
         filters = {}
         if args.username:
             filters["username"] = args.username
         if args.verified_only:
             filters["is_verified"] = True
-            
-        # Get profiles
-        profiles = fetcher.get_profiles(
-            select_columns=columns,
+
+        # Every predicate is evaluated by the backend, and pages are streamed in (created_at, id) order,
+        # followed by the profiles with no created_at
+        page_size = min(args.page_size, args.limit) if args.limit else args.page_size
+        profiles = fetcher.iter_profiles(
+            select_columns=output_columns(args),
             filters=filters,
-            date_column="created_at" if args.after_date or args.before_date else None,
+            date_column="created_at",
             after_date=args.after_date,
             before_date=args.before_date,
-            limit=args.limit
+            page_size=max(1, page_size),
+            prefetch=True,
+            where=build_conditions(args),
+            include_undated=True
         )
-        
-        # Filter by minimum followers if specified
-        if args.min_followers:
-            profiles = [p for p in profiles if p.get('followers_count', 0) >= args.min_followers]
-        
-        # Display results
-        if not profiles:
-            print("No profiles found matching the criteria.")
-            return
-        
-        print(f"\nFound {len(profiles)} matching profiles:")
-        for profile in profiles:
-            print(format_profile_data(profile))
-            
+        if args.limit:
+            profiles = islice(profiles, args.limit)
+
+        count = write_profiles(profiles, args.format, output_columns(args))
+        sys.stdout.flush()
+        # Keep machine-readable output clean; the summary goes to stderr
+        if not count:
+            print("No profiles found matching the criteria.", file=sys.stderr)
+        elif args.format in ("pretty", "table"):
+            print(f"\n{count} matching profiles", file=sys.stderr)
+
+    except BrokenPipeError:
+        # Output piped into something like `head` that stopped reading
+        sys.stderr.close()
     except Exception as e:
-        print(f"An error occurred: {str(e)}")
+        print(f"An error occurred: {str(e)}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,40 @@
-from typing import List, Optional, Dict, Any, Union
-from supabase import create_client
-import os
-from dotenv import load_dotenv
+from typing import List, Optional, Dict, Any, Union, Iterator, Tuple
 from datetime import datetime
+from backends.base import ProfileBackend
+from backends.factory import create_backend
+from query_cache import LookupBatcher, QueryCache
+import metrics
 
 class ProfileFetcher:
-    def __init__(self):
-        """Initialize the ProfileFetcher with Supabase credentials."""
-        load_dotenv()
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("Missing Supabase credentials in .env file")
+    # Query builder methods accepted in `where` conditions
+    WHERE_OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte", "is_", "ilike")
+
+    def __init__(self, backend: Optional[ProfileBackend] = None,
+                 query_cache: Optional[QueryCache] = None,
+                 lookup_batch_window: float = 0.0):
+        """
+        Initialize the ProfileFetcher with a storage backend.
         
-        self.supabase = create_client(supabase_url, supabase_key)
+        Args:
+            backend (ProfileBackend, optional): Storage to query. Defaults to the backend
+                                                named by PROFILE_BACKEND (read from .env), which
+                                                is Supabase unless set.
+            query_cache (QueryCache, optional): Read-through cache for get_profiles and
+                                                username lookups. Pass the same cache to
+                                                ProfileUpdater so its writes invalidate it.
+            lookup_batch_window (float): If set, concurrent get_profile_by_username calls
+                                         arriving within this many seconds share one query.
+        """
+        self.backend = backend or create_backend()
+        # Kept under its original name for existing callers
+        self.supabase = self.backend
+        self.query_cache = query_cache
+        self._lookup_batcher = None
+        if lookup_batch_window > 0:
+            self._lookup_batcher = LookupBatcher(
+                lambda usernames, columns: self.get_profiles_by_usernames(usernames, list(columns) or None),
+                window=lookup_batch_window
+            )
     
     def get_profiles(self, 
                     select_columns: Optional[List[str]] = ["username", "full_name", "followers_count",'biography', "following_count", "created_at"],
@@ -22,7 +42,8 @@ class ProfileFetcher:
                     date_column: Optional[str] = None,
                     after_date: Optional[Union[str, datetime]] = None,
                     before_date: Optional[Union[str, datetime]] = None,
-                    limit: int = 100) -> List[Dict[str, Any]]:
+                    limit: int = 100,
+                    where: Optional[List[Tuple[str, str, Any]]] = None) -> List[Dict[str, Any]]:
         """
         Fetch profiles from Supabase with specified columns and filters.
         
@@ -34,11 +55,194 @@ class ProfileFetcher:
             after_date (str or datetime, optional): Get records after this date.
             before_date (str or datetime, optional): Get records before this date.
             limit (int): Maximum number of records to return.
+            where (List[Tuple[str, str, Any]], optional): Extra (column, operator, value)
+                                                          conditions, e.g. ("followers_count", "gte", 1000).
         
         Returns:
             List[Dict[str, Any]]: List of profile records.
         """
-        query = self.supabase.table("profiles")
+        if self.query_cache:
+            key = QueryCache.make_key("profiles", select_columns and sorted(select_columns), filters,
+                                      date_column, str(after_date or ""), str(before_date or ""), where, limit)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                return self._without_username(cached, select_columns)
+        
+        columns = select_columns
+        if self.query_cache and select_columns and "username" not in select_columns:
+            # Cached rows need their username so a write to the row can invalidate them
+            columns = list(select_columns) + ["username"]
+        query = self._build_query(columns, filters, date_column, after_date, before_date, where)
+                
+        # Apply limit and order by date if date filtering is used
+        if date_column:
+            query = query.order(date_column, desc=True)
+        query = query.limit(limit)
+        
+        rows = self._execute(query)
+        if self.query_cache:
+            filter_columns = list(filters or {}) + [c for c, _, _ in where or []] + ([date_column] if date_column else [])
+            looked_up = [filters["username"]] if filters and "username" in filters else []
+            self.query_cache.put(key, rows, columns, filter_columns, looked_up)
+        return self._without_username(rows, select_columns)
+    
+    def get_profiles_by_usernames(self,
+                                  usernames: List[str],
+                                  select_columns: Optional[List[str]] = None,
+                                  chunk_size: int = 500) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch many profiles by username with one `in` query per chunk.
+        
+        Usernames already in the query cache are answered from it, and only the
+        rest are sent to the backend.
+        
+        Args:
+            usernames (List[str]): Usernames to look up.
+            select_columns (List[str], optional): List of columns to select.
+            chunk_size (int): Maximum usernames per query.
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Profiles keyed by username; unknown usernames are absent.
+        """
+        columns = list(select_columns) if select_columns else None
+        if columns and "username" not in columns:
+            columns.append("username")
+        
+        found, missing = {}, []
+        for username in dict.fromkeys(usernames):
+            cached = self.query_cache.get(self._lookup_key(username, columns)) if self.query_cache else None
+            if cached is None:
+                missing.append(username)
+            elif cached:
+                found[username] = cached[0]
+        
+        for i in range(0, len(missing), chunk_size):
+            batch = missing[i:i + chunk_size]
+            rows = self._execute(self._build_query(columns, None, None, None, None).in_("username", batch))
+            by_username = {row["username"]: row for row in rows}
+            found.update(by_username)
+            if self.query_cache:
+                for username in batch:
+                    row = by_username.get(username)
+                    self.query_cache.put(self._lookup_key(username, columns), [row] if row else [],
+                                         columns, usernames=[username])
+        
+        self._without_username(found.values(), select_columns)
+        return found
+    
+    @staticmethod
+    def _without_username(rows, select_columns):
+        """Drop the username fetched only for caching from rows whose caller did not select it"""
+        if select_columns and "username" not in select_columns:
+            for row in rows:
+                row.pop("username", None)
+        return rows
+    
+    @staticmethod
+    def _lookup_key(username, columns):
+        return QueryCache.make_key("username", username, columns and sorted(columns))
+    
+    def iter_profiles(self,
+                      select_columns: Optional[List[str]] = ["username", "full_name", "followers_count",'biography', "following_count", "created_at"],
+                      filters: Optional[Dict[str, Any]] = None,
+                      date_column: str = "created_at",
+                      after_date: Optional[Union[str, datetime]] = None,
+                      before_date: Optional[Union[str, datetime]] = None,
+                      page_size: int = 500,
+                      prefetch: bool = False,
+                      descending: bool = True,
+                      start_after: Optional[Tuple[str, Any]] = None,
+                      where: Optional[List[Tuple[str, str, Any]]] = None,
+                      include_undated: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every matching profile using keyset pagination.
+        
+        Pages are ordered on the composite key (date_column, id), and each page
+        starts strictly after the last key of the previous one, so rows that share
+        a timestamp are neither repeated nor skipped and no page needs an OFFSET.
+        Only one page (two with prefetch) is held in memory at a time. Rows with
+        no value in date_column are only returned with `include_undated`: they
+        sort before every date and are paged on id alone, in a second pass
+        (first when ascending). A date bound excludes them.
+        
+        Args:
+            select_columns (List[str], optional): List of columns to select.
+                                                If None, selects all columns.
+            filters (Dict[str, Any], optional): Dictionary of filter conditions.
+            date_column (str): Timestamp column used as the first part of the key.
+            after_date (str or datetime, optional): Get records after this date.
+            before_date (str or datetime, optional): Get records before this date.
+            page_size (int): Number of records fetched per request.
+            prefetch (bool): Fetch the next page in a background thread while the
+                             caller consumes the current one.
+            descending (bool): Walk from newest to oldest (default) or the reverse.
+            start_after (Tuple[str, Any], optional): (date_column value, id) key to resume after;
+                                                     the date is None for an undated row.
+            where (List[Tuple[str, str, Any]], optional): Extra (column, operator, value) conditions.
+            include_undated (bool): Also return rows whose date_column is NULL.
+        
+        Yields:
+            Dict[str, Any]: Profile records, one at a time.
+        """
+        # The keyset columns must be fetched even if the caller did not ask for them
+        extra_columns = []
+        if select_columns:
+            extra_columns = [c for c in (date_column, "id") if c not in select_columns]
+            select_columns = list(select_columns) + extra_columns
+
+        def fetch_page(cursor, undated):
+            query = self._build_query(select_columns, filters, date_column, after_date, before_date, where)
+            if undated:
+                query = query.is_(date_column, "null")
+                if cursor:
+                    query = query.lt("id", cursor[1]) if descending else query.gt("id", cursor[1])
+            else:
+                query = query.not_.is_(date_column, "null")
+                if cursor:
+                    query = query.or_(self._keyset_filter(date_column, cursor, descending))
+                query = query.order(date_column, desc=descending)
+            query = query.order("id", desc=descending).limit(page_size)
+            return self._execute(query)
+
+        # Undated rows sort before every date; no date bound can match them
+        passes = [False]
+        if include_undated and not after_date and not before_date:
+            passes = [False, True] if descending else [True, False]
+        cursor = start_after
+        if cursor and (cursor[0] is None) in passes:
+            # Resume in the pass the cursor came from
+            passes = passes[passes.index(cursor[0] is None):]
+
+        executor = None
+        if prefetch:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            for undated in passes:
+                page = fetch_page(cursor, undated)
+                while page:
+                    cursor = (page[-1][date_column], page[-1]["id"])
+                    has_more = len(page) == page_size
+                    next_page = None
+                    if has_more and executor:
+                        next_page = executor.submit(fetch_page, cursor, undated)
+
+                    for profile in page:
+                        for column in extra_columns:
+                            profile.pop(column, None)
+                        yield profile
+
+                    if not has_more:
+                        break
+                    page = next_page.result() if next_page else fetch_page(cursor, undated)
+                cursor = None
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _build_query(self, select_columns, filters, date_column, after_date, before_date, where=None):
+        """Build a profiles query with the column selection, filters, conditions and date range applied."""
+        query = self.backend.table("profiles")
         
         # Select specific columns if provided
         if select_columns:
@@ -47,10 +251,16 @@ class ProfileFetcher:
         else:
             query = query.select("*")
             
-        # Apply regular filters if provided
+        # Apply regular filters if provided; None matches NULL
         if filters:
             for key, value in filters.items():
-                query = query.eq(key, value)
+                query = query.is_(key, "null") if value is None else query.eq(key, value)
+        
+        # Apply (column, operator, value) conditions, all evaluated by the backend
+        for column, op, value in where or []:
+            if op not in self.WHERE_OPERATORS:
+                raise ValueError(f"Unsupported operator: {op}")
+            query = getattr(query, op)(column, value)
         
         # Apply date filters if provided
         if date_column:
@@ -63,32 +273,42 @@ class ProfileFetcher:
                 if isinstance(before_date, datetime):
                     before_date = before_date.isoformat()
                 query = query.lte(date_column, before_date)
-                
-        # Apply limit and order by date if date filtering is used
-        if date_column:
-            query = query.order(date_column, desc=True)
-        query = query.limit(limit)
-        
-        response = query.execute()
-        return response.data
+        return query
+    
+    @staticmethod
+    def _execute(query):
+        """Run a read query, recording its latency and row count."""
+        with metrics.timer("fetch"):
+            rows = query.execute().data
+        metrics.incr("rows_fetched", len(rows or []))
+        return rows
+    
+    @staticmethod
+    def _keyset_filter(date_column, cursor, descending):
+        """PostgREST or-filter selecting rows strictly after `cursor` in (date_column, id) order."""
+        timestamp, last_id = cursor
+        op = "lt" if descending else "gt"
+        return f'{date_column}.{op}."{timestamp}",and({date_column}.eq."{timestamp}",id.{op}."{last_id}")'
     
-    def get_unprocessed_profiles(self, limit=1000):
+    def get_unprocessed_profiles(self, limit=1000, exclude=()):
         """
         Fetch profiles that haven't been analyzed yet (where is_car_profile is null)
         
         Args:
             limit (int): Maximum number of profiles to fetch
+            exclude (Iterable[str]): Usernames to leave out, such as profiles already being analyzed
         
         Returns:
             List[Dict[str, Any]]: List of unprocessed profile records
         """
-        query = self.supabase.table("profiles")\
+        exclude = set(exclude)
+        # Over-fetch so excluded rows cannot crowd out new work
+        query = self.backend.table("profiles")\
             .select("username, full_name, followers_count, biography, following_count, created_at")\
             .is_('is_car_profile', 'null')\
-            .limit(limit)
+            .limit(limit + len(exclude))
         
-        response = query.execute()
-        return response.data
+        return [p for p in self._execute(query) if p['username'] not in exclude][:limit]
     
     def get_profile_by_username(self, 
                               username: str,
@@ -103,6 +323,10 @@ class ProfileFetcher:
         Returns:
             Optional[Dict[str, Any]]: Profile data if found, None otherwise.
         """
+        if self._lookup_batcher:
+            return self._lookup_batcher.get(username, tuple(select_columns or ()))
+        if self.query_cache:
+            return self.get_profiles_by_usernames([username], select_columns).get(username)
         profiles = self.get_profiles(
             select_columns=select_columns,
             filters={"username": username},
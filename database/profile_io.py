@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Streaming export and import of the profiles table.
+
+Exports walk the table with keyset pagination (oldest first) and write each
+page as soon as it arrives, so memory stays flat however large the table is:
+
+    python profile_io.py export profiles.ndjson
+    python profile_io.py export snapshot/ --format columnar
+
+A checkpoint next to the output records the last (created_at, id) written;
+--resume continues from it after a crash, and resuming a finished export
+appends only the rows added since. Columnar exports are a directory of part
+files: Parquet when pyarrow is installed, otherwise a compact typed-array
+format readable with this module alone.
+
+Imports stream either format back in through bulk upserts on username:
+
+    python profile_io.py import snapshot/ --backend sqlite:///profiles.sqlite3
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+
+import metrics
+from backends.factory import create_backend
+from backends.sqlite_backend import PROFILE_COLUMNS
+from profile_fetcher import ProfileFetcher
+from updaters.profile_updater import ProfileUpdater
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Columns every profiles table has. Worker lease columns are runtime state, and tags
+# only exist once migrations/supabase_add_tags.sql has run, so ask for them with --columns.
+EXPORT_COLUMNS = ["id", "username", "full_name", "biography", "profile_data", "followers_count",
+                  "following_count", "is_verified", "is_car_profile", "profile_type", "last_updated",
+                  "created_at"]
+KEYSET_COLUMNS = ("created_at", "id")
+
+COLS_MAGIC = b"CRMCOLS1"
+COLS_SUFFIX = ".cols"
+PARQUET_SUFFIX = ".parquet"
+
+
+def column_kind(column: str) -> str:
+    """Storage kind of a column: 'int', 'bool', 'json' or 'str'."""
+    return {"INTEGER": "int", "BOOLEAN": "bool", "JSON": "json"}.get(PROFILE_COLUMNS.get(column), "str")
+
+
+def checkpoint_path(path: str) -> str:
+    return path.rstrip("/\\") + ".checkpoint.json"
+
+
+def _save_checkpoint(path: str, state: Dict[str, Any]):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# Typed-array part files
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def write_cols_file(path: str, columns: List[str], data: Dict[str, List[Any]], rows: int):
+    """
+    Write one part in the typed-array format.
+
+    Layout: magic, a little-endian uint32 header length, a JSON header listing
+    each column's kind and buffer sizes, then the buffers. Integers are int64
+    with a null mask, booleans int8 with -1 for null, and strings (JSON values
+    serialized) a null mask, int64 end offsets and one UTF-8 buffer.
+    """
+    header = {"rows": rows, "columns": []}
+    buffers = []
+    for column in columns:
+        kind = column_kind(column)
+        values = data[column]
+        if kind == "bool":
+            column_buffers = [_little_endian(array("b", (-1 if v is None else int(bool(v)) for v in values)))]
+        else:
+            nulls = array("B", (v is None for v in values)).tobytes()
+            if kind == "int":
+                column_buffers = [nulls, _little_endian(array("q", (0 if v is None else int(v) for v in values)))]
+            else:
+                offsets, chunks, end = array("q"), [], 0
+                for v in values:
+                    if v is not None:
+                        text = json.dumps(v, ensure_ascii=False) if kind == "json" and not isinstance(v, str) else str(v)
+                        encoded = text.encode("utf-8")
+                        chunks.append(encoded)
+                        end += len(encoded)
+                    offsets.append(end)
+                column_buffers = [nulls, _little_endian(offsets), b"".join(chunks)]
+        header["columns"].append({"name": column, "kind": kind, "sizes": [len(b) for b in column_buffers]})
+        buffers.extend(column_buffers)
+
+    encoded_header = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(COLS_MAGIC)
+        f.write(struct.pack("<I", len(encoded_header)))
+        f.write(encoded_header)
+        for buffer in buffers:
+            f.write(buffer)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_cols_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of a typed-array part file."""
+    with open(path, "rb") as f:
+        if f.read(len(COLS_MAGIC)) != COLS_MAGIC:
+            raise ValueError(f"Not a typed-array profile file: {path}")
+        header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+        rows = header["rows"]
+        columns = {}
+        for spec in header["columns"]:
+            buffers = [f.read(size) for size in spec["sizes"]]
+            kind = spec["kind"]
+            if kind == "bool":
+                columns[spec["name"]] = [None if v < 0 else bool(v) for v in _from_little_endian("b", buffers[0])]
+                continue
+            nulls = buffers[0]
+            if kind == "int":
+                values = _from_little_endian("q", buffers[1])
+                columns[spec["name"]] = [None if nulls[i] else values[i] for i in range(rows)]
+                continue
+            offsets, blob = _from_little_endian("q", buffers[1]), buffers[2]
+            decoded, start = [], 0
+            for i in range(rows):
+                end = offsets[i]
+                if nulls[i]:
+                    decoded.append(None)
+                else:
+                    text = blob[start:end].decode("utf-8")
+                    decoded.append(json.loads(text) if kind == "json" else text)
+                start = end
+            columns[spec["name"]] = decoded
+    names = list(columns)
+    for i in range(rows):
+        yield {name: columns[name][i] for name in names}
+
+
+# Export sinks: write_page() returns the state to checkpoint once the data is durable
+
+class NDJSONSink:
+    """One JSON object per line in a single file; every page is durable once written."""
+
+    def __init__(self, path: str, columns: List[str], state: Optional[Dict[str, Any]] = None):
+        self.columns = columns
+        if state:
+            # Drop anything written after the last checkpoint
+            self._file = open(path, "r+b")
+            self._file.truncate(state["offset"])
+            self._file.seek(state["offset"])
+        else:
+            self._file = open(path, "wb")
+
+    def write_page(self, rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.tell()}
+
+    def finish(self) -> Dict[str, Any]:
+        state = {"offset": self._file.tell()}
+        self._file.close()
+        return state
+
+
+class ColumnarSink:
+    """
+    Directory of columnar part files of roughly `rows_per_file` rows each.
+
+    A part becomes durable (and is checkpointed) when it is closed, so a
+    resumed export rewrites at most the part that was open during the crash.
+    """
+
+    def __init__(self, path: str, columns: List[str], rows_per_file: int = 100_000,
+                 state: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.columns = columns
+        self.rows_per_file = rows_per_file
+        self.parts = state["parts"] if state else 0
+        self.suffix = PARQUET_SUFFIX if pq else COLS_SUFFIX
+        os.makedirs(path, exist_ok=True)
+        # Parts beyond the checkpoint were never committed
+        for name in os.listdir(path):
+            if name.startswith("part-") and (not state or int(name[5:10]) >= self.parts):
+                os.remove(os.path.join(path, name))
+        self._rows = 0
+        self._writer = None
+        self._data = None
+
+    def write_page(self, rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if pq:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self._part_path(), self._arrow_schema())
+            table = pa.Table.from_pylist([self._arrow_row(row) for row in rows], schema=self._arrow_schema())
+            self._writer.write_table(table)
+        else:
+            if self._data is None:
+                self._data = {column: [] for column in self.columns}
+            for column in self.columns:
+                self._data[column].extend(row.get(column) for row in rows)
+        self._rows += len(rows)
+        if self._rows >= self.rows_per_file:
+            return self._close_part()
+        return None
+
+    def finish(self) -> Dict[str, Any]:
+        if self._rows:
+            return self._close_part()
+        return {"parts": self.parts}
+
+    def _close_part(self) -> Dict[str, Any]:
+        if pq:
+            self._writer.close()
+            self._writer = None
+        else:
+            write_cols_file(self._part_path(), self.columns, self._data, self._rows)
+            self._data = None
+        self.parts += 1
+        self._rows = 0
+        return {"parts": self.parts}
+
+    def _part_path(self) -> str:
+        return os.path.join(self.path, f"part-{self.parts:05d}{self.suffix}")
+
+    def _arrow_schema(self):
+        types = {"int": pa.int64(), "bool": pa.bool_()}
+        return pa.schema([(column, types.get(column_kind(column), pa.string())) for column in self.columns])
+
+    def _arrow_row(self, row):
+        return {column: json.dumps(value, ensure_ascii=False)
+                if column_kind(column) == "json" and value is not None and not isinstance(value, str) else value
+                for column, value in ((c, row.get(c)) for c in self.columns)}
+
+
+def export_profiles(fetcher: ProfileFetcher, path: str, fmt: str = "ndjson",
+                    columns: Optional[List[str]] = None, page_size: int = 1000,
+                    resume: bool = False, rows_per_file: int = 100_000) -> int:
+    """
+    Stream the profiles table to `path`, checkpointing as pages become durable.
+
+    Args:
+        fetcher (ProfileFetcher): Source of the profiles.
+        path (str): NDJSON file, or directory of part files for the columnar format.
+        fmt (str): "ndjson" or "columnar".
+        columns (List[str], optional): Columns to export. Defaults to EXPORT_COLUMNS.
+        page_size (int): Rows fetched and written per page.
+        resume (bool): Continue from the checkpoint left by an earlier run.
+        rows_per_file (int): Approximate rows per columnar part file.
+
+    Returns:
+        int: Total rows in the export, including those written by earlier runs.
+    """
+    columns = list(columns or EXPORT_COLUMNS)
+    checkpoint_file = checkpoint_path(path)
+    state = None
+    if resume and os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            state = json.load(f)
+        if state["format"] != fmt or state["columns"] != columns:
+            raise ValueError("Checkpoint was written with a different format or column list")
+
+    if fmt == "ndjson":
+        sink = NDJSONSink(path, columns, state)
+    elif fmt == "columnar":
+        sink = ColumnarSink(path, columns, rows_per_file, state)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    committed = state["rows"] if state else 0
+    cursor = tuple(state["cursor"]) if state and state["cursor"] else None
+    pending_rows, pending_cursor = 0, cursor
+
+    def flush(page):
+        nonlocal committed, pending_rows, pending_cursor
+        pending_cursor = (page[-1]["created_at"], page[-1]["id"])
+        pending_rows += len(page)
+        durable = sink.write_page([{c: p.get(c) for c in columns} for p in page])
+        metrics.incr("rows_exported", len(page))
+        if durable is not None:
+            committed += pending_rows
+            pending_rows = 0
+            _save_checkpoint(checkpoint_file, dict(durable, format=fmt, columns=columns,
+                                                   cursor=pending_cursor, rows=committed))
+
+    fetch_columns = columns + [c for c in KEYSET_COLUMNS if c not in columns]
+    page = []
+    for profile in fetcher.iter_profiles(select_columns=fetch_columns, page_size=page_size,
+                                         prefetch=True, descending=False, start_after=cursor,
+                                         include_undated=True):
+        page.append(profile)
+        if len(page) >= page_size:
+            flush(page)
+            page = []
+    if page:
+        flush(page)
+
+    committed += pending_rows
+    _save_checkpoint(checkpoint_file, dict(sink.finish(), format=fmt, columns=columns,
+                                           cursor=pending_cursor, rows=committed))
+    return committed
+
+
+def read_profiles(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream rows back from an NDJSON export file or a columnar export directory."""
+    if not os.path.isdir(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    for name in sorted(os.listdir(path)):
+        part = os.path.join(path, name)
+        if name.endswith(COLS_SUFFIX):
+            yield from read_cols_file(part)
+        elif name.endswith(PARQUET_SUFFIX):
+            if pq is None:
+                raise ImportError(f"pyarrow is required to read {part}")
+            for batch in pq.ParquetFile(part).iter_batches():
+                for row in batch.to_pylist():
+                    for column, value in row.items():
+                        if column_kind(column) == "json" and isinstance(value, str):
+                            try:
+                                row[column] = json.loads(value)
+                            except ValueError:
+                                pass
+                    yield row
+
+
+def import_profiles(updater: ProfileUpdater, path: str, batch_size: int = 500, keep_ids: bool = False) -> int:
+    """
+    Upsert every row of an export into the updater's backend in bulk batches.
+
+    Rows are matched on username, so re-running an interrupted import is safe.
+
+    Returns:
+        int: Number of rows written.
+    """
+    return updater.upsert_profiles(read_profiles(path), chunk_size=batch_size, keep_ids=keep_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream profiles to or from NDJSON and columnar snapshots')
+    parser.add_argument('--backend', help='Profile storage, e.g. "supabase" or "sqlite:///profiles.sqlite3" '
+                                          '(defaults to PROFILE_BACKEND, then supabase)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Write the profiles table to a snapshot')
+    export.add_argument('path', help='NDJSON file, or directory for --format columnar')
+    export.add_argument('--format', choices=['ndjson', 'columnar'], default='ndjson')
+    export.add_argument('--columns', help='Comma-separated columns to export (default: all data columns except tags)')
+    export.add_argument('--page-size', type=int, default=1000, help='Rows fetched per request')
+    export.add_argument('--rows-per-file', type=int, default=100_000, help='Rows per columnar part file')
+    export.add_argument('--resume', action='store_true', help='Continue from the last checkpoint')
+
+    load = commands.add_parser('import', help='Upsert a snapshot into the profiles table')
+    load.add_argument('path', help='NDJSON file or columnar export directory')
+    load.add_argument('--batch-size', type=int, default=500, help='Rows per bulk upsert')
+    load.add_argument('--keep-ids', action='store_true', help='Keep source ids instead of letting the target assign them')
+    args = parser.parse_args()
+
+    fetcher = ProfileFetcher(create_backend(args.backend))
+    if args.command == 'export':
+        columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+        if args.format == 'columnar' and pq is None:
+            print("pyarrow not installed; writing the built-in typed-array format", file=sys.stderr)
+        total = export_profiles(fetcher, args.path, args.format, columns, args.page_size,
+                                args.resume, args.rows_per_file)
+        print(f"Exported {total} profiles to {args.path}")
+    else:
+        written = import_profiles(ProfileUpdater(fetcher.backend), args.path, args.batch_size, args.keep_ids)
+        print(f"Imported {written} profiles from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
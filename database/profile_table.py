@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Columnar in-memory profile store for segmentation and scoring.
+
+A ProfileTable keeps each field in one NumPy array instead of one dict per
+profile: follower/following counts as int64, is_verified as bool,
+is_car_profile as int8 (-1 for not analyzed), profile_type as interned int16
+codes, and the text fields as UTF-8 bytes in one buffer indexed by offsets.
+Segmentation then runs as whole-column operations:
+
+    table = ProfileTable.from_fetcher(ProfileFetcher(), where=[("is_car_profile", "eq", True)])
+    companies = table.where(table.type_mask("company"))
+    print(companies.tier_counts(), companies.top_k(20).to_dicts())
+
+where() and top_k() return ProfileViews, which hold only the selected row
+numbers; columns are gathered from the table when a view reads them.
+
+    python profile_table.py --backend sqlite:///profiles.sqlite3 --top 10
+"""
+import argparse
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from follower_tiers import FOLLOWER_TIERS, TIER_BOUNDS, TIER_NAMES
+
+# Columns loaded into a table
+TABLE_COLUMNS = ["username", "full_name", "biography", "followers_count", "following_count",
+                 "is_verified", "is_car_profile", "profile_type"]
+STRING_COLUMNS = ("username", "full_name", "biography")
+NUMERIC_COLUMNS = {
+    "followers_count": np.int64,
+    "following_count": np.int64,
+    "is_verified": np.bool_,
+    "is_car_profile": np.int8,
+    "profile_type": np.int16,
+}
+
+_TIER_BOUNDS = np.array(TIER_BOUNDS, dtype=np.int64)
+
+# Stored for an is_car_profile that is still NULL, and for a missing profile_type
+NOT_ANALYZED = -1
+NO_TYPE = -1
+
+
+class StringColumn:
+    """
+    UTF-8 strings packed into one byte buffer; row i is data[offsets[i]:offsets[i + 1]].
+
+    Missing values are stored as empty strings.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = bytearray()
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, row: int) -> str:
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return self._data[start:end].decode("utf-8")
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets[:self._size + 1]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) + self.offsets.nbytes
+
+    def extend(self, values: Iterable[Optional[str]]):
+        encoded = [value.encode("utf-8") if value else b"" for value in values]
+        count = len(encoded)
+        self._reserve(self._size + count)
+        ends = self._offsets[self._size + 1:self._size + 1 + count]
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=count), out=ends)
+        ends += len(self._data)
+        self._data += b"".join(encoded)
+        self._size += count
+
+    def lengths(self) -> np.ndarray:
+        """Length in bytes of every string."""
+        return np.diff(self.offsets)
+
+    def contains(self, text: str, case_sensitive: bool = False) -> np.ndarray:
+        """
+        Boolean mask of the rows whose string contains `text`.
+
+        The whole buffer is searched at once and each match is mapped back to
+        its row through the offsets, instead of decoding every string.
+        """
+        needle = text.encode("utf-8")
+        haystack = bytes(self._data) if case_sensitive else self._data.lower()
+        if not case_sensitive:
+            needle = needle.lower()
+        mask = np.zeros(self._size, dtype=bool)
+        if not needle:
+            mask[:] = True
+            return mask
+
+        positions = []
+        found = haystack.find(needle)
+        while found != -1:
+            positions.append(found)
+            found = haystack.find(needle, found + 1)
+        if positions:
+            positions = np.array(positions, dtype=np.int64)
+            offsets = self.offsets
+            rows = np.searchsorted(offsets, positions, side="right") - 1
+            # Discard matches that run across the end of a row into the next
+            inside = positions + len(needle) <= offsets[rows + 1]
+            mask[rows[inside]] = True
+        return mask
+
+    def _reserve(self, size: int):
+        if size + 1 > len(self._offsets):
+            grown = np.zeros(max(size + 1, 2 * len(self._offsets)), dtype=np.int64)
+            grown[:self._size + 1] = self._offsets[:self._size + 1]
+            self._offsets = grown
+
+
+class _Segmentable(ABC):
+    """Segmentation operations shared by ProfileTable and ProfileView."""
+
+    table: "ProfileTable"
+
+    @abstractmethod
+    def column(self, name: str) -> np.ndarray: ...
+
+    @abstractmethod
+    def row_ids(self) -> np.ndarray: ...
+
+    def follower_tiers(self) -> np.ndarray:
+        """Tier of every row as an index into TIER_NAMES."""
+        return np.searchsorted(_TIER_BOUNDS, self.column("followers_count"), side="right").astype(np.int8)
+
+    def tier_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.follower_tiers(), minlength=len(TIER_NAMES))
+        return dict(zip(TIER_NAMES, counts.tolist()))
+
+    def follower_ratio(self) -> np.ndarray:
+        """Followers per account followed; accounts following nobody count as following one."""
+        return self.column("followers_count") / np.maximum(self.column("following_count"), 1)
+
+    def type_mask(self, *profile_types: str) -> np.ndarray:
+        """Boolean mask of the rows whose profile_type is one of `profile_types`."""
+        codes = [self.table.type_code(t) for t in profile_types]
+        return np.isin(self.column("profile_type"), [c for c in codes if c != NO_TYPE])
+
+    def text_mask(self, name: str, text: str) -> np.ndarray:
+        """Boolean mask of the rows whose string column `name` contains `text`, ignoring case."""
+        return self.table.strings[name].contains(text)[self.row_ids()]
+
+    def string_values(self, name: str) -> List[str]:
+        column = self.table.strings[name]
+        return [column[i] for i in self.row_ids().tolist()]
+
+    def car_mask(self, value: Optional[bool] = True) -> np.ndarray:
+        """Boolean mask on is_car_profile; None selects the rows not analyzed yet."""
+        code = NOT_ANALYZED if value is None else int(value)
+        return self.column("is_car_profile") == code
+
+    def segment_counts(self) -> Dict[Tuple[Optional[str], str], int]:
+        """Number of rows in each (profile_type, follower tier) segment."""
+        ntiers = len(TIER_NAMES)
+        # Shift the codes by one so "no type" (-1) gets its own bucket
+        keys = (self.column("profile_type").astype(np.int64) + 1) * ntiers + self.follower_tiers()
+        counts = np.bincount(keys, minlength=(len(self.table.profile_types) + 1) * ntiers)
+        types = [None] + self.table.profile_types
+        return {(types[key // ntiers], TIER_NAMES[key % ntiers]): int(counts[key])
+                for key in np.flatnonzero(counts)}
+
+    def where(self, mask: np.ndarray) -> "ProfileView":
+        """View of the rows selected by a boolean mask (or positions) over this table or view."""
+        return ProfileView(self.table, self.row_ids()[mask])
+
+    def top_k(self, k: int, key: Union[str, np.ndarray] = "followers_count") -> "ProfileView":
+        """
+        View of the k rows with the largest `key`, largest first.
+
+        Args:
+            k (int): Number of rows to keep.
+            key (str or np.ndarray): Column name, or one score per row (e.g. follower_ratio()).
+
+        Returns:
+            ProfileView: The selected rows in descending order of `key`.
+        """
+        scores = self.column(key) if isinstance(key, str) else np.asarray(key)
+        if k <= 0 or not len(scores):
+            return ProfileView(self.table, np.empty(0, dtype=np.int64))
+        if k < len(scores):
+            # Partial selection, then sort only the k survivors
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return ProfileView(self.table, self.row_ids()[order])
+
+    def to_dicts(self, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return [self.table.row(i, columns) for i in self.row_ids().tolist()]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in self.row_ids().tolist():
+            yield self.table.row(i)
+
+
+class ProfileTable(_Segmentable):
+    """
+    Growable columnar store of profiles.
+
+    Numeric columns grow by doubling, so appending pages is amortized O(rows).
+    Reading a column returns a view of the filled part of its array, not a copy.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.table = self
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        self.strings = {name: StringColumn(capacity) for name in STRING_COLUMNS}
+        self.profile_types: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> "ProfileTable":
+        table = cls()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                table.append(batch)
+                batch = []
+        table.append(batch)
+        return table
+
+    @classmethod
+    def from_fetcher(cls, fetcher, page_size: int = 1000, **query) -> "ProfileTable":
+        """
+        Load every matching profile from a ProfileFetcher, one page at a time.
+
+        Args:
+            fetcher (ProfileFetcher): Source of the profiles.
+            page_size (int): Rows fetched per request.
+            **query: Further iter_profiles arguments, e.g. filters or where.
+
+        Returns:
+            ProfileTable: The loaded table.
+        """
+        rows = fetcher.iter_profiles(select_columns=TABLE_COLUMNS, page_size=page_size, prefetch=True, **query)
+        return cls.from_rows(rows, batch_size=page_size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, rows: List[Dict[str, Any]]):
+        """Append a page of profile dicts; missing fields become 0, False, not analyzed or no type."""
+        if not rows:
+            return
+        start, end = self._size, self._size + len(rows)
+        self._reserve(end)
+        cols = self._columns
+        cols["followers_count"][start:end] = [row.get("followers_count") or 0 for row in rows]
+        cols["following_count"][start:end] = [row.get("following_count") or 0 for row in rows]
+        cols["is_verified"][start:end] = [bool(row.get("is_verified")) for row in rows]
+        cols["is_car_profile"][start:end] = [NOT_ANALYZED if row.get("is_car_profile") is None
+                                             else int(bool(row["is_car_profile"])) for row in rows]
+        cols["profile_type"][start:end] = [self._intern(row.get("profile_type")) for row in rows]
+        for name, strings in self.strings.items():
+            strings.extend(row.get(name) for row in rows)
+        self._size = end
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def row_ids(self) -> np.ndarray:
+        return np.arange(self._size)
+
+    def type_code(self, profile_type: Optional[str]) -> int:
+        """Interned code of a profile_type (case-insensitive), or NO_TYPE if never seen."""
+        if profile_type is None:
+            return NO_TYPE
+        return self._type_codes.get(profile_type.strip().lower(), NO_TYPE)
+
+    def row(self, i: int, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Rebuild row `i` as a profile dict."""
+        record = {}
+        for name in columns or TABLE_COLUMNS:
+            if name in self.strings:
+                record[name] = self.strings[name][i]
+            elif name == "is_car_profile":
+                code = int(self._columns[name][i])
+                record[name] = None if code == NOT_ANALYZED else bool(code)
+            elif name == "profile_type":
+                code = int(self._columns[name][i])
+                record[name] = None if code == NO_TYPE else self.profile_types[code]
+            else:
+                record[name] = self._columns[name][i].item()
+        return record
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the filled part of the columns."""
+        return sum(self.column(name).nbytes for name in self._columns) + \
+            sum(strings.nbytes for strings in self.strings.values())
+
+    def _intern(self, profile_type: Optional[str]) -> int:
+        if profile_type is None:
+            return NO_TYPE
+        key = profile_type.strip().lower()
+        code = self._type_codes.get(key)
+        if code is None:
+            code = self._type_codes[key] = len(self.profile_types)
+            self.profile_types.append(key)
+        return code
+
+    def _reserve(self, size: int):
+        capacity = len(self._columns["followers_count"])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        for name, values in self._columns.items():
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._columns[name] = grown
+
+
+class ProfileView(_Segmentable):
+    """Selected rows of a ProfileTable, held as row numbers into it."""
+
+    def __init__(self, table: ProfileTable, rows: np.ndarray):
+        self.table = table
+        self.rows = np.asarray(rows, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.table.column(name)[self.rows]
+
+    def row_ids(self) -> np.ndarray:
+        return self.rows
+
+
+def main():
+    from backends.factory import create_backend
+    from profile_fetcher import ProfileFetcher
+
+    parser = argparse.ArgumentParser(description='Load profiles into memory and summarize the CRM segments')
+    parser.add_argument('--backend', help='Profile storage, e.g. "supabase" or "sqlite:///profiles.sqlite3"')
+    parser.add_argument('--car-only', action='store_true', help='Only profiles classified as car-related')
+    parser.add_argument('--bio-contains', help='Only profiles whose biography contains this text')
+    parser.add_argument('--top', type=int, default=10, help='How many of the most-followed profiles to list')
+    parser.add_argument('--page-size', type=int, default=1000, help='Rows fetched per request')
+    args = parser.parse_args()
+
+    where = [("is_car_profile", "eq", True)] if args.car_only else None
+    table = ProfileTable.from_fetcher(ProfileFetcher(create_backend(args.backend)),
+                                      page_size=args.page_size, where=where)
+    view = table.where(table.text_mask("biography", args.bio_contains)) if args.bio_contains else table
+    print(f"{len(view):,} profiles ({table.nbytes / 1e6:.1f} MB in memory)")
+
+    print("\nFollower tiers:")
+    for tier, count in view.tier_counts().items():
+        print(f"  {tier:<8} {count:>10,}")
+
+    print("\nSegments (profile type, tier):")
+    for (profile_type, tier), count in sorted(view.segment_counts().items(), key=lambda item: -item[1]):
+        print(f"  {profile_type or 'unanalyzed':<12} {tier:<8} {count:>10,}")
+
+    print(f"\nTop {args.top} by followers:")
+    for profile in view.top_k(args.top).to_dicts(["username", "followers_count", "profile_type"]):
+        print(f"  {profile['username']:<30} {profile['followers_count']:>12,}  {profile['profile_type'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import metrics
+
+
+class _Entry:
+    __slots__ = ("rows", "expires_at", "usernames", "selected", "filter_columns")
+
+    def __init__(self, rows, expires_at, usernames, selected, filter_columns):
+        self.rows = rows
+        self.expires_at = expires_at
+        self.usernames = usernames
+        self.selected = selected
+        self.filter_columns = filter_columns
+
+
+class QueryCache:
+    """
+    In-process read-through cache of query results with TTL and LRU eviction.
+
+    Entries are keyed on the normalized query. Each entry remembers which
+    usernames it holds (or looked up) and which columns it selected and
+    filtered on, so a write can drop exactly the entries it may have changed:
+    those holding a written username and selecting a written column, and those
+    whose filters or ordering use a written column, since rows may have moved
+    in or out of their results. Writes from other processes are not seen; the
+    TTL bounds how stale an entry can get.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_username = {}
+        self._by_filter_column = {}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Normalize query parameters into a cache key."""
+        return json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached rows for `key` (as fresh copies), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.incr("query_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.incr("query_cache_hits")
+            return [dict(row) for row in entry.rows]
+
+    def put(self, key: str, rows: List[Dict[str, Any]], selected: Optional[Sequence[str]] = None,
+            filter_columns: Iterable[str] = (), usernames: Iterable[str] = ()):
+        """
+        Store the rows of a query.
+
+        Args:
+            key (str): Key from make_key.
+            rows (List[Dict[str, Any]]): Query result.
+            selected (Sequence[str], optional): Selected columns; None means all.
+            filter_columns (Iterable[str]): Columns the query filtered or ordered on.
+            usernames (Iterable[str]): Usernames the query looked up, in addition to those in `rows`.
+        """
+        names = {row["username"] for row in rows if row.get("username")}
+        names.update(usernames)
+        entry = _Entry([dict(row) for row in rows], time.monotonic() + self.ttl_seconds,
+                       frozenset(names), frozenset(selected) if selected else None, frozenset(filter_columns))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for username in entry.usernames:
+                self._by_username.setdefault(username, set()).add(key)
+            for column in entry.filter_columns:
+                self._by_filter_column.setdefault(column, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, usernames: Iterable[str], columns: Iterable[str]) -> int:
+        """Drop entries a write of `columns` on `usernames` may have changed; returns how many."""
+        columns = set(columns)
+        with self._lock:
+            stale = set()
+            for username in usernames:
+                for key in self._by_username.get(username, ()):
+                    selected = self._entries[key].selected
+                    if selected is None or selected & columns:
+                        stale.add(key)
+            for column in columns:
+                stale.update(self._by_filter_column.get(column, ()))
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_username.clear()
+            self._by_filter_column.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for username in entry.usernames:
+            keys = self._by_username.get(username)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_username[username]
+        for column in entry.filter_columns:
+            keys = self._by_filter_column.get(column)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_filter_column[column]
+
+
+class LookupBatcher:
+    """
+    Coalesces point lookups that arrive close together into one bulk query.
+
+    The first caller for a given column set waits `window` seconds for others
+    to join, then runs `fetch_many` once for every username collected (sooner
+    if `max_batch` usernames are waiting); each caller gets its own row back.
+    Only concurrent callers (threads) benefit; a lone caller pays the window.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[str], Tuple[str, ...]], Dict[str, Dict[str, Any]]],
+                 window: float = 0.005, max_batch: int = 200):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def get(self, username: str, columns: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        from concurrent.futures import Future
+
+        with self._lock:
+            batch = self._pending.get(columns)
+            leader = batch is None
+            if leader:
+                batch = self._pending[columns] = {}
+            future = batch.setdefault(username, Future())
+            full = len(batch) >= self.max_batch
+            if full:
+                del self._pending[columns]
+
+        if full:
+            self._run(batch, columns)
+        elif leader:
+            time.sleep(self.window)
+            with self._lock:
+                mine = self._pending.get(columns) is batch
+                if mine:
+                    del self._pending[columns]
+            if mine:
+                self._run(batch, columns)
+        return future.result()
+
+    def _run(self, batch, columns):
+        metrics.incr("batched_lookups", len(batch))
+        try:
+            found = self.fetch_many(list(batch), columns)
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for username, future in batch.items():
+            future.set_result(found.get(username))
@@ -1,100 +1,524 @@
-from google import genai
-
+import argparse
 import asyncio
+import contextlib
 import os
 import json
+import logging
+import socket
 import time  # Add time import for sleep
 from dotenv import load_dotenv
-from gemini.geminihandler import geminiHandler
+import metrics
+from gemini.analysis_cache import AnalysisCache
+from gemini.analysis_schema import AnalysisSchema, CLASSIFICATION_SCHEMA, DEFAULT_TAGS, load_tag_vocabulary, prompt_version
+from gemini.geminihandler import geminiHandler, is_error_response, is_rate_limit_response
+from gemini.prompt_packing import estimate_tokens, pack_by_token_budget
+from gemini.rate_governor import RateGovernor
+from gemini.response_parser import ChunkSalvage
+from pipeline import AnalysisPipeline
+from preclassifier import RuleBasedClassifier
+from bio_clusters import BioClusterIndex
+from leases import LeaseManager
+from backends.factory import create_backend
 from profile_fetcher import ProfileFetcher
 from updaters.profile_updater import ProfileUpdater
+from updaters.result_journal import ResultJournal
 from datetime import datetime
 
-def clean_gemini_response(response):
-    """Clean the Gemini response by removing markdown formatting"""
-    cleaned = response.strip()
-    if cleaned.startswith('```json'):
-        cleaned = cleaned[7:]
-    if cleaned.endswith('```'):
-        cleaned = cleaned[:-3]
-    return cleaned.strip()
-
-def process_profiles_in_batches(fetcher, updater, api_key, batch_size=35, process_size=35, max_retries=1, retry_delay=60):
-    """Process profiles in batches with Gemini analysis"""
-    while True:
-        # Fetch unprocessed profiles
-        profiles = fetcher.get_unprocessed_profiles(batch_size)
+MODEL = 'gemini-2.0-flash'
+ANALYSIS_PROMPT = CLASSIFICATION_SCHEMA.prompt
+# Cached analyses are only reused while the model and prompt stay the same
+PROMPT_VERSION = prompt_version(MODEL, ANALYSIS_PROMPT)
+
+logger = logging.getLogger("analysis")
+
+def resolve_locally(chunk, preclassifier=None, cache=None):
+    """
+    Answer what we can without Gemini: confident rule-based verdicts first, then cached analyses.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Local analysis results and
+        the profiles that still need to be sent to the model.
+    """
+    local_results = []
+    if preclassifier:
+        local_results, chunk = preclassifier.split(chunk)
+        metrics.incr("resolved_by_rules", len(local_results))
+    if cache and chunk:
+        cached_results, chunk = cache.get_many(chunk)
+        local_results += cached_results
+    return local_results, chunk
+
+def pack_batch(profiles, token_budget=4000, process_size=100, clusters=None):
+    """
+    Split a batch into request chunks packed up to the token budget.
+
+    With a BioClusterIndex, near-duplicates ride in the chunk of the first
+    member of their cluster without counting against the budget, and profiles
+    whose cluster already has a verdict get chunks of their own, so duplicates
+    cost neither tokens nor requests.
+    """
+    if not clusters:
+        yield from pack_by_token_budget(profiles, token_budget, process_size)
+        return
+    known, send, followers = clusters.group(profiles)
+    for chunk in pack_by_token_budget(send, token_budget, process_size):
+        yield chunk + [member for profile in chunk for member in followers.get(profile['username'], ())]
+    for i in range(0, len(known), process_size):
+        yield known[i:i + process_size]
+
+def analyze_chunk(gemini_handler, chunk, max_retries=1, retry_delay=60, max_failures=2, schema=None):
+    """
+    Send one chunk to Gemini and salvage every valid result from the responses.
+
+    Only profiles missing from a response are sent again, and a group that keeps
+    failing is bisected so one poison profile cannot sink the whole chunk.
+    Answers are validated against `schema` (classification only by default).
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Analysis results and the
+        profiles that were given up on after bisection.
+    """
+    salvage = ChunkSalvage(chunk, max_failures, schema)
+    errors = 0
+    while salvage.has_work():
+        item = salvage.next_item()
+        response = gemini_handler.send_prompt(gemini_handler.profiles_payload(item.profiles))
+        
+        if is_error_response(response):
+            errors += 1
+            if errors > max_retries:
+                logger.warning("Max retries reached for this chunk, moving on: %s", response)
+                break
+            salvage.requeue(item)
+            metrics.incr("gemini_retries")
+            if is_rate_limit_response(response):
+                metrics.incr("rate_limit_hits")
+                metrics.incr("rate_limit_wait_seconds", retry_delay)
+                logger.warning("API limit reached. Waiting %s seconds before retry...", retry_delay)
+            else:
+                logger.warning("%s. Retrying in %s seconds... (Attempt %d/%d)",
+                               response, retry_delay, errors + 1, max_retries + 1)
+            time.sleep(retry_delay)
+            continue
+        
+        found = salvage.record(item, response)
+        if found < len(item.profiles):
+            metrics.incr("partial_responses")
+            metrics.log_sampled(logger, logging.INFO, "recovered",
+                                "Recovered %d of %d results, re-queuing the rest", found, len(item.profiles))
+    
+    if salvage.poisoned:
+        metrics.incr("poisoned_profiles", len(salvage.poisoned))
+        logger.warning("Giving up on profiles that keep breaking the response: %s",
+                       [p['username'] for p in salvage.poisoned])
+    return salvage.results, salvage.poisoned
+
+def keep_leases_alive(leases, in_flight):
+    """Renew the leases of `in_flight()` while the block runs; does nothing without a LeaseManager."""
+    return leases.keep_alive(in_flight) if leases else contextlib.nullcontext()
+
+def process_profiles_in_batches(fetcher, updater, api_key, batch_size=100, process_size=100, max_retries=1, retry_delay=60,
+                                gemini_handler=None, cache=None, preclassifier=None, token_budget=4000, chunk_delay=1,
+                                fetch_batch=None, schema=None, clusters=None, journal=None, leases=None):
+    """
+    Process profiles in batches with Gemini analysis
+
+    Each request is packed with as many profiles as fit in `token_budget`
+    estimated input tokens, up to `process_size` profiles. `fetch_batch`
+    replaces fetcher.get_unprocessed_profiles, e.g. with LeaseManager.claim.
+    `schema` selects the fields derived for each profile in that one request.
+    With a BioClusterIndex, near-duplicate bios are sent once per cluster.
+    With a ResultJournal, Gemini results are journaled before they are written.
+    With a LeaseManager, the leases on the batch being analyzed are renewed.
+    """
+    schema = schema or CLASSIFICATION_SCHEMA
+    # One handler (and therefore one genai.Client) is reused for every chunk
+    gemini_handler = gemini_handler or geminiHandler(MODEL, schema.prompt, api_key)
+    fetch_batch = fetch_batch or fetcher.get_unprocessed_profiles
+    skipped = set()
+    profiles = []
+    with keep_leases_alive(leases, lambda: [p['username'] for p in profiles]):
+        while True:
+            # Fetch unprocessed profiles, leaving out the ones given up on
+            profiles = fetch_batch(batch_size, exclude=skipped)
         
-        if not profiles:
-            print("No more unprocessed profiles found.")
-            break
+            if not profiles:
+                logger.info("No more unprocessed profiles found.")
+                break
             
-        print(f"Processing batch of {len(profiles)} profiles...")
+            logger.info("Processing batch of %d profiles...", len(profiles))
         
-        # Process profiles in smaller chunks
-        for i in range(0, len(profiles), process_size):
-            chunk = profiles[i:i + process_size]
-            retries = 0
+            # Process profiles in chunks packed up to the token budget
+            for chunk in pack_batch(profiles, token_budget, process_size, clusters):
+                # Settle obvious and unchanged profiles locally instead of paying for them again
+                local_results, chunk = resolve_locally(chunk, preclassifier, cache)
+                followers = {}
+                if clusters and chunk:
+                    clustered, chunk, followers = clusters.split(chunk)
+                    local_results += clustered
+                if local_results:
+                    summary = updater.bulk_update_profiles_analysis(local_results)
+                    logger.debug("Resolved %d profiles without Gemini", len(summary['updated']))
+                if not chunk:
+                    continue
             
-            while retries < max_retries:
-                try:
-                    # Initialize Gemini handler
-                    model = 'gemini-2.0-flash'
-                    base_prompt = '''Analyze the following profiles and respond with a JSON array where each object has:
-                    - "username": the profile's username
-                    - "is_car_profile": boolean indicating if the profile is car-related
-                    - "profile_type": either "Individual", "Company", "Car Page", or "unknown"
-                    Format the response as a JSON array without any markdown formatting.'''
-                    
-                    gemini_handler = geminiHandler(model, base_prompt, api_key)
-                    
-                    # Analyze profiles
-                    gemini_handler.update_data("profiles", json.dumps(chunk, indent=2))
-                    response = clean_gemini_response(gemini_handler.send_prompt())
-                    
-                    if "quota exceeded" in response.lower() or "rate limit" in response.lower():
-                        print(f"API limit reached. Waiting {retry_delay} seconds before retry...")
-                        time.sleep(retry_delay)
-                        retries += 1
-                        continue
-                    
-                    # Parse and process results
-                    profiles_array = json.loads(response)
-                    if not isinstance(profiles_array, list):
-                        print(f"Unexpected response format: {response}")
-                        break
-                    
-                    # Update profiles with analysis results
-                    updater.update_profiles_analysis(profiles_array)
-                    print(f"Processed {len(chunk)} profiles successfully")
-                    
-                    # Add a small delay to avoid rate limiting
-                    time.sleep(1)
-                    break  # Success, exit retry loop
-                    
-                except Exception as e:
-                    print(f"Error processing chunk: {str(e)}")
-                    print(f"Response was: {response}")
-                    retries += 1
-                    if retries < max_retries:
-                        print(f"Retrying in {retry_delay} seconds... (Attempt {retries + 1}/{max_retries})")
-                        time.sleep(retry_delay)
-                    else:
-                        print("Max retries reached for this chunk, moving to next chunk")
+                profiles_array, poisoned = analyze_chunk(gemini_handler, chunk, max_retries, retry_delay, schema=schema)
+                skipped.update(p['username'] for p in poisoned)
+                if not profiles_array:
+                    continue
+                if cache:
+                    cache.put_many(chunk, profiles_array)
+                if clusters:
+                    profiles_array += clusters.propagate(profiles_array, followers)
+                if journal:
+                    journal.record(profiles_array)
+            
+                # Update profiles with analysis results
+                summary = updater.bulk_update_profiles_analysis(profiles_array)
+                if journal:
+                    journal.confirm(summary)
+                if summary['missing'] or summary['failed']:
+                    logger.warning("Missing profiles: %s, failed updates: %s", summary['missing'], summary['failed'])
+                logger.debug("Processed %d of %d profiles successfully", len(summary['updated']), len(chunk))
+            
+                # Add a small delay to avoid rate limiting
+                time.sleep(chunk_delay)
+
+async def analyze_chunk_async(gemini_handler, governor, semaphore, chunk, max_retries=3, cache=None,
+                              preclassifier=None, poisoned=None, max_failures=2, schema=None, clusters=None,
+                              journal=None):
+    """
+    Send one chunk to Gemini under the shared rate governor.
+
+    Profiles settled by `preclassifier`, found in `cache` or belonging to an
+    analyzed cluster of `clusters` are answered locally, near-duplicates within
+    the chunk share one answer, and only the rest are sent. Responses are
+    salvaged as in analyze_chunk, and profiles given up on are added to the
+    `poisoned` set when one is passed. Results paid for are recorded in
+    `journal` before they are returned for writing.
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: Analysis results, or None if nothing was recovered.
+    """
+    schema = schema or CLASSIFICATION_SCHEMA
+    local_results, chunk = resolve_locally(chunk, preclassifier, cache)
+    followers = {}
+    if clusters and chunk:
+        clustered, chunk, followers = clusters.split(chunk)
+        local_results += clustered
+    if not chunk:
+        return local_results
+
+    salvage = ChunkSalvage(chunk, max_failures, schema)
+    errors = 0
+    while salvage.has_work():
+        item = salvage.next_item()
+        data = gemini_handler.profiles_payload(item.profiles)
+        estimated_tokens = estimate_tokens(gemini_handler.build_contents(data)) + \
+            schema.output_tokens_per_profile * len(item.profiles)
+
+        async with semaphore:
+            await governor.acquire(estimated_tokens)
+            response = await gemini_handler.send_prompt_async(data)
+
+        if is_error_response(response):
+            errors += 1
+            if is_rate_limit_response(response):
+                governor.on_rate_limited()
+                logger.warning("API limit reached, slowing down to %.0f requests/min (attempt %d/%d)",
+                               governor.requests_per_minute, errors, max_retries)
+            else:
+                logger.warning("%s (attempt %d/%d)", response, errors, max_retries)
+            if errors >= max_retries:
+                break
+            metrics.incr("gemini_retries")
+            salvage.requeue(item)
+            continue
+        governor.on_success()
+
+        found = salvage.record(item, response)
+        if found < len(item.profiles):
+            metrics.incr("partial_responses")
+            metrics.log_sampled(logger, logging.INFO, "recovered",
+                                "Recovered %d of %d results, re-queuing the rest", found, len(item.profiles))
+
+    if salvage.poisoned:
+        metrics.incr("poisoned_profiles", len(salvage.poisoned))
+        logger.warning("Giving up on profiles that keep breaking the response: %s",
+                       [p['username'] for p in salvage.poisoned])
+        if poisoned is not None:
+            poisoned.update(p['username'] for p in salvage.poisoned)
+    if cache and salvage.results:
+        cache.put_many(chunk, salvage.results)
+    copied = clusters.propagate(salvage.results, followers) if clusters else []
+    if journal:
+        journal.record(salvage.results + copied)
+    return (local_results + salvage.results + copied) or None
+
+async def process_profiles_concurrently(fetcher, updater, api_key, batch_size=400, process_size=100, concurrency=4,
+                                        requests_per_minute=60, tokens_per_minute=1_000_000, max_retries=3,
+                                        gemini_handler=None, governor=None, cache=None, preclassifier=None,
+                                        token_budget=4000, fetch_batch=None, schema=None, clusters=None,
+                                        journal=None, leases=None):
+    """
+    Process profiles with up to `concurrency` Gemini requests in flight at once.
+
+    All chunks share one geminiHandler (one client) and one RateGovernor, which
+    adapts the request rate to the rate-limit errors it sees instead of sleeping
+    for fixed intervals. Profiles that fail `max_retries` times are skipped for
+    the rest of the run so they cannot stall the loop.
+    """
+    schema = schema or CLASSIFICATION_SCHEMA
+    gemini_handler = gemini_handler or geminiHandler(MODEL, schema.prompt, api_key)
+    governor = governor or RateGovernor(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    fetch_batch = fetch_batch or fetcher.get_unprocessed_profiles
+    attempts = {}
+    skipped = set()
+    profiles = []
+
+    with keep_leases_alive(leases, lambda: [p['username'] for p in profiles]):
+        while True:
+            # Skipped rows are left out of the fetch so they cannot crowd out new work
+            profiles = await asyncio.to_thread(fetch_batch, batch_size, exclude=set(skipped))
+
+            if not profiles:
+                logger.info("No more unprocessed profiles found.")
+                break
+
+            logger.info("Processing batch of %d profiles with %d concurrent requests...", len(profiles), concurrency)
+            chunks = list(pack_batch(profiles, token_budget, process_size, clusters))
+            results = await asyncio.gather(*(
+                analyze_chunk_async(gemini_handler, governor, semaphore, chunk, max_retries, cache, preclassifier, skipped,
+                                    schema=schema, clusters=clusters, journal=journal)
+                for chunk in chunks
+            ))
+
+            for chunk, profiles_array in zip(chunks, results):
+                updated = set()
+                if profiles_array:
+                    summary = await asyncio.to_thread(updater.bulk_update_profiles_analysis, profiles_array)
+                    if journal:
+                        journal.confirm(summary)
+                    updated.update(summary['updated'])
+                    if summary['missing'] or summary['failed']:
+                        logger.warning("Missing profiles: %s, failed updates: %s", summary['missing'], summary['failed'])
+                    logger.debug("Processed %d of %d profiles successfully", len(updated), len(chunk))
+
+                for profile in chunk:
+                    username = profile['username']
+                    if username in updated:
+                        attempts.pop(username, None)
                         continue
+                    attempts[username] = attempts.get(username, 0) + 1
+                    if attempts[username] >= max_retries:
+                        skipped.add(username)
 
-def main():
+    if skipped:
+        print(f"Skipped {len(skipped)} profiles after {max_retries} failed attempts")
+    print(f"Rate governor: {governor.rate_limit_hits} rate-limit hits, "
+          f"{governor.total_wait_seconds:.1f}s spent waiting")
+
+async def run_analysis_pipeline(fetcher, updater, api_key, batch_size=400, process_size=100, concurrency=4,
+                                requests_per_minute=60, tokens_per_minute=1_000_000, max_retries=3,
+                                gemini_handler=None, governor=None, cache=None, preclassifier=None,
+                                token_budget=4000, fetch_batch=None, schema=None, clusters=None,
+                                journal=None, leases=None):
+    """
+    Run fetch, Gemini analysis and database writes as overlapped pipeline stages.
+
+    Unlike process_profiles_concurrently, the next batch is fetched and the
+    previous batch is written while the current prompts are still in flight.
+    """
+    schema = schema or CLASSIFICATION_SCHEMA
+    gemini_handler = gemini_handler or geminiHandler(MODEL, schema.prompt, api_key)
+    governor = governor or RateGovernor(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    write_results = updater.bulk_update_profiles_analysis
+    if journal:
+        write_results = lambda analysis: journal.confirm(updater.bulk_update_profiles_analysis(analysis))
+
+    pipeline = AnalysisPipeline(
+        fetch_batch=fetch_batch or fetcher.get_unprocessed_profiles,
+        analyze_chunk=lambda chunk: analyze_chunk_async(
+            gemini_handler, governor, semaphore, chunk, max_retries, cache, preclassifier, pipeline.skipped,
+            schema=schema, clusters=clusters, journal=journal
+        ),
+        write_results=write_results,
+        batch_size=batch_size,
+        chunker=lambda profiles: pack_batch(profiles, token_budget, process_size, clusters),
+        analyzers=concurrency,
+        max_attempts=max_retries,
+        renew_leases=leases.renew if leases else None,
+        renew_interval=leases.lease_seconds / 3 if leases else 200.0
+    )
+    stats = await pipeline.run()
+    print(f"Pipeline stats: {json.dumps(stats)}")
+    return stats
+
+def run_analysis(args, fetcher, updater, api_key, cache=None, preclassifier=None, fetch_batch=None, schema=None,
+                 clusters=None, journal=None, leases=None):
+    """Run the analysis loop selected by the command-line arguments"""
+    if args.pipeline:
+        asyncio.run(run_analysis_pipeline(
+            fetcher, updater, api_key,
+            batch_size=100 * args.concurrency,
+            concurrency=args.concurrency,
+            token_budget=args.token_budget,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            cache=cache,
+            preclassifier=preclassifier,
+            fetch_batch=fetch_batch,
+            schema=schema,
+            clusters=clusters,
+            journal=journal,
+            leases=leases
+        ))
+    elif args.concurrency > 1:
+        asyncio.run(process_profiles_concurrently(
+            fetcher, updater, api_key,
+            batch_size=100 * args.concurrency,
+            concurrency=args.concurrency,
+            token_budget=args.token_budget,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            cache=cache,
+            preclassifier=preclassifier,
+            fetch_batch=fetch_batch,
+            schema=schema,
+            clusters=clusters,
+            journal=journal,
+            leases=leases
+        ))
+    else:
+        process_profiles_in_batches(fetcher, updater, api_key, cache=cache, preclassifier=preclassifier,
+                                    token_budget=args.token_budget, fetch_batch=fetch_batch, schema=schema,
+                                    clusters=clusters, journal=journal, leases=leases)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze unprocessed profiles with Gemini')
+    parser.add_argument('--backend', help='Profile storage, e.g. "supabase" or "sqlite:///profiles.sqlite3" '
+                                          '(defaults to PROFILE_BACKEND, then supabase)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Gemini requests kept in flight at once (1 runs the sequential loop)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Overlap fetching, analysis and database writes in separate stages')
+    parser.add_argument('--rpm', type=int, default=60, help='Maximum Gemini requests per minute')
+    parser.add_argument('--tpm', type=int, default=1_000_000, help='Maximum Gemini tokens per minute')
+    parser.add_argument('--token-budget', type=int, default=4000,
+                        help='Estimated input tokens of profile data packed into each Gemini request')
+    parser.add_argument('--cache-path', default='analysis_cache.sqlite3',
+                        help='SQLite file caching analyses of unchanged profiles')
+    parser.add_argument('--cache-size', type=int, default=500_000, help='Maximum number of cached analyses')
+    parser.add_argument('--no-cache', action='store_true', help='Send every profile to Gemini')
+    parser.add_argument('--local-threshold', type=float, default=0.9,
+                        help='Confidence needed for the rule-based classifier to skip Gemini (0-1)')
+    parser.add_argument('--local-type-threshold', type=float, default=0.75,
+                        help='Confidence in the profile type needed to skip Gemini (0-1)')
+    parser.add_argument('--no-local', action='store_true', help='Disable the rule-based pre-classifier')
+    parser.add_argument('--dedupe-threshold', type=float, default=0.85,
+                        help='Bio similarity (0-1) at which profiles share one Gemini verdict')
+    parser.add_argument('--dedupe-min-chars', type=int, default=25,
+                        help='Bios (with name) shorter than this are never clustered')
+    parser.add_argument('--no-dedupe', action='store_true', help='Send near-duplicate bios separately')
+    parser.add_argument('--journal-path', default='analysis_journal.ndjson',
+                        help='File journaling Gemini results until they are written to the database '
+                             '(one per running process; workers.py names one per worker)')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Keep unwritten results only in memory (lost on a crash)')
+    parser.add_argument('--tags', action='store_true',
+                        help='Also derive tags from the tag vocabulary in the same Gemini request')
+    parser.add_argument('--tag-vocabulary', help='File of allowed tags (JSON array or one per line); implies --tags')
+    parser.add_argument('--max-tags', type=int, default=5, help='Maximum number of tags stored per profile')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    parser.add_argument('--log-sample', type=int, default=100,
+                        help='Log one in every N repeated per-row messages')
+    parser.add_argument('--stats-interval', type=float, default=60,
+                        help='Seconds between JSON stats lines (0 prints them only at the end)')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--claim', action='store_true',
+                        help='Lease batches before analyzing them so several workers can share the table')
+    parser.add_argument('--lease-seconds', type=int, default=600, help='How long a claim lasts without renewal; rows being analyzed are renewed')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}',
+                        help='Name recorded on claimed rows (defaults to host-pid)')
+    parser.add_argument('--shard', type=int, default=0, help='Username-hash shard handled by this worker')
+    parser.add_argument('--shards', type=int, default=1, help='Total number of shards (implies --claim when > 1)')
+    args = parser.parse_args(argv)
+
+    metrics.configure_logging(args.log_level, args.log_sample)
+    server = metrics.serve_prometheus(args.metrics_port) if args.metrics_port else None
+    try:
+        # The final stats line is printed even when the run fails or is interrupted
+        with metrics.StatsReporter(args.stats_interval):
+            run(args)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+def run(args):
+    """Analyze the unprocessed profiles as configured by main's command-line arguments"""
     # Load environment variables
     load_dotenv()
     api_key = os.getenv('GEMINI_API_KEY')
     
     # Initialize components
-    fetcher = ProfileFetcher()
-    updater = ProfileUpdater(fetcher.supabase)
+    fetcher = ProfileFetcher(create_backend(args.backend))
+    updater = ProfileUpdater(fetcher.backend)
+    schema = CLASSIFICATION_SCHEMA
+    if args.tags or args.tag_vocabulary:
+        tags = load_tag_vocabulary(args.tag_vocabulary) if args.tag_vocabulary else DEFAULT_TAGS
+        schema = AnalysisSchema(tags, args.max_tags)
+        logger.info("Deriving tags from a vocabulary of %d", len(schema.tags))
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(args.cache_path, prompt_version=prompt_version(MODEL, schema.prompt),
+                              max_entries=args.cache_size)
+    preclassifier = None
+    # Rule-based verdicts carry no tags, so every profile goes to the model when tagging
+    if not args.no_local and not schema.tagging:
+        preclassifier = RuleBasedClassifier(threshold=args.local_threshold,
+                                            type_threshold=args.local_type_threshold)
+    
+    clusters = None
+    if not args.no_dedupe:
+        clusters = BioClusterIndex(args.dedupe_threshold, min_chars=args.dedupe_min_chars)
+    
+    journal = None
+    if not args.no_journal:
+        journal = ResultJournal(args.journal_path)
+        # Results paid for by an earlier run that crashed before writing them
+        replayed = journal.replay(updater.bulk_update_profiles_analysis)
+        if replayed:
+            print(f"Replayed {replayed} journaled results from {args.journal_path}")
+    
+    leases, fetch_batch = None, None
+    if args.claim or args.shards > 1:
+        leases = LeaseManager(fetcher, args.worker_id, args.lease_seconds, args.shard, args.shards)
+        fetch_batch = leases.claim
+        logger.info("Worker %s claiming shard %d of %d", args.worker_id, args.shard, args.shards)
     
     # Process profiles in batches
-    process_profiles_in_batches(fetcher, updater, api_key)
+    try:
+        run_analysis(args, fetcher, updater, api_key, cache, preclassifier, fetch_batch, schema, clusters, journal,
+                     leases)
+    finally:
+        if leases:
+            logger.info("Released %d unfinished claims", leases.release())
+        if journal:
+            journal.close()
     
+    if preclassifier:
+        print(f"Rule-based classifier: {json.dumps(preclassifier.report())}")
+    if clusters:
+        print(f"Bio clusters: {json.dumps(clusters.report())}")
+    if journal:
+        print(f"Result journal: {json.dumps(journal.stats())}")
+    if cache:
+        print(f"Analysis cache: {json.dumps(cache.stats())}")
+        cache.close()
     print("Analysis completed and database updated")
 
 if __name__ == "__main__":
@@ -1,8 +1,19 @@
+import json
+import logging
 from datetime import datetime
 
+import metrics
+
+logger = logging.getLogger(__name__)
+
 class ProfileUpdater:
-    def __init__(self, supabase_client):
-        self.supabase = supabase_client
+    def __init__(self, backend, query_cache=None):
+        """Wrap a storage backend: a ProfileBackend or the Supabase client itself"""
+        self.backend = backend
+        # Kept under its original name for existing callers
+        self.supabase = backend
+        # ProfileFetcher's QueryCache, if any; every write drops the entries it affects
+        self.query_cache = query_cache
 
     def update_profiles_analysis(self, analyzed_profiles):
         """Update multiple profiles with analysis results"""
@@ -12,6 +23,110 @@ class ProfileUpdater:
             results.append(result)
         return results
 
+    def bulk_update_profiles_analysis(self, analyzed_profiles, chunk_size=500):
+        """
+        Update many profiles with analysis results in a few bulk calls.
+
+        Rows are matched on username, so no id lookup is needed first. Profiles
+        that share the same analysis values are written together with one
+        update filtered by `username in (...)`, which turns a chunk into one
+        request per distinct verdict instead of two requests per profile.
+        Every derived field (classification and, when present, tags) goes out
+        in the same write. When most results differ, as with per-profile tag
+        sets, each batch is instead written with one upsert on username that
+        carries every row's own values.
+
+        Args:
+            analyzed_profiles (List[Dict[str, Any]]): Analysis results, each with a 'username'.
+            chunk_size (int): Maximum number of usernames sent in a single update call.
+
+        Returns:
+            Dict[str, List[str]]: Usernames that were 'updated', 'missing' from the
+                                  table, or 'failed' because the write raised or
+                                  the result was malformed. 'malformed' repeats the
+                                  failures that retrying cannot fix.
+        """
+        summary = {'updated': [], 'missing': [], 'failed': [], 'malformed': []}
+
+        # Last result wins if the same username appears more than once
+        latest, malformed = {}, {}
+        for profile_analysis in analyzed_profiles:
+            username = profile_analysis.get('username') if isinstance(profile_analysis, dict) else None
+            if not username:
+                logger.warning("Skipping analysis result without username: %s", profile_analysis)
+                continue
+            try:
+                latest[username] = self._coerce_analysis(profile_analysis)
+                malformed.pop(username, None)
+            except ValueError as e:
+                # One malformed result fails its own row, not the whole batch
+                logger.warning("Skipping malformed analysis for %s: %s", username, e)
+                latest.pop(username, None)
+                malformed[username] = True
+        summary['failed'].extend(malformed)
+        summary['malformed'].extend(malformed)
+
+        groups = {}
+        for username, update_data in latest.items():
+            key = json.dumps(update_data, sort_keys=True)
+            groups.setdefault(key, (update_data, []))[1].append(username)
+
+        # An upsert batch costs two requests (existence check and write); use it when that is fewer
+        if len(groups) > 2 * -(-len(latest) // chunk_size):
+            self._bulk_upsert_rows(latest, chunk_size, summary)
+            groups = {}
+
+        for update_data, usernames in groups.values():
+            update_data = dict(update_data, last_updated=datetime.now().isoformat())
+            for i in range(0, len(usernames), chunk_size):
+                batch = usernames[i:i + chunk_size]
+                try:
+                    updated = self._execute_bulk_update(batch, update_data)
+                except Exception as update_error:
+                    logger.error("Bulk update error for %d profiles: %s", len(batch), update_error)
+                    summary['failed'].extend(batch)
+                    continue
+                finally:
+                    # A failed call may still have been applied server-side
+                    self._invalidate(batch, update_data)
+                for username in batch:
+                    if username in updated:
+                        summary['updated'].append(username)
+                    else:
+                        summary['missing'].append(username)
+
+        metrics.incr('rows_updated', len(summary['updated']))
+        metrics.incr('rows_missing', len(summary['missing']))
+        metrics.incr('rows_failed', len(summary['failed']))
+        return summary
+
+    def upsert_profiles(self, profiles, on_conflict='username', chunk_size=500, keep_ids=False):
+        """
+        Insert or update whole profile rows in bulk, e.g. when importing a snapshot.
+
+        Args:
+            profiles (Iterable[Dict[str, Any]]): Profile rows; may be a generator.
+            on_conflict (str): Column that identifies an existing row.
+            chunk_size (int): Rows sent per upsert call.
+            keep_ids (bool): Keep the 'id' of each row instead of letting the target assign one.
+
+        Returns:
+            int: Number of rows written.
+        """
+        written, batch = 0, []
+        for profile in profiles:
+            row = dict(profile) if keep_ids else {k: v for k, v in profile.items() if k != 'id'}
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                written += self._execute_upsert(batch, on_conflict)
+                batch = []
+        if batch:
+            written += self._execute_upsert(batch, on_conflict)
+        if self.query_cache:
+            # New rows can show up in any cached query
+            self.query_cache.clear()
+        return written
+
     def update_single_profile(self, profile_analysis):
         """Update a single profile with analysis results"""
         username = profile_analysis['username']
@@ -19,7 +134,9 @@ class ProfileUpdater:
         try:
             profile = self._get_profile_by_username(username)
             if not profile:
-                print(f"Profile not found for username: {username}")
+                metrics.incr('rows_missing')
+                metrics.log_sampled(logger, logging.WARNING, 'not_found',
+                                    "Profile not found for username: %s", username)
                 return False
 
             update_data = self._prepare_update_data(profile['id'], profile_analysis)
@@ -27,8 +144,8 @@ class ProfileUpdater:
             return success
 
         except Exception as e:
-            print(f"Error processing profile {username}: {str(e)}")
-            print(f"Full error details: {repr(e)}")
+            metrics.incr('rows_failed')
+            logger.error("Error processing profile %s: %r", username, e)
             return False
 
     def verify_updates(self, usernames):
@@ -36,7 +153,7 @@ class ProfileUpdater:
         print("\nVerifying final state:")
         for username in usernames:
             try:
-                result = self.supabase.table('profiles')\
+                result = self.backend.table('profiles')\
                     .select('username, is_car_profile, profile_type')\
                     .eq('username', username)\
                     .execute()
@@ -46,7 +163,7 @@ class ProfileUpdater:
 
     def _get_profile_by_username(self, username):
         """Get profile data by username"""
-        result = self.supabase.table('profiles')\
+        result = self.backend.table('profiles')\
             .select('id, username')\
             .eq('username', username)\
             .single()\
@@ -55,40 +172,129 @@ class ProfileUpdater:
 
     def _prepare_update_data(self, profile_id, profile_analysis):
         """Prepare update data with proper type casting"""
+        update_data = {'id': profile_id}
+        update_data.update(self._coerce_analysis(profile_analysis))
+        update_data['last_updated'] = datetime.now().isoformat()
+        return update_data
+
+    def _coerce_analysis(self, profile_analysis):
+        """Cast the analysis fields to the column types stored in the table; ValueError if they cannot be"""
         is_car = profile_analysis.get('is_car_profile', False)
         if isinstance(is_car, str):
             is_car = is_car.lower() == 'true'
+        elif not isinstance(is_car, (bool, int)) and is_car is not None:
+            raise ValueError(f"is_car_profile is not a boolean: {is_car!r}")
             
         profile_type = profile_analysis.get('profile_type', 'unknown')
+        if not isinstance(profile_type, str):
+            profile_type = 'unknown'
         if profile_type:
             profile_type = profile_type.lower()
         valid_types = ['individual', 'company', 'car page', 'unknown']
         if not profile_type or profile_type.lower() not in valid_types:
             profile_type = 'unknown'
             
-        return {
-            'id': profile_id,
+        coerced = {
             'is_car_profile': bool(is_car),
-            'profile_type': str(profile_type).lower(),
-            'last_updated': datetime.now().isoformat()
+            'profile_type': str(profile_type).lower()
         }
+        tags = profile_analysis.get('tags')
+        if tags is not None and not isinstance(tags, (list, tuple)):
+            raise ValueError(f"tags is not a list: {tags!r}")
+        if tags is not None:
+            # Sorted so profiles with the same tag set share one bulk update
+            coerced['tags'] = sorted({str(tag) for tag in tags})
+        return coerced
 
     def _execute_update(self, username, update_data):
         """Execute the update operation"""
         try:
-            result = self.supabase.table('profiles')\
-                .update(update_data)\
-                .eq('id', update_data['id'])\
-                .execute()
+            with metrics.timer('db_write'):
+                result = self.backend.table('profiles')\
+                    .update(update_data)\
+                    .eq('id', update_data['id'])\
+                    .execute()
+            self._invalidate([username], update_data)
             
             if result.data:
-                print(f"Successfully updated {username}")
+                metrics.incr('rows_updated')
+                metrics.log_sampled(logger, logging.DEBUG, 'updated', "Successfully updated %s", username)
                 return True
             else:
-                print(f"Update failed for {username} - Response: {result}")
+                metrics.incr('rows_missing')
+                logger.warning("Update failed for %s - Response: %s", username, result)
                 return False
                 
         except Exception as update_error:
-            print(f"Update error for {username}: {str(update_error)}")
-            print(f"Error type: {type(update_error)}")
-            return False
\ No newline at end of file
+            metrics.incr('rows_failed')
+            logger.error("Update error for %s: %r", username, update_error)
+            return False
+
+    def _execute_bulk_update(self, usernames, update_data):
+        """Apply the same update to every username and return the ones that matched a row"""
+        with metrics.timer('db_write'):
+            result = self.backend.table('profiles')\
+                .update(update_data)\
+                .in_('username', usernames)\
+                .execute()
+        return {row.get('username') for row in (result.data or [])}
+
+    def _bulk_upsert_rows(self, latest, chunk_size, summary):
+        """Write rows with differing values, one upsert per batch, recording the outcome in `summary`"""
+        last_updated = datetime.now().isoformat()
+        # A bulk upsert writes every column any of its rows has, as NULL where a row lacks it,
+        # so rows are batched by column set: an untagged result must not erase stored tags
+        by_columns = {}
+        for username, update_data in latest.items():
+            by_columns.setdefault(tuple(sorted(update_data)), []).append(username)
+        batches = [usernames[i:i + chunk_size]
+                   for usernames in by_columns.values() for i in range(0, len(usernames), chunk_size)]
+        for batch in batches:
+            rows = [dict(latest[username], username=username, last_updated=last_updated) for username in batch]
+            try:
+                updated, missing = self._execute_bulk_upsert(rows)
+            except Exception as update_error:
+                logger.error("Bulk upsert error for %d profiles: %s", len(batch), update_error)
+                summary['failed'].extend(batch)
+                continue
+            finally:
+                self._invalidate(batch, {column for row in rows for column in row})
+            summary['updated'].extend(u for u in batch if u in updated)
+            summary['missing'].extend(u for u in batch if u not in updated)
+
+    def _execute_bulk_upsert(self, rows):
+        """
+        Upsert rows on username without creating any: only usernames already in the table are sent.
+
+        Returns the usernames written and those missing from the table.
+        """
+        usernames = [row['username'] for row in rows]
+        with metrics.timer('db_write'):
+            result = self.backend.table('profiles')\
+                .select('username')\
+                .in_('username', usernames)\
+                .execute()
+            existing = {row.get('username') for row in (result.data or [])}
+            rows = [row for row in rows if row['username'] in existing]
+            if not rows:
+                return set(), set(usernames)
+            result = self.backend.table('profiles')\
+                .upsert(rows, on_conflict='username')\
+                .execute()
+        updated = {row.get('username') for row in (result.data or [])}
+        return updated, set(usernames) - updated
+
+    def _invalidate(self, usernames, columns):
+        """Drop cached query results that writing `columns` (names or an update dict) to `usernames` may have changed"""
+        if self.query_cache:
+            self.query_cache.invalidate(usernames, list(columns))
+
+    def _execute_upsert(self, rows, on_conflict):
+        """Upsert one batch of rows and return how many the backend reports written"""
+        with metrics.timer('db_write'):
+            result = self.backend.table('profiles')\
+                .upsert(rows, on_conflict=on_conflict)\
+                .execute()
+        written = len(result.data or [])
+        metrics.incr('rows_upserted', written)
+        return written
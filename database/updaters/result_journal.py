@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_exclusively(path: str):
+    """Open `path` and hold an exclusive lock on it; the OS releases it when the process exits."""
+    handle = open(path, "a")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise
+    return handle
+
+
+class ResultJournal:
+    """
+    Append-only, fsync'd NDJSON journal of analysis results awaiting their database write.
+
+    Results are recorded as soon as they are parsed from a Gemini response, and
+    confirmed once a bulk update reports them written (or their row gone). A
+    crash, Ctrl-C or failed write therefore leaves the paid-for results in the
+    journal instead of losing them, and `replay` pushes them through the
+    updater on the next start.
+
+    Each line is either {"result": {...}} or {"done": [usernames]}. A line cut
+    short by a crash is ignored on load. Once `compact_every` lines have been
+    appended, the file is rewritten with just the pending results. Results the
+    updater rejects as malformed would fail on every replay, so they are moved
+    to "<path>.rejected" for inspection instead of staying pending.
+
+    A journal belongs to one process: it holds a lock on "<path>.lock", and a
+    second process opening the same path gets a RuntimeError instead of
+    compacting away the first one's pending results.
+    """
+
+    def __init__(self, path: str = "analysis_journal.ndjson", compact_every: int = 10_000, fsync: bool = True):
+        """
+        Args:
+            path (str): NDJSON file holding the journal; created if missing. Must not
+                        be shared with another running process.
+            compact_every (int): Appended lines after which confirmed entries are dropped from the file.
+            fsync (bool): Flush every append to disk before returning; disable only for tests and benchmarks.
+        """
+        if compact_every <= 0:
+            raise ValueError("compact_every must be positive")
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.recorded = 0
+        self.confirmed = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.compactions = 0
+
+        try:
+            self._lock_handle = _lock_exclusively(path + ".lock")
+        except OSError:
+            raise RuntimeError(f"Journal {path} is in use by another process; "
+                               f"give each worker its own journal path") from None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lines = self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._lines:
+            # Start from a clean file, so nothing is appended to a line torn by a crash
+            self._compact()
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Results recorded but not yet confirmed written."""
+        with self._lock:
+            return list(self._pending.values())
+
+    def record(self, results: Iterable[Dict[str, Any]]):
+        """Durably append analysis results before they are sent to the database."""
+        results = [result for result in results if isinstance(result, dict) and result.get('username')]
+        if not results:
+            return
+        with self._lock:
+            self._append([{'result': result} for result in results])
+            for result in results:
+                self._pending[result['username']] = result
+        self.recorded += len(results)
+        metrics.incr('journal_recorded', len(results))
+
+    def confirm(self, summary: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """
+        Mark the usernames a bulk update reported 'updated' or 'missing' as done.
+
+        'malformed' usernames are moved to the rejected file and also marked done;
+        the other 'failed' usernames stay pending so the next replay retries them.
+
+        Returns:
+            Dict[str, List[str]]: `summary`, unchanged, so a writer can be wrapped as
+                                  journal.confirm(write(results)).
+        """
+        with self._lock:
+            rejected = [self._pending[u] for u in summary.get('malformed', ()) if u in self._pending]
+            if rejected:
+                # Saved before the done line, so a crash in between only repeats them
+                self._reject(rejected)
+            done = [u for u in summary['updated'] + summary['missing'] if u in self._pending]
+            done += [result['username'] for result in rejected]
+            if done:
+                self._append([{'done': done}])
+                for username in done:
+                    del self._pending[username]
+                self.confirmed += len(done)
+                if self._lines >= self.compact_every:
+                    self._compact()
+        metrics.incr('journal_confirmed', len(done))
+        return summary
+
+    def replay(self, write_results: Callable[[List[Dict[str, Any]]], Dict[str, List[str]]],
+               chunk_size: int = 500) -> int:
+        """
+        Push results left over by an earlier run through `write_results`.
+
+        Args:
+            write_results (Callable): Bulk writer such as ProfileUpdater.bulk_update_profiles_analysis.
+            chunk_size (int): Results sent per call.
+
+        Returns:
+            int: Number of results confirmed written; those that fail again stay pending.
+        """
+        pending = self.pending()
+        if not pending:
+            return 0
+        logger.info("Replaying %d journaled results from %s", len(pending), self.path)
+        written = 0
+        for i in range(0, len(pending), chunk_size):
+            summary = self.confirm(write_results(pending[i:i + chunk_size]))
+            written += len(summary['updated'])
+            if summary['failed']:
+                logger.warning("%d journaled results still failed to write", len(summary['failed']))
+        self.replayed += written
+        metrics.incr('journal_replayed', written)
+        with self._lock:
+            self._compact()
+        return written
+
+    def close(self):
+        """Drop confirmed entries from the file and close it."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._compact()
+            self._file.close()
+            self._lock_handle.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'confirmed': self.confirmed,
+            'replayed': self.replayed,
+            'rejected': self.rejected,
+            'compactions': self.compactions,
+        }
+
+    def _load(self) -> int:
+        """Rebuild the pending results from the file and return its number of lines."""
+        if not os.path.exists(self.path):
+            return 0
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Ignoring torn journal line %d in %s", lines, self.path)
+                    continue
+                if 'result' in entry:
+                    self._pending[entry['result']['username']] = entry['result']
+                for username in entry.get('done', ()):
+                    self._pending.pop(username, None)
+        return lines
+
+    def _reject(self, results):
+        logger.warning("Moving %d malformed results to %s.rejected", len(results), self.path)
+        with open(self.path + ".rejected", "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.rejected += len(results)
+        metrics.incr('journal_rejected', len(results))
+
+    def _append(self, entries):
+        self._file.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._file.flush()
+        if self.fsync:
+            with metrics.timer('journal_fsync'):
+                os.fsync(self._file.fileno())
+        self._lines += len(entries)
+
+    def _compact(self):
+        """Rewrite the file with only the pending results; the swap is atomic, so a crash keeps one version."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps({'result': result}, ensure_ascii=False) + "\n"
+                         for result in self._pending.values())
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lines = len(self._pending)
+        self.compactions += 1
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Start and supervise a pool of analysis workers that share the profiles table.
+
+Each worker is a separate process running test.py's main() in lease mode:
+it claims batches of unprocessed profiles (see leases.LeaseManager), so no
+profile is sent to Gemini by two workers at once. Workers that exit with an
+error are restarted, and rows a crashed worker was holding are picked up by
+the others once their lease expires. Every worker keeps its own result
+journal, named after its worker id.
+
+Options this script does not know are passed through to every worker, e.g.
+
+    python workers.py --workers 4 -- --pipeline --concurrency 4 --rpm 30
+
+To spread the table over several hosts, give every host the same
+--total-shards and a different --first-shard:
+
+    host A: python workers.py --workers 4 --total-shards 8 --first-shard 0
+    host B: python workers.py --workers 4 --total-shards 8 --first-shard 4
+
+On Supabase the lease columns have to exist first:
+
+    ALTER TABLE profiles ADD COLUMN IF NOT EXISTS claimed_by text;
+    ALTER TABLE profiles ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz;
+    CREATE INDEX IF NOT EXISTS idx_profiles_lease ON profiles (is_car_profile, lease_expires_at);
+
+The SQLite backend adds them automatically.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from typing import List
+
+import metrics
+
+logger = logging.getLogger("workers")
+
+
+def _run_worker(argv: List[str]):
+    import test as analysis
+    analysis.main(argv)
+
+
+def worker_journal_path(passthrough: List[str], worker_id: str) -> str:
+    """Result journal of one worker: the --journal-path passed through (or test.py's default) plus its id."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--journal-path', default='analysis_journal.ndjson')
+    root, ext = os.path.splitext(parser.parse_known_args(passthrough)[0].journal_path)
+    return f'{root}.{worker_id}{ext}'
+
+
+def worker_argv(args, index: int, passthrough: List[str]) -> List[str]:
+    """Command line for worker `index`: its shard, worker id, journal and optional metrics port."""
+    shards = args.total_shards or args.workers
+    worker_id = f'{socket.gethostname()}-w{args.first_shard + index}'
+    argv = list(passthrough) + ['--claim', '--lease-seconds', str(args.lease_seconds),
+                                '--worker-id', worker_id, '--log-level', args.log_level]
+    # The id is stable across restarts, so a restarted worker replays its own journal
+    if '--no-journal' not in passthrough:
+        argv += ['--journal-path', worker_journal_path(passthrough, worker_id)]
+    if not args.no_shard:
+        argv += ['--shard', str(args.first_shard + index), '--shards', str(shards)]
+    if args.metrics_port:
+        argv += ['--metrics-port', str(args.metrics_port + index)]
+    return argv
+
+
+def supervise(args, passthrough: List[str]) -> int:
+    """
+    Run the worker pool until every worker has finished.
+
+    Returns:
+        int: Number of workers that gave up after exhausting their restarts.
+    """
+    context = multiprocessing.get_context("spawn")
+    argvs = [worker_argv(args, i, passthrough) for i in range(args.workers)]
+    restarts = [0] * args.workers
+    processes = {}
+
+    def start(index):
+        process = context.Process(target=_run_worker, args=(argvs[index],), name=f"worker-{index}")
+        process.start()
+        processes[index] = process
+        logger.info("Started worker %d (pid %d): %s", index, process.pid, " ".join(argvs[index]))
+
+    for index in range(args.workers):
+        start(index)
+
+    failed = 0
+    try:
+        while processes:
+            time.sleep(args.poll_interval)
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[index]
+                if process.exitcode == 0:
+                    logger.info("Worker %d finished", index)
+                elif restarts[index] < args.max_restarts:
+                    restarts[index] += 1
+                    logger.warning("Worker %d exited with code %s, restarting (%d/%d)",
+                                   index, process.exitcode, restarts[index], args.max_restarts)
+                    start(index)
+                else:
+                    failed += 1
+                    logger.error("Worker %d exited with code %s, giving up after %d restarts",
+                                 index, process.exitcode, args.max_restarts)
+    except KeyboardInterrupt:
+        # Workers get the same Ctrl-C and release their claims on the way out
+        logger.info("Stopping %d workers...", len(processes))
+        for process in processes.values():
+            process.join(args.shutdown_timeout)
+            if process.is_alive():
+                process.terminate()
+        raise
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run several analysis workers that share the profiles table',
+                                     epilog='Unrecognized options are passed through to each worker (see test.py --help)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Worker processes to run on this host')
+    parser.add_argument('--total-shards', type=int,
+                        help='Shards across all hosts (defaults to --workers, i.e. a single host)')
+    parser.add_argument('--first-shard', type=int, default=0, help='Shard handled by this host\'s first worker')
+    parser.add_argument('--no-shard', action='store_true',
+                        help='Let every worker claim from the whole table and rely on leases alone')
+    parser.add_argument('--lease-seconds', type=int, default=600, help='How long a claim lasts without renewal; rows being analyzed are renewed')
+    parser.add_argument('--max-restarts', type=int, default=3, help='Restarts allowed per crashing worker')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between health checks')
+    parser.add_argument('--shutdown-timeout', type=float, default=30.0,
+                        help='Seconds to wait for workers to release their claims on Ctrl-C')
+    parser.add_argument('--metrics-port', type=int,
+                        help='First Prometheus port; worker N serves on PORT + N')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    args, passthrough = parser.parse_known_args()
+    if passthrough and passthrough[0] == '--':
+        passthrough = passthrough[1:]
+
+    metrics.configure_logging(args.log_level)
+    shards = args.total_shards or args.workers
+    if not args.no_shard and args.first_shard + args.workers > shards:
+        parser.error(f"Shards {args.first_shard}-{args.first_shard + args.workers - 1} "
+                     f"do not fit in --total-shards {shards}")
+
+    failed = supervise(args, passthrough)
+    if failed:
+        raise SystemExit(f"{failed} worker(s) failed")
+    print("All workers finished")
+
+
+if __name__ == "__main__":
+    main()
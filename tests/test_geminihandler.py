@@ -0,0 +1,27 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.gemini.geminihandler import ERROR_PREFIX, is_rate_limit_response
+
+
+def test_successful_response_mentioning_429_is_not_a_rate_limit():
+    response = '[{"username": "garage429", "is_car_profile": true, "profile_type": "company"}]'
+    assert not is_rate_limit_response(response)
+
+
+@pytest.mark.parametrize("message", [
+    "429 RESOURCE_EXHAUSTED. Quota exceeded for metric generate_content_requests",
+    "Rate limit reached, retry later",
+    "HTTP 429",
+])
+def test_rate_limit_errors_are_detected(message):
+    assert is_rate_limit_response(ERROR_PREFIX + message)
+
+
+def test_error_echoing_a_username_with_429_is_not_a_rate_limit():
+    assert not is_rate_limit_response(ERROR_PREFIX + "400 INVALID_ARGUMENT: bad profile garage429")
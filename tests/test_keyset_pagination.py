@@ -0,0 +1,85 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database.profile_fetcher import ProfileFetcher
+
+
+def make_fetcher(timestamps):
+    backend = SQLiteBackend(":memory:")
+    backend.seed({"username": f"user_{i:03d}", "created_at": created_at} for i, created_at in enumerate(timestamps))
+    return ProfileFetcher(backend)
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_rows_sharing_one_timestamp_are_each_returned_once(descending, prefetch):
+    fetcher = make_fetcher(["2025-02-27T10:00:00+00:00"] * 25)
+
+    rows = list(fetcher.iter_profiles(page_size=4, descending=descending, prefetch=prefetch))
+
+    usernames = [row["username"] for row in rows]
+    assert len(usernames) == 25
+    assert set(usernames) == {f"user_{i:03d}" for i in range(25)}
+
+
+def test_timestamp_ties_across_page_boundaries_keep_date_order():
+    # Groups of three share a timestamp, so most pages end in the middle of a group
+    timestamps = [f"2025-02-27T10:00:{i // 3:02d}+00:00" for i in range(20)]
+    fetcher = make_fetcher(timestamps)
+
+    rows = list(fetcher.iter_profiles(page_size=4))
+
+    assert sorted(row["username"] for row in rows) == [f"user_{i:03d}" for i in range(20)]
+    dates = [row["created_at"] for row in rows]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_before_date_bound_applies_to_tied_rows():
+    fetcher = make_fetcher(["2025-02-27T10:00:00+00:00"] * 5 + ["2025-02-27T11:00:00+00:00"] * 5)
+
+    rows = list(fetcher.iter_profiles(page_size=2, before_date="2025-02-27T10:30:00+00:00"))
+
+    assert sorted(row["username"] for row in rows) == [f"user_{i:03d}" for i in range(5)]
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_include_undated_returns_rows_without_a_date(descending, prefetch):
+    fetcher = make_fetcher([None, "2025-02-27T10:00:00+00:00", None, "2025-02-27T11:00:00+00:00", None] * 3)
+
+    rows = list(fetcher.iter_profiles(page_size=4, descending=descending, prefetch=prefetch, include_undated=True))
+
+    assert sorted(row["username"] for row in rows) == [f"user_{i:03d}" for i in range(15)]
+    undated = [row["created_at"] is None for row in rows]
+    # Undated rows sort before every date
+    assert undated == sorted(undated, reverse=not descending)
+    assert len(list(fetcher.iter_profiles(page_size=4, descending=descending))) == 6
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_include_undated_resumes_from_any_cursor(descending):
+    fetcher = make_fetcher([None, "2025-02-27T10:00:00+00:00", None, "2025-02-27T11:00:00+00:00", None] * 3)
+    columns = ["id", "username", "created_at"]
+    rows = list(fetcher.iter_profiles(columns, page_size=4, descending=descending, include_undated=True))
+
+    for i, row in enumerate(rows):
+        cursor = (row["created_at"], row["id"])
+        rest = fetcher.iter_profiles(columns, page_size=4, descending=descending, start_after=cursor,
+                                     include_undated=True)
+        assert [r["username"] for r in rest] == [r["username"] for r in rows[i + 1:]]
+
+
+def test_export_includes_rows_without_created_at(tmp_path):
+    from database import profile_io
+
+    fetcher = make_fetcher([None, "2025-02-27T10:00:00+00:00"] * 5)
+    path = str(tmp_path / "profiles.ndjson")
+
+    assert profile_io.export_profiles(fetcher, path, columns=["username"], page_size=3) == 10
+    assert sorted(row["username"] for row in profile_io.read_profiles(path)) == [f"user_{i:03d}" for i in range(10)]
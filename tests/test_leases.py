@@ -0,0 +1,80 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import asyncio
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database.leases import LeaseManager
+from database.pipeline import AnalysisPipeline
+from database.profile_fetcher import ProfileFetcher
+
+
+@pytest.fixture
+def fetcher():
+    backend = SQLiteBackend(":memory:")
+    backend.seed({"username": f"user_{i:02d}", "created_at": f"2025-02-27T10:00:{i:02d}+00:00"} for i in range(10))
+    return ProfileFetcher(backend)
+
+
+def lease_rows(fetcher):
+    rows = fetcher.backend.table("profiles").select("username,claimed_by,lease_expires_at").execute().data
+    return {row["username"]: row for row in rows}
+
+
+def test_claim_leases_only_rows_outside_exclude(fetcher):
+    leases = LeaseManager(fetcher, "worker-a")
+    first = leases.claim(3)
+
+    second = leases.claim(3, exclude=[p["username"] for p in first])
+
+    assert not {p["username"] for p in first} & {p["username"] for p in second}
+    claimed = [u for u, row in lease_rows(fetcher).items() if row["claimed_by"] == "worker-a"]
+    assert len(claimed) == 6
+
+
+def test_renew_extends_only_this_workers_unprocessed_rows(fetcher):
+    leases = LeaseManager(fetcher, "worker-a", lease_seconds=60)
+    claimed = [p["username"] for p in leases.claim(2)]
+    LeaseManager(fetcher, "worker-b").claim(2, exclude=claimed)
+    before = lease_rows(fetcher)
+
+    leases.lease_seconds = 3600
+    assert leases.renew(list(before)) == 2
+
+    after = lease_rows(fetcher)
+    for username, row in after.items():
+        if username in claimed:
+            assert row["lease_expires_at"] > before[username]["lease_expires_at"]
+        else:
+            assert row["lease_expires_at"] == before[username]["lease_expires_at"]
+
+
+def test_pipeline_claims_each_row_once_and_renews_in_flight_rows(fetcher):
+    leases = LeaseManager(fetcher, "worker-a")
+    claimed, renewed = [], []
+
+    def claim(limit, exclude=()):
+        profiles = leases.claim(limit, exclude)
+        claimed.extend(p["username"] for p in profiles)
+        return profiles
+
+    async def analyze(chunk):
+        await asyncio.sleep(0.05)
+        return [{"username": p["username"], "is_car_profile": False, "profile_type": "individual"} for p in chunk]
+
+    def write(results):
+        # Nothing gets written, so every row stays unprocessed and is given up on after one attempt
+        return {"updated": [], "missing": [], "failed": [r["username"] for r in results], "malformed": []}
+
+    pipeline = AnalysisPipeline(fetch_batch=claim, analyze_chunk=analyze, write_results=write,
+                                batch_size=2, process_size=2, analyzers=1, max_attempts=1,
+                                renew_leases=renewed.append, renew_interval=0.01)
+    asyncio.run(pipeline.run())
+
+    assert sorted(claimed) == [f"user_{i:02d}" for i in range(10)]
+    assert renewed and all(renewed)
@@ -0,0 +1,19 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.preclassifier import RuleBasedClassifier
+
+
+@pytest.mark.parametrize("username", ["oscar_smith", "carol.jones", "scarlett99", "autumn_rose", "mtint"])
+def test_car_words_inside_other_words_give_no_username_score(username):
+    assert RuleBasedClassifier().score({"username": username}) == (None, 0.0)
+
+
+@pytest.mark.parametrize("username", ["jdm_garage", "cars4life", "m3_daily", "mike.detailing", "Tuning.Co"])
+def test_car_words_between_separators_score_the_username(username):
+    assert RuleBasedClassifier().score({"username": username}) == (True, 0.6)
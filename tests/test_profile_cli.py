@@ -0,0 +1,41 @@
+import sys
+import os
+import json
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database import profile_cli
+
+
+@pytest.fixture
+def run_cli(tmp_path, monkeypatch, capsys):
+    backend = SQLiteBackend(str(tmp_path / "profiles.sqlite3"))
+    backend.seed([
+        {"username": "dated", "created_at": "2025-02-27T10:00:00+00:00", "is_verified": True},
+        {"username": "undated", "created_at": None, "is_verified": True},
+    ])
+
+    monkeypatch.setattr(profile_cli, "create_backend", lambda url: backend)
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["profile_cli.py", "--format", "ndjson", "--columns", "username", *args])
+        profile_cli.main()
+        return [json.loads(line)["username"] for line in capsys.readouterr().out.splitlines()]
+
+    return run
+
+
+def test_username_lookup_finds_a_profile_without_created_at(run_cli):
+    assert run_cli("--username", "undated") == ["undated"]
+
+
+def test_filters_return_profiles_without_created_at_after_dated_ones(run_cli):
+    assert run_cli("--verified-only", "--page-size", "1") == ["dated", "undated"]
+
+
+def test_date_bounds_exclude_profiles_without_created_at(run_cli):
+    assert run_cli("--after-date", "2025-01-01") == ["dated"]
@@ -1,10 +1,12 @@
 import sys
 import os
-# Add project root to Python path
+# Add project root (and the database package, whose modules import each other directly) to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
 
 from database.profile_fetcher import ProfileFetcher
 from datetime import datetime
+from itertools import islice
 import json
 
 def main():
@@ -16,46 +18,27 @@ def main():
         # Initialize the ProfileFetcher
         fetcher = ProfileFetcher()
         
-        all_profiles = []
-        last_timestamp = "2025-02-27T10:08:38.952694+00:00"  # Start from the most recent date
-        seen_usernames = set()  # Track unique usernames
+        # Keyset pagination on (created_at, id) never repeats a row, so no dedup is needed
+        profiles = fetcher.iter_profiles(
+            date_column="created_at",
+            before_date="2025-02-27T10:08:38.952694+00:00",  # Start from the most recent date
+            page_size=BATCH_SIZE,
+            prefetch=True
+        )
         
-        while len(all_profiles) < TOTAL_PROFILES:
-            # Fetch next batch
-            batch = fetcher.get_profiles(
-                date_column="created_at",
-                before_date=last_timestamp,  # Changed to before_date to get older profiles
-                limit=BATCH_SIZE
-            )
-            
-            if not batch:
-                print("No more profiles available")
-                break
-            
-            # Filter out duplicates and add new profiles
-            for profile in batch:
-                if profile["username"] not in seen_usernames:
-                    seen_usernames.add(profile["username"])
-                    all_profiles.append(profile)
-                    
-            # Update the timestamp for the next iteration using the oldest profile in the batch
-            last_timestamp = batch[-1]["created_at"]
-            
-            print(f"Fetched batch. Total unique profiles so far: {len(all_profiles)}")
-            
-            # Break if we've collected enough unique profiles
-            if len(all_profiles) >= TOTAL_PROFILES:
-                break
-        
-        # Trim to exact number if we got more than we needed
-        all_profiles = all_profiles[:TOTAL_PROFILES]
-        
-        # Save all profiles to a JSON file
+        # Stream profiles into a JSON array file page by page instead of holding them all
+        # (database/profile_io.py exports whole tables to NDJSON or columnar files)
         output_file = "all_profiles.json"
+        count = 0
         with open(output_file, 'w') as f:
-            json.dump(all_profiles, f, indent=2)
+            f.write("[")
+            for profile in islice(profiles, TOTAL_PROFILES):
+                f.write(",\n" if count else "\n")
+                f.write(json.dumps(profile, indent=2))
+                count += 1
+            f.write("\n]")
             
-        print(f"Successfully fetched {len(all_profiles)} unique profiles")
+        print(f"Successfully fetched {count} unique profiles")
         print(f"Results saved to {output_file}")
         
     except Exception as e:
@@ -0,0 +1,105 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database.profile_fetcher import ProfileFetcher
+from database.query_cache import QueryCache
+from database.updaters.profile_updater import ProfileUpdater
+
+
+@pytest.fixture
+def backend():
+    backend = SQLiteBackend(":memory:")
+    backend.seed([{"username": name} for name in ("good", "bad_type", "bad_flag", "bad_tags", "late_fix")])
+    yield backend
+    backend.close()
+
+
+def stored(backend):
+    rows = backend.table("profiles").select("username,is_car_profile,profile_type").execute().data
+    return {row["username"]: (row["is_car_profile"], row["profile_type"]) for row in rows}
+
+
+def test_malformed_rows_fail_alone(backend):
+    summary = ProfileUpdater(backend).bulk_update_profiles_analysis([
+        {"username": "good", "is_car_profile": True, "profile_type": "Company"},
+        {"username": "bad_type", "is_car_profile": True, "profile_type": 5},
+        {"username": "bad_flag", "is_car_profile": {"yes": True}, "profile_type": "Individual"},
+        {"username": "bad_tags", "is_car_profile": "true", "profile_type": "Individual", "tags": 7},
+        {"username": "missing_user", "is_car_profile": False, "profile_type": "Individual"},
+        {"profile_type": "Company"},
+    ])
+
+    assert sorted(summary["updated"]) == ["bad_type", "good"]
+    assert sorted(summary["failed"]) == ["bad_flag", "bad_tags"]
+    assert summary["missing"] == ["missing_user"]
+    rows = stored(backend)
+    assert rows["good"] == (True, "company")
+    # A non-string type falls back to 'unknown' like any unrecognized type
+    assert rows["bad_type"] == (True, "unknown")
+    assert rows["bad_flag"] == (None, None)
+    assert rows["bad_tags"] == (None, None)
+
+
+def test_later_valid_result_replaces_malformed_one(backend):
+    summary = ProfileUpdater(backend).bulk_update_profiles_analysis([
+        {"username": "late_fix", "is_car_profile": [1], "profile_type": "Company"},
+        {"username": "late_fix", "is_car_profile": False, "profile_type": "Car Page"},
+    ])
+
+    assert summary == {"updated": ["late_fix"], "missing": [], "failed": [], "malformed": []}
+    assert stored(backend)["late_fix"] == (False, "car page")
+
+
+def test_malformed_rows_fail_alone_on_the_upsert_path(backend):
+    # Distinct tag sets make every row its own group, which switches to per-row upserts
+    results = [{"username": name, "is_car_profile": True, "profile_type": "Individual", "tags": [name]}
+               for name in ("good", "bad_type", "late_fix")]
+    results.append({"username": "bad_tags", "is_car_profile": True, "tags": "not-a-list"})
+
+    summary = ProfileUpdater(backend).bulk_update_profiles_analysis(results, chunk_size=1)
+
+    assert sorted(summary["updated"]) == ["bad_type", "good", "late_fix"]
+    assert summary["failed"] == ["bad_tags"]
+
+
+def test_upsert_path_with_query_cache_invalidates_reads(backend):
+    cache = QueryCache(ttl_seconds=600)
+    fetcher = ProfileFetcher(backend, query_cache=cache)
+    assert fetcher.get_profile_by_username("good", ["tags"]) == {"tags": None}
+
+    # A different tag list per profile selects the per-row upsert path
+    summary = ProfileUpdater(backend, query_cache=cache).bulk_update_profiles_analysis([
+        {"username": name, "is_car_profile": True, "profile_type": "Individual", "tags": [name]}
+        for name in ("good", "bad_type", "bad_flag")
+    ])
+
+    assert sorted(summary["updated"]) == ["bad_flag", "bad_type", "good"]
+    assert cache.invalidations == 1
+    assert fetcher.get_profile_by_username("good", ["tags"]) == {"tags": ["good"]}
+
+
+def test_untagged_results_keep_stored_tags_on_the_upsert_path():
+    backend = SQLiteBackend(":memory:")
+    backend.seed([{"username": name, "tags": ["x"]} for name in ("a", "b", "c")])
+
+    # Three distinct verdicts select the upsert path; only "a" was tagged this time
+    summary = ProfileUpdater(backend).bulk_update_profiles_analysis([
+        {"username": "a", "is_car_profile": True, "profile_type": "Individual", "tags": ["y"]},
+        {"username": "b", "is_car_profile": True, "profile_type": "Company"},
+        {"username": "c", "is_car_profile": False, "profile_type": "Car Page"},
+    ])
+
+    assert sorted(summary["updated"]) == ["a", "b", "c"]
+    rows = backend.table("profiles").select("username,profile_type,tags").execute().data
+    assert {row["username"]: (row["profile_type"], row["tags"]) for row in rows} == {
+        "a": ("individual", ["y"]),
+        "b": ("company", ["x"]),
+        "c": ("car page", ["x"]),
+    }
+    backend.close()
@@ -0,0 +1,87 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database.profile_fetcher import ProfileFetcher
+from database.query_cache import QueryCache
+from database.updaters.profile_updater import ProfileUpdater
+
+
+@pytest.fixture
+def store():
+    backend = SQLiteBackend(":memory:")
+    backend.seed([{"username": "alice", "biography": "cars"}, {"username": "bob", "biography": "coffee"}])
+    cache = QueryCache(ttl_seconds=600)
+    yield ProfileFetcher(backend, query_cache=cache), ProfileUpdater(backend, query_cache=cache), cache
+    backend.close()
+
+
+def analyze(updater, username, profile_type):
+    return updater.bulk_update_profiles_analysis(
+        [{"username": username, "is_car_profile": True, "profile_type": profile_type}])
+
+
+def test_read_is_served_from_cache_until_written(store):
+    fetcher, updater, cache = store
+    columns = ["username", "profile_type"]
+
+    fetcher.get_profiles(select_columns=columns)
+    fetcher.get_profiles(select_columns=columns)
+    assert cache.hits == 1
+
+    analyze(updater, "alice", "Company")
+    rows = {row["username"]: row for row in fetcher.get_profiles(select_columns=columns)}
+    assert rows["alice"]["profile_type"] == "company"
+    assert cache.invalidations >= 1
+
+
+def test_write_invalidates_reads_that_did_not_select_username(store):
+    fetcher, updater, cache = store
+    columns = ["biography", "profile_type"]
+
+    before = fetcher.get_profiles(select_columns=columns)
+    assert all("username" not in row for row in before)
+
+    analyze(updater, "alice", "Company")
+    after = fetcher.get_profiles(select_columns=columns)
+
+    assert cache.invalidations == 1
+    assert sorted(row["profile_type"] or "" for row in after) == ["", "company"]
+    assert all("username" not in row for row in after)
+
+
+def test_write_to_unselected_column_keeps_entry(store):
+    fetcher, updater, cache = store
+    fetcher.get_profiles(select_columns=["username", "biography"])
+
+    analyze(updater, "alice", "Company")
+    fetcher.get_profiles(select_columns=["username", "biography"])
+
+    assert cache.invalidations == 0
+    assert cache.hits == 1
+
+
+def test_write_invalidates_queries_filtering_on_written_column(store):
+    fetcher, updater, cache = store
+    assert fetcher.get_profiles(select_columns=["username"], filters={"is_car_profile": None})
+
+    updater.bulk_update_profiles_analysis([
+        {"username": "alice", "is_car_profile": True, "profile_type": "company"},
+        {"username": "bob", "is_car_profile": False, "profile_type": "individual"},
+    ])
+
+    assert fetcher.get_profiles(select_columns=["username"], filters={"is_car_profile": None}) == []
+
+
+def test_username_lookup_is_invalidated_by_write(store):
+    fetcher, updater, cache = store
+    assert fetcher.get_profile_by_username("alice", ["profile_type"]) == {"profile_type": None}
+
+    analyze(updater, "alice", "Car Page")
+
+    assert fetcher.get_profile_by_username("alice", ["profile_type"]) == {"profile_type": "car page"}
@@ -0,0 +1,121 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import json
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+from database.updaters.profile_updater import ProfileUpdater
+from database.updaters.result_journal import ResultJournal
+
+
+def result(username, is_car=True):
+    return {"username": username, "is_car_profile": is_car, "profile_type": "individual"}
+
+
+def summary(updated=(), missing=(), failed=()):
+    return {"updated": list(updated), "missing": list(missing), "failed": list(failed)}
+
+
+def journal_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unconfirmed_results_survive_a_crash_and_are_replayed(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    backend = SQLiteBackend(":memory:")
+    backend.seed([{"username": f"user_{i}"} for i in range(4)])
+
+    journal = ResultJournal(path, fsync=False)
+    journal.record([result(f"user_{i}") for i in range(4)])
+    journal.confirm(summary(updated=["user_0"], missing=["user_1"], failed=["user_2"]))
+    # Crash: the process dies without closing the journal, leaving half a line behind
+    journal._file.write('{"result": {"username": "user_9"')
+    journal._file.close()
+    journal._lock_handle.close()
+
+    reopened = ResultJournal(path, fsync=False)
+    assert sorted(r["username"] for r in reopened.pending()) == ["user_2", "user_3"]
+
+    assert reopened.replay(ProfileUpdater(backend).bulk_update_profiles_analysis) == 2
+    assert reopened.pending() == []
+    rows = backend.table("profiles").select("username,is_car_profile").in_("username", ["user_2", "user_3"]).execute()
+    assert all(row["is_car_profile"] for row in rows.data)
+    reopened.close()
+
+
+def test_failed_replay_stays_pending(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    journal = ResultJournal(path, fsync=False)
+    journal.record([result("a"), result("b")])
+    journal.close()
+
+    reopened = ResultJournal(path, fsync=False)
+    written = reopened.replay(lambda results: summary(updated=["a"], failed=["b"]))
+
+    assert written == 1
+    assert [r["username"] for r in reopened.pending()] == ["b"]
+    reopened.close()
+    assert journal_lines(path) == [{"result": result("b")}]
+
+
+def test_malformed_results_are_rejected_instead_of_replayed_forever(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    backend = SQLiteBackend(":memory:")
+    backend.seed([{"username": "good"}, {"username": "bad"}])
+    journal = ResultJournal(path, fsync=False)
+    journal.record([result("good"), result("bad", is_car={"yes": 1})])
+    journal.close()
+
+    reopened = ResultJournal(path, fsync=False)
+    assert reopened.replay(ProfileUpdater(backend).bulk_update_profiles_analysis) == 1
+    assert reopened.pending() == []
+    assert reopened.stats()["rejected"] == 1
+    reopened.close()
+
+    assert journal_lines(path + ".rejected") == [result("bad", is_car={"yes": 1})]
+    assert ResultJournal(path, fsync=False).pending() == []
+
+
+def test_compaction_keeps_only_pending_results(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    journal = ResultJournal(path, compact_every=5, fsync=False)
+
+    for i in range(10):
+        journal.record([result(f"user_{i}")])
+        if i != 3:
+            journal.confirm(summary(updated=[f"user_{i}"]))
+
+    assert journal.compactions >= 1
+    assert len(journal_lines(path)) < 5
+    journal.close()
+    assert journal_lines(path) == [{"result": result("user_3")}]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_latest_result_for_a_username_wins(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    journal = ResultJournal(path, fsync=False)
+    journal.record([result("a", is_car=True)])
+    journal.record([result("a", is_car=False)])
+    journal.close()
+
+    assert ResultJournal(path, fsync=False).pending() == [result("a", is_car=False)]
+
+
+def test_second_opener_of_the_same_journal_fails(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    journal = ResultJournal(path, fsync=False)
+    journal.record([result("a")])
+
+    with pytest.raises(RuntimeError):
+        ResultJournal(path, fsync=False)
+
+    assert [r["username"] for r in journal.pending()] == ["a"]
+    journal.close()
+    assert [r["username"] for r in ResultJournal(path, fsync=False).pending()] == ["a"]
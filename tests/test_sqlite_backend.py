@@ -0,0 +1,54 @@
+import sys
+import os
+# Add project root (and the database package, whose modules import each other directly) to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"))
+
+import pytest
+
+from database.backends.sqlite_backend import SQLiteBackend
+
+
+@pytest.fixture
+def backend():
+    backend = SQLiteBackend(":memory:")
+    backend.seed([
+        {"username": "car_company", "is_car_profile": True, "profile_type": "company", "followers_count": 10},
+        {"username": "car_person", "is_car_profile": True, "profile_type": "individual", "followers_count": 5000},
+        {"username": "other_company", "is_car_profile": False, "profile_type": "company", "followers_count": 10},
+        {"username": "other_person", "is_car_profile": False, "profile_type": "individual", "followers_count": 5000},
+    ])
+    yield backend
+    backend.close()
+
+
+def usernames(response):
+    return sorted(row["username"] for row in response.data)
+
+
+def test_or_group_is_anded_with_preceding_filters(backend):
+    response = backend.table("profiles").select("username")\
+        .eq("is_car_profile", True)\
+        .or_("profile_type.eq.company,followers_count.gte.1000")\
+        .execute()
+
+    # Without parentheses, other_* rows matching only the second OR term leak in
+    assert usernames(response) == ["car_company", "car_person"]
+
+
+def test_or_group_is_anded_with_following_filters(backend):
+    response = backend.table("profiles").select("username")\
+        .or_("profile_type.eq.company,followers_count.gte.1000")\
+        .eq("is_car_profile", False)\
+        .execute()
+
+    assert usernames(response) == ["other_company", "other_person"]
+
+
+def test_nested_and_inside_or(backend):
+    response = backend.table("profiles").select("username")\
+        .eq("profile_type", "individual")\
+        .or_("username.eq.car_company,and(is_car_profile.eq.false,followers_count.gte.1000)")\
+        .execute()
+
+    assert usernames(response) == ["other_person"]